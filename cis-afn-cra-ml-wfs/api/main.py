@@ -1,26 +1,33 @@
+import io
 import json
 import os
 import math
+import time
 import logging
 import zlib
 import pandas as pd
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor
-from api.utils.tuning.read_infile import read_infile
-from api.utils.tuning.trn_df import prep_trn_df
-from api.utils.tuning.test_df import prep_test_df
-from api.utils.tuning.feature_engineering import feature_engg
-from api.utils.tuning.reg_model_optimizer import reg_model_optimizer
-from api.utils.tuning.tune_classification import tune_classification
-from api.utils.tuning.read_infile_cls import read_infile_cls
-from api.utils.tuning.test_df_cls import prep_test_df_cls
-from api.utils.tuning.trn_df_cls import prep_trn_df_cls
-from api.utils.tuning.predict_classification import predict_classification
-from api.utils.tuning.predict_regression import predict_regression
+from api.utils.tuning.training_session import RegressionTrainingSession, ClassificationTrainingSession
+from api.utils.tuning.artifact_store import get_artifact_store, data_fingerprint
+from api.utils.tuning.batch_scoring import ModelCache, model_key, cohort_rows, score_cohorts, score_regression, score_classification
+from api.utils.tuning.read_infile_cls import client_size_table
 from api.utils.tuning.feature_importance_utils import *
 
+try:
+    from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+    from fastapi.responses import Response, StreamingResponse
+    from celery import Celery
+    from api.utils.tuning.job_store import JobStore, JOB_ACTIONS, REDIS_URL
+except ImportError:
+    # the Databricks jobs import the training functions without the service dependencies
+    FastAPI = Celery = None
+
 deployment_mode = os.environ['DEPLOYMENT_MODE'].lower()
 is_test = bool(int(os.environ['IS_TEST']))
+# 'refit' fits a fresh model on the inference window, 'reuse' scores with the tuned model
+inference_mode = os.environ.get('INFERENCE_MODE', 'refit').lower()
+# start the hyperparameter searches from the previous run of each cohort in the artifact store
+warm_start = bool(int(os.environ.get('WARM_START', 1)))
 
 
 if is_test:
@@ -29,28 +36,76 @@ else:
     environment_type = deployment_mode
 
 
-executor = ThreadPoolExecutor(max_workers=4)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-results_store = {}
+# seconds between job event polls while streaming, and the longest a stream stays open
+job_poll_seconds = float(os.environ.get('JOB_POLL_SECONDS', 1))
+job_stream_timeout = float(os.environ.get('JOB_STREAM_TIMEOUT', 6 * 3600))
+# trained cohorts, None unless ARTIFACT_STORE_URI is set
+artifact_store = get_artifact_store()
+# stored models loaded by the scoring functions, kept for the lifetime of the process
+models = ModelCache(artifact_store) if artifact_store is not None else None
+
+
+def regression_session(zone, product, quarter, source_df):
+    """
+    Tuned regression session of a cohort. When an artifact store is configured, a cohort already
+    trained on identical data is restored instead of tuned, and newly tuned cohorts are saved.
+    """
+    if artifact_store is None:
+        session = RegressionTrainingSession(source_df, zone=zone, product=product, quarter=quarter)
+        session.tune()
+        return session
+
+    key = model_key({'kind': 'regression', 'zone': zone, 'product': product, 'quarter': quarter})
+    fingerprint = data_fingerprint(source_df)
+    artifacts = artifact_store.load(key, fingerprint)
+    if artifacts is not None:
+        return RegressionTrainingSession.from_artifacts(source_df, artifacts)
+
+    prior = artifact_store.metadata(key) if warm_start else None
+    prior_trials = (prior.get('search_history') or [prior['best_params']]) if prior else None
+
+    session = RegressionTrainingSession(source_df, zone=zone, product=product, quarter=quarter)
+    best_params = session.tune(prior_trials=prior_trials)
+    artifact_store.save(key, fingerprint, session.artifacts(),
+                        metadata={'best_params': best_params, 'search_history': session.search_history})
+    return session
+
+
+def classification_session(recurring, client_size, product, source_df, client_sizes=None):
+    """
+    Tuned classification session of a cohort, restored from or saved to the artifact store like regression_session.
+    """
+    if artifact_store is None:
+        session = ClassificationTrainingSession(source_df, client_size=client_size, product=product, client_sizes=client_sizes)
+        session.tune()
+        return session
+
+    key = model_key({'kind': 'classification', 'recurring': recurring, 'client_size': client_size, 'product': product})
+    fingerprint = data_fingerprint(source_df)
+    artifacts = artifact_store.load(key, fingerprint)
+    if artifacts is not None:
+        return ClassificationTrainingSession.from_artifacts(source_df, artifacts, client_sizes=client_sizes)
+
+    prior = artifact_store.metadata(key) if warm_start else None
+
+    session = ClassificationTrainingSession(source_df, client_size=client_size, product=product, client_sizes=client_sizes)
+    best_params, optimal_threshold = session.tune(prior_params=[prior['best_params']] if prior else None)
+    artifact_store.save(key, fingerprint, session.artifacts(),
+                        metadata={'best_params': best_params, 'optimal_threshold': float(optimal_threshold)})
+    return session
 
 
 def train_model_regression(zone: str, product: str, quarter: int, source_df: pd.DataFrame):
     logger = logging.getLogger(__name__)
 
     ## TRAINING
-    df, df_keys, df_cat, target_df_trn, target_df_tst, latest_quarter = read_infile(df=source_df, zone=zone, product=product, qtr=quarter, inference=False)
-    trn_df, feature_dict_trn, correlated_groups = prep_trn_df(df, latest_quarter, inference=False)
-    tst_df, feature_dict_tst = prep_test_df(df, correlated_groups, latest_quarter, inference=False)
-    trn_df_xfm, tst_df_xfm, cat_cols = feature_engg(trn_df, tst_df, df_cat)
-    best_params = reg_model_optimizer(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols)
+    session = regression_session(zone, product, quarter, source_df)
 
     ## INFERENCE
-    df, df_keys, df_cat, target_df_trn, target_df_tst, latest_quarter = read_infile(df=source_df, zone=zone, product=product, qtr=quarter, inference=True)
-    trn_df, feature_dict_trn, correlated_groups = prep_trn_df(df, latest_quarter, inference=True)
-    tst_df, feature_dict_tst = prep_test_df(df, correlated_groups, latest_quarter, inference=True)
-    trn_df_xfm, tst_df_xfm, cat_cols = feature_engg(trn_df, tst_df, df_cat)
-    inference_prediction = predict_regression(trn_df_xfm, target_df_trn, tst_df_xfm, cat_cols, best_params)
+    inference_prediction = session.predict(mode=inference_mode)
+    df_keys = session.df_keys
 
     # Prepare output data
     df_keys['product_model'] = product
@@ -62,7 +117,7 @@ def train_model_regression(zone: str, product: str, quarter: int, source_df: pd.
     return df_keys
 
 
-def train_model_cls(recurring, client_size, product, df):
+def train_model_cls(recurring, client_size, product, df, client_sizes=None):
     out_data = {'client_number':[],
             'product_line_nm': [],
             'Client Size':[],
@@ -78,21 +133,16 @@ def train_model_cls(recurring, client_size, product, df):
     source_df = df
     
     # Perform your model training steps here
-    df, df_keys = read_infile_cls(source_df=source_df, product=product, inference=False)
-    trn_df, feature_dict_trn, correlated_groups, target_df_trn = prep_trn_df_cls(df, client_size=client_size, product=product, inference = False)
-    tst_df, feature_dict_tst, target_df_tst, tst_clients = prep_test_df_cls(df, correlated_groups, client_size=client_size, product=product, inference = False)
-    trn_df_xfm, tst_df_xfm, cat_cols = feature_engg(trn_df, tst_df)
-    best_params,optimal_threshold, feature_importance, trn_df_xfm = tune_classification(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols)
+    session = classification_session(recurring, client_size, product, source_df, client_sizes)
+    optimal_threshold = session.optimal_threshold
+    tuning = session.tuning
 
     ## FEATURE IMPORTANCE?
-    full_feat_imp_df, features_source_df, top_3_feature_names = get_feat_imp_percentile_df(feature_importance, trn_df_xfm, correlated_groups, feature_dict_trn, recurring, product, client_size, source_df)
+    full_feat_imp_df, features_source_df, top_3_feature_names = get_feat_imp_percentile_df(session.feature_importance, tuning['trn_df_xfm'], tuning['correlated_groups'], tuning['feature_dict_trn'], recurring, product, client_size, source_df)
     
     ## INFERENCE
-    df, df_keys = read_infile_cls(source_df=source_df, product=product, inference=True)
-    inference_trn_df, inference_feature_dict_trn, inference_correlated_groups, inference_target_df_trn = prep_trn_df_cls(df, client_size=client_size, product=product, inference = True)
-    inference_tst_df, inference_feature_dict_tst, inference_target_df_tst, inference_tst_clients = prep_test_df_cls(df, inference_correlated_groups, client_size=client_size, product=product, inference = True)
-    inference_trn_df_xfm, inference_tst_df_xfm, inference_cat_cols = feature_engg(inference_trn_df, inference_tst_df)
-    inference_prediction_values, inference_y_pred_proba = predict_classification(inference_trn_df_xfm, inference_tst_df_xfm, inference_target_df_trn, inference_cat_cols, optimal_threshold, best_params)
+    inference_prediction_values, inference_y_pred_proba, inference_tst_clients = session.predict(mode=inference_mode)
+    df_keys = session.df_keys
 
     df_keys = df_keys[df_keys.index.isin(inference_tst_clients)]
     for i, client_number in enumerate(df_keys['client_number']):
@@ -114,3 +164,183 @@ def train_model_cls(recurring, client_size, product, df):
         "feat_imp_results": full_feat_imp_df
     }
 
+
+
+def score_model_regression(zone: str, product: str, quarter: int, source_df: pd.DataFrame):
+    """
+    Scores a cohort frame with the latest stored model of a regression cohort, without tuning.
+    """
+    if models is None:
+        raise RuntimeError('Scoring from stored models requires ARTIFACT_STORE_URI')
+    return score_regression(source_df, models.get({'kind': 'regression', 'zone': zone, 'product': product, 'quarter': quarter}))
+
+
+def score_model_cls(recurring, client_size, product, df, client_sizes=None):
+    """
+    Scores a frame of one recurring flag with the latest stored model of a classification cohort, without tuning.
+    """
+    if models is None:
+        raise RuntimeError('Scoring from stored models requires ARTIFACT_STORE_URI')
+    artifacts = models.get({'kind': 'classification', 'recurring': recurring, 'client_size': client_size, 'product': product})
+    return score_classification(df, artifacts, recurring, client_sizes)
+
+
+def read_frame(upload):
+    """
+    Reads an uploaded modeling frame, Parquet if the file name ends with '.parquet', else CSV.
+    """
+    data = io.BytesIO(upload.file.read())
+    if upload.filename and upload.filename.endswith('.parquet'):
+        return pd.read_parquet(data)
+    return pd.read_csv(data)
+
+
+def run_cohort(action, df, cohort, client_sizes=None):
+    """
+    Trains or scores one cohort of a modeling frame.
+    Args:
+        action (str): 'train' or 'score'.
+        df (DataFrame): Modeling frame of the whole job.
+        cohort (dict): Cohort spec, see model_key.
+        client_sizes (DataFrame): client_size_table of df, for classification training.
+
+    Returns:
+        dict: Result name -> DataFrame.
+    """
+    if action == 'score':
+        return {'prediction_results': score_cohorts(df, [cohort], models, max_workers=1)[cohort['kind']]}
+
+    cohort_df = df.iloc[cohort_rows(df, cohort)]
+    if cohort['kind'] == 'regression':
+        return {'prediction_results': train_model_regression(cohort['zone'], cohort['product'], cohort['quarter'], cohort_df)}
+    return train_model_cls(cohort['recurring'], cohort['client_size'], cohort['product'], cohort_df, client_sizes)
+
+
+if Celery is not None:
+    celery_app = Celery('cra_ml', broker=REDIS_URL)
+    # cohorts take minutes: one at a time per worker process, acknowledged once finished
+    celery_app.conf.update(task_acks_late=True, worker_prefetch_multiplier=1, task_ignore_result=True)
+    job_store = JobStore.from_url(REDIS_URL)
+
+    # input frame of the latest job seen by this worker process, with its client size table
+    _job_frames = {}
+
+    def job_frame(job_id):
+        if job_id not in _job_frames:
+            _job_frames.clear()
+            df = job_store.frame(job_id)
+            _job_frames[job_id] = (df, client_size_table(df) if 'Recurring' in df.columns else None)
+        return _job_frames[job_id]
+
+    @celery_app.task(name='run_cohort_job')
+    def run_cohort_job(job_id, action, cohort):
+        key = model_key(cohort)
+        try:
+            df, client_sizes = job_frame(job_id)
+            job_store.add_result(job_id, key, run_cohort(action, df, cohort, client_sizes))
+            logger.info(f'Job {job_id}: finished {key}')
+        except Exception as e:
+            job_store.add_error(job_id, key, repr(e))
+            raise
+
+
+if FastAPI is not None:
+    app = FastAPI(title='CRA ML API')
+
+    @app.get('/health')
+    def health():
+        return {'status': 'ok', 'environment': environment_type}
+
+    @app.post('/score')
+    def score(file: UploadFile = File(...), cohorts: str = Form(...)):
+        """
+        Scores an uploaded modeling frame with the stored models of a JSON list of cohort specs,
+        e.g. [{"kind": "regression", "zone": "None", "product": "None", "quarter": 0}].
+        """
+        if models is None:
+            raise HTTPException(status_code=503, detail='No artifact store configured')
+        try:
+            results = score_cohorts(read_frame(file), json.loads(cohorts), models)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=e.args[0])
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        # to_json writes NaN as null
+        return {kind: json.loads(frame.to_json(orient='records')) for kind, frame in results.items()}
+
+    @app.post('/jobs/{action}')
+    def submit_job(action: str, file: UploadFile = File(...), cohorts: str = Form(...)):
+        """
+        Queues one Celery task per cohort to train or score an uploaded modeling frame.
+        Returns the job id to poll or stream.
+        """
+        if action not in JOB_ACTIONS:
+            raise HTTPException(status_code=404, detail=f'Unknown job action {action!r}, expected one of {JOB_ACTIONS}')
+        if action == 'score' and models is None:
+            raise HTTPException(status_code=503, detail='No artifact store configured')
+        try:
+            cohorts = json.loads(cohorts)
+            for cohort in cohorts:
+                model_key(cohort)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        job_id = job_store.create(action, read_frame(file), cohorts)
+        for cohort in cohorts:
+            run_cohort_job.delay(job_id, action, cohort)
+        return {'job_id': job_id, 'action': action, 'total': len(cohorts)}
+
+    @app.get('/jobs/{job_id}')
+    def job_status(job_id: str, start: int = 0):
+        """
+        Progress of a job and the events of the cohorts finished from offset start.
+        """
+        status = job_store.status(job_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f'Job {job_id} not found or expired')
+        status['events'] = job_store.events(job_id, start)
+        return status
+
+    @app.get('/jobs/{job_id}/stream')
+    def job_stream(job_id: str, start: int = 0):
+        """
+        Streams one JSON line per finished cohort, from offset start, until the job is finished.
+        The last line is the state the stream ended in, e.g. {"status": "finished", "streamed": 12, "total": 12};
+        "timed_out" after JOB_STREAM_TIMEOUT and "expired" once the job keys are gone, with fewer cohorts streamed.
+        """
+        if job_store.status(job_id) is None:
+            raise HTTPException(status_code=404, detail=f'Job {job_id} not found or expired')
+
+        def lines():
+            offset = start
+            deadline = time.time() + job_stream_timeout
+            while True:
+                # status before events, so the events of a finished job are all read before the stream ends
+                status = job_store.status(job_id)
+                for event in job_store.events(job_id, offset):
+                    yield json.dumps(dict(event, index=offset)) + '\n'
+                    offset += 1
+                if status is None:
+                    state = 'expired'
+                elif status['finished']:
+                    state = 'finished'
+                elif time.time() >= deadline:
+                    state = 'timed_out'
+                else:
+                    time.sleep(job_poll_seconds)
+                    continue
+                break
+            total = status['total'] if status is not None else None
+            yield json.dumps({'status': state, 'streamed': offset, 'total': total}) + '\n'
+
+        return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+    @app.get('/jobs/{job_id}/results')
+    def job_result(job_id: str, cohort: str, frame: str = 'prediction_results'):
+        """
+        One result frame of a finished cohort as Parquet.
+        """
+        data = job_store.result(job_id, cohort, frame)
+        if data is None:
+            raise HTTPException(status_code=404, detail=f'No {frame} for {cohort} in job {job_id}')
+        return Response(content=data, media_type='application/vnd.apache.parquet')
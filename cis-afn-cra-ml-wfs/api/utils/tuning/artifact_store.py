@@ -0,0 +1,193 @@
+import io
+import os
+import re
+import json
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# where trained cohorts are persisted, e.g. '/mnt/artifacts' or 'file:///mnt/artifacts'; unset disables the store
+ARTIFACT_STORE_URI = os.environ.get('ARTIFACT_STORE_URI')
+
+ARTIFACT_FILE = 'artifacts.joblib'
+METADATA_FILE = 'metadata.json'
+LATEST_FILE = 'LATEST'
+
+
+def data_fingerprint(df):
+    """
+    Content hash of a modeling frame: column names, dtypes, index and values.
+    Two frames with the same fingerprint train the same cohort artifacts.
+    Args:
+        df (DataFrame): Modeling frame.
+
+    Returns:
+        str: 16 hex characters.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _json_default(value):
+    # numpy scalars (e.g. sklearn's best_params_) keep their type, anything else is stored as text
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def cohort_key(kind, **parts):
+    """
+    Storage key of one cohort, e.g. cohort_key('regression', zone='East', product='None', quarter=0)
+    -> 'regression/zone=East/product=None/quarter=0'.
+    """
+    def clean(value):
+        return re.sub(r'[^A-Za-z0-9_.=-]+', '_', str(value))
+    return '/'.join([clean(kind)] + [clean(f'{name}={value}') for name, value in parts.items()])
+
+
+class ArtifactStore(ABC):
+    """
+    Versioned storage of trained cohorts. Every save writes the artifacts and their metadata under
+    '{cohort key}/{fingerprint}/' and points '{cohort key}/LATEST' at that fingerprint.
+
+    Subclasses only implement byte-level access to relative paths (_write, _read, _exists),
+    so a blob storage backend can be added next to LocalArtifactStore; a backend missing one of
+    them fails when it is created.
+    """
+
+    @abstractmethod
+    def _write(self, path, data):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _read(self, path):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _exists(self, path):
+        raise NotImplementedError
+
+    def save(self, key, fingerprint, artifacts, metadata=None):
+        """
+        Persists the artifacts of one cohort.
+        Args:
+            key (str): Output of cohort_key.
+            fingerprint (str): Output of data_fingerprint for the frame the cohort was trained on.
+            artifacts (dict): Picklable artifacts (fitted model, parameters, transformations).
+            metadata (dict): JSON-serializable details stored alongside, e.g. parameters and threshold.
+
+        Returns:
+            str: Path of the saved version.
+        """
+        version = f'{key}/{fingerprint}'
+        buffer = io.BytesIO()
+        joblib.dump(artifacts, buffer)
+        metadata = dict(metadata or {}, key=key, fingerprint=fingerprint,
+                        saved_at=datetime.now(timezone.utc).isoformat())
+        self._write(f'{version}/{ARTIFACT_FILE}', buffer.getvalue())
+        self._write(f'{version}/{METADATA_FILE}', json.dumps(metadata, indent=2, default=_json_default).encode())
+        # the pointer is written last so a partial save is never picked up as latest
+        self._write(f'{key}/{LATEST_FILE}', fingerprint.encode())
+        logger.info(f'Saved artifacts {version}')
+        return version
+
+    def latest(self, key):
+        """
+        Fingerprint of the most recent save of a cohort, None if it was never saved.
+        """
+        if not self._exists(f'{key}/{LATEST_FILE}'):
+            return None
+        return self._read(f'{key}/{LATEST_FILE}').decode().strip()
+
+    def exists(self, key, fingerprint=None):
+        fingerprint = fingerprint or self.latest(key)
+        return fingerprint is not None and self._exists(f'{key}/{fingerprint}/{ARTIFACT_FILE}')
+
+    def load(self, key, fingerprint=None):
+        """
+        Loads the artifacts of a cohort.
+        Args:
+            key (str): Output of cohort_key.
+            fingerprint (str): Version to load, defaults to the latest save.
+
+        Returns:
+            dict: Artifacts, None if the cohort (or version) was never saved.
+        """
+        if not self.exists(key, fingerprint):
+            return None
+        fingerprint = fingerprint or self.latest(key)
+        logger.info(f'Loading artifacts {key}/{fingerprint}')
+        return joblib.load(io.BytesIO(self._read(f'{key}/{fingerprint}/{ARTIFACT_FILE}')))
+
+    def metadata(self, key, fingerprint=None):
+        fingerprint = fingerprint or self.latest(key)
+        if fingerprint is None or not self._exists(f'{key}/{fingerprint}/{METADATA_FILE}'):
+            return None
+        return json.loads(self._read(f'{key}/{fingerprint}/{METADATA_FILE}'))
+
+
+class LocalArtifactStore(ArtifactStore):
+    """
+    ArtifactStore on a local or mounted filesystem.
+
+    Args:
+        root (str): Base directory, created if missing.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, path):
+        return os.path.join(self.root, *path.split('/'))
+
+    def _write(self, path, data):
+        full_path = self._path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # write then rename, so concurrent cohort workers never read a half-written file
+        tmp_path = f'{full_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+
+    def _read(self, path):
+        with open(self._path(path), 'rb') as f:
+            return f.read()
+
+    def _exists(self, path):
+        return os.path.exists(self._path(path))
+
+
+# URI scheme -> store class taking the remainder of the URI
+ARTIFACT_STORES = {
+    'file': LocalArtifactStore,
+}
+
+
+def get_artifact_store(uri=None):
+    """
+    Builds the artifact store configured by a URI such as '/mnt/artifacts' or 'file:///mnt/artifacts'.
+    Args:
+        uri (str): Store location, defaults to ARTIFACT_STORE_URI.
+
+    Returns:
+        ArtifactStore: None if no store is configured.
+    """
+    uri = uri or ARTIFACT_STORE_URI
+    if not uri:
+        return None
+    scheme, sep, location = uri.partition('://')
+    if not sep:
+        scheme, location = 'file', uri
+    if scheme not in ARTIFACT_STORES:
+        raise ValueError(f'Unknown artifact store {scheme!r}, expected one of {tuple(ARTIFACT_STORES)}')
+    return ARTIFACT_STORES[scheme](location)
@@ -0,0 +1,172 @@
+import os
+import logging
+import threading
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from api.utils.tuning.artifact_store import get_artifact_store, cohort_key
+from api.utils.tuning.read_infile_cls import client_size_table
+from api.utils.tuning.training_session import RegressionTrainingSession, ClassificationTrainingSession
+from api.utils.util_functions.utils import get_cpu_limit
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# cohorts scored concurrently (defaults to the CPU limit)
+SCORING_WORKERS = os.environ.get('SCORING_WORKERS')
+
+# key parts of each cohort kind, in storage key order
+COHORT_PARTS = {
+    'regression': ('zone', 'product', 'quarter'),
+    'classification': ('recurring', 'client_size', 'product'),
+}
+
+
+def model_key(cohort):
+    """
+    Artifact store key of a cohort spec such as
+    {'kind': 'regression', 'zone': 'East', 'product': 'None', 'quarter': 0} or
+    {'kind': 'classification', 'recurring': True, 'client_size': 'large', 'product': 'Casualty'}.
+    """
+    kind = cohort['kind']
+    if kind not in COHORT_PARTS:
+        raise ValueError(f'Unknown cohort kind {kind!r}, expected one of {tuple(COHORT_PARTS)}')
+    missing = [part for part in COHORT_PARTS[kind] if part not in cohort]
+    if missing:
+        raise ValueError(f'Cohort {cohort} is missing {missing}')
+    return cohort_key(kind, **{part: cohort[part] for part in COHORT_PARTS[kind]})
+
+
+class ModelCache:
+    """
+    Artifacts of stored cohorts, loaded once per saved version and shared between requests.
+    The latest version of a cohort is looked up on every get, so a retrained cohort is picked up
+    without restarting the service.
+
+    Args:
+        store (ArtifactStore): Store to load from.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._artifacts = {}
+        self._lock = threading.Lock()
+
+    def get(self, cohort):
+        key = model_key(cohort)
+        fingerprint = self.store.latest(key)
+        if fingerprint is None:
+            raise KeyError(f'No stored model for {key}')
+        with self._lock:
+            if (key, fingerprint) not in self._artifacts:
+                # older versions of the cohort are not needed anymore
+                for cached in [cached for cached in self._artifacts if cached[0] == key]:
+                    del self._artifacts[cached]
+                self._artifacts[(key, fingerprint)] = self.store.load(key, fingerprint)
+            return self._artifacts[(key, fingerprint)]
+
+
+def cohort_rows(df, cohort):
+    """
+    Row positions of a cohort in a modeling frame, selected like the training jobs do.
+    """
+    if cohort['kind'] == 'classification':
+        return np.flatnonzero(df['Recurring'].to_numpy() == cohort['recurring'])
+
+    mask = np.ones(len(df), dtype=bool)
+    if cohort['zone'] != 'None':
+        mask &= df['mi_lookup_level4'].to_numpy() == cohort['zone']
+    if cohort['product'] != 'None':
+        mask &= df['product_line_nm'].to_numpy() == cohort['product']
+    return np.flatnonzero(mask)
+
+
+def score_regression(source_df, artifacts):
+    """
+    Scores a cohort frame with stored regression artifacts.
+
+    Returns:
+        DataFrame: Client keys with product_model, quarter, zone and prediction, as train_model_regression.
+    """
+    session = RegressionTrainingSession.from_artifacts(source_df, artifacts)
+    prediction = session.predict(mode='reuse')
+    df_keys = session.df_keys.copy()
+    df_keys['product_model'] = artifacts['product']
+    df_keys['quarter'] = artifacts['quarter']
+    df_keys['zone'] = artifacts['zone']
+    df_keys['prediction'] = prediction
+    return df_keys
+
+
+def score_classification(source_df, artifacts, recurring, client_sizes=None):
+    """
+    Scores a frame of one recurring flag with stored classification artifacts.
+
+    Returns:
+        DataFrame: One row per scored client, with the prediction_results columns of train_model_cls.
+    """
+    session = ClassificationTrainingSession.from_artifacts(source_df, artifacts, client_sizes=client_sizes)
+    prediction_values, y_pred_proba, tst_clients = session.predict(mode='reuse')
+
+    df_keys = session.df_keys
+    df_keys = df_keys[df_keys.index.isin(tst_clients)]
+    return pd.DataFrame({
+        'client_number': df_keys['client_number'].values,
+        'product_line_nm': artifacts['product'],
+        'Client Size': artifacts['client_size'],
+        'Recurring': recurring,
+        'prediction': prediction_values.astype(float),
+        'pred_renewal_prob': y_pred_proba.astype(float),
+        'optimal_threshold': float(artifacts['optimal_threshold']),
+    })
+
+
+def score_cohorts(df, cohorts, models=None, max_workers=None):
+    """
+    Scores a modeling frame with the stored models of several cohorts.
+
+    Each cohort's artifacts are loaded once and its rows go through a single feature pipeline
+    pass and one batched predict call; cohorts are scored in parallel on a thread pool.
+    Classification cohorts of the same recurring flag share one client size table.
+    Args:
+        df (DataFrame): Modeling frame, as built for training.
+        cohorts (list): Cohort specs, see model_key.
+        models (ModelCache): Loaded artifacts. Defaults to a cache over the configured artifact store.
+        max_workers (int): Cohorts scored concurrently. Defaults to SCORING_WORKERS, else the CPU limit.
+
+    Returns:
+        dict: 'regression' and 'classification' result frames, for the kinds present in cohorts.
+    """
+    if models is None:
+        store = get_artifact_store()
+        if store is None:
+            raise RuntimeError('Scoring from stored models requires ARTIFACT_STORE_URI')
+        models = ModelCache(store)
+    max_workers = int(max_workers or SCORING_WORKERS or get_cpu_limit())
+
+    # resolve every model and row selection up front so a missing cohort fails before any work
+    jobs = []
+    for cohort in cohorts:
+        rows = cohort_rows(df, cohort)
+        jobs.append((cohort, models.get(cohort), rows))
+
+    client_sizes = {}
+    for cohort, artifacts, rows in jobs:
+        if cohort['kind'] == 'classification' and cohort['recurring'] not in client_sizes:
+            client_sizes[cohort['recurring']] = client_size_table(df.iloc[rows])
+
+    def score(cohort, artifacts, rows):
+        source_df = df.iloc[rows]
+        if cohort['kind'] == 'regression':
+            return score_regression(source_df, artifacts)
+        return score_classification(source_df, artifacts, cohort['recurring'], client_sizes[cohort['recurring']])
+
+    results = {kind: [] for kind in COHORT_PARTS}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(score, *job) for job in jobs]
+        # results keep the order of cohorts
+        for (cohort, artifacts, rows), future in zip(jobs, futures):
+            results[cohort['kind']].append(future.result())
+            logger.info(f'Scored {model_key(cohort)} ({len(rows)} rows)')
+
+    return {kind: pd.concat(frames, ignore_index=True) for kind, frames in results.items() if frames}
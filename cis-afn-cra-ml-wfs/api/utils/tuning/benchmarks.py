@@ -0,0 +1,152 @@
+import time
+import logging
+import pandas as pd
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from api.utils.tuning.tune_classification import tune_classification, SEARCH_STRATEGIES
+from api.utils.tuning.encoding import encode_train_test, ENCODINGS
+from api.utils.tuning.predict_regression import fit_regression
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_synthetic_cohort(n_rows=2000, n_log=40, n_cat=10, random_state=0):
+    """
+    Builds a frame shaped like the output of feature_engg for one classification cohort.
+    Args:
+        n_rows (int): Number of clients.
+        n_log (int): Number of continuous '_log' features.
+        n_cat (int): Number of binned '_cat' features.
+        random_state (int): Seed.
+
+    Returns:
+        tuple: (trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols)
+    """
+    rng = np.random.default_rng(random_state)
+
+    def frame():
+        log = rng.normal(size=(n_rows, n_log))
+        cat = rng.integers(0, 3, size=(n_rows, n_cat))
+        # renewal depends on a handful of features plus noise, with ~30% positives
+        score = log[:, :5].sum(axis=1) + 0.8 * (cat[:, 0] == 2) - 0.5 * cat[:, 1] + rng.normal(scale=2, size=n_rows)
+        target = pd.Series((score > np.quantile(score, 0.7)).astype(int))
+        df = pd.DataFrame(log, columns=[f'feature_{i}_log' for i in range(n_log)])
+        for j in range(n_cat):
+            df[f'feature_{n_log + j}_cat'] = pd.Categorical(cat[:, j])
+        return df, target
+
+    trn_df_xfm, target_df_trn = frame()
+    tst_df_xfm, target_df_tst = frame()
+    cat_cols = [col for col in trn_df_xfm.columns if col.endswith('_cat')]
+    return trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols
+
+
+def benchmark_search_strategies(strategies=SEARCH_STRATEGIES, n_repeats=3, n_rows=2000):
+    """
+    Compares the tune_classification search strategies on synthetic cohorts.
+    Each repeat draws a new cohort, so the spread of the chosen threshold across repeats
+    shows how stable each strategy is.
+    Args:
+        strategies (tuple): Strategies to compare.
+        n_repeats (int): Number of synthetic cohorts per strategy.
+        n_rows (int): Rows per cohort.
+
+    Returns:
+        DataFrame: One row per strategy with wall time, threshold mean/std and test AUC.
+    """
+    runs = []
+    for repeat in range(n_repeats):
+        trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols = make_synthetic_cohort(n_rows=n_rows, random_state=repeat)
+        for strategy in strategies:
+            start = time.time()
+            best_params, optimal_threshold, feature_importance, trn_xfm, best_estimator = \
+                tune_classification(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols, strategy=strategy)
+            elapsed = time.time() - start
+
+            tst_xfm = pd.get_dummies(tst_df_xfm, columns=cat_cols, drop_first=True)[trn_xfm.columns]
+            auc = roc_auc_score(target_df_tst, best_estimator.predict_proba(tst_xfm)[:, 1])
+            logger.info(f'{strategy} repeat {repeat}: {elapsed:.1f}s threshold={optimal_threshold:.3f} auc={auc:.3f}')
+            runs.append({'strategy': strategy, 'repeat': repeat, 'seconds': elapsed,
+                         'threshold': optimal_threshold, 'auc': auc})
+
+    runs = pd.DataFrame(runs)
+    return runs.groupby('strategy', sort=False).agg(
+        seconds=('seconds', 'mean'),
+        threshold_mean=('threshold', 'mean'),
+        threshold_std=('threshold', 'std'),
+        auc=('auc', 'mean'),
+    )
+
+
+def make_synthetic_regression_cohort(n_rows=5000, n_log=60, n_bins=40, cardinalities=(60, 8, 25), random_state=0):
+    """
+    Builds a frame shaped like the output of feature_engg for one regression cohort:
+    '_log' features, small '_cat' bins and wider descriptive categoricals such as final_mip_desc.
+    Args:
+        n_rows (int): Number of clients.
+        n_log (int): Number of continuous '_log' features.
+        n_bins (int): Number of binned '_cat' features (2-4 levels).
+        cardinalities (tuple): Number of levels of each descriptive categorical.
+        random_state (int): Seed.
+
+    Returns:
+        tuple: (trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols)
+    """
+    rng = np.random.default_rng(random_state)
+    effects = [rng.normal(scale=2, size=k) for k in cardinalities]
+
+    def frame():
+        df = pd.DataFrame(rng.normal(size=(n_rows, n_log)), columns=[f'feature_{i}_log' for i in range(n_log)])
+        target = df.iloc[:, :5].sum(axis=1) * 3 + 20
+        for j in range(n_bins):
+            df[f'feature_{n_log + j}_cat'] = pd.Categorical(rng.integers(0, 2 + j % 3, size=n_rows))
+        for j, k in enumerate(cardinalities):
+            codes = rng.integers(0, k, size=n_rows)
+            df[f'desc_{j}'] = pd.Categorical(np.array([f'level_{c}' for c in range(k)])[codes])
+            target += effects[j][codes]
+        return df, pd.Series(target + rng.normal(size=n_rows))
+
+    trn_df_xfm, target_df_trn = frame()
+    tst_df_xfm, target_df_tst = frame()
+    cat_cols = [col for col in trn_df_xfm.columns if col.endswith('_cat') or col.startswith('desc_')]
+    return trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols
+
+
+def benchmark_categorical_encoding(encodings=ENCODINGS, n_repeats=3, n_rows=5000, params=None):
+    """
+    Compares the XGBoost categorical encodings on synthetic regression cohorts with fixed parameters.
+    Args:
+        encodings (tuple): Encodings to compare.
+        n_repeats (int): Number of synthetic cohorts per encoding.
+        n_rows (int): Rows per cohort.
+        params (dict): XGBRegressor parameters.
+
+    Returns:
+        DataFrame: One row per encoding with encode/fit seconds, feature count, test MAE and
+            the relative total error used as the tuning loss.
+    """
+    params = params or {'max_depth': 4, 'n_estimators': 300, 'learning_rate': 0.1}
+    runs = []
+    for repeat in range(n_repeats):
+        trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols = make_synthetic_regression_cohort(n_rows=n_rows, random_state=repeat)
+        for encoding in encodings:
+            start = time.time()
+            X_train, X_test = encode_train_test(trn_df_xfm, tst_df_xfm, cat_cols, encoding)
+            encoded = time.time()
+            model = fit_regression(X_train, target_df_trn, dict(params), encoding)
+            y_pred = model.predict(X_test)
+            done = time.time()
+
+            runs.append({'encoding': encoding, 'encode_seconds': encoded - start, 'fit_seconds': done - encoded,
+                         'n_features': X_train.shape[1], 'mae': np.mean(np.abs(y_pred - target_df_tst.values)),
+                         'total_error': abs(np.sum(y_pred - target_df_tst.values) / np.sum(target_df_tst.values))})
+            logger.info(runs[-1])
+
+    runs = pd.DataFrame(runs)
+    return runs.groupby('encoding', sort=False).mean().drop(columns='repeat', errors='ignore')
+
+
+if __name__ == '__main__':
+    print(benchmark_search_strategies())
+    print(benchmark_categorical_encoding())
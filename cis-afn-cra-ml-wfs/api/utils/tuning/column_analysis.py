@@ -0,0 +1,112 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+# marks the end of a pattern inside a PrefixTrie node
+_END = object()
+
+
+def constant_columns(df):
+    """
+    Finds the non-object columns of df holding a single value (NaN counting as one value,
+    like np.unique). Numeric and boolean columns are checked with one min/max pass over the
+    whole block instead of sorting each column.
+    Args:
+        df (DataFrame): Modeling frame.
+
+    Returns:
+        tuple: (non-object column Index, list of constant column names in column order)
+    """
+    dtypes = df.dtypes
+    columns = dtypes[dtypes != 'object'].index
+    if len(df) == 0:
+        return columns, []
+
+    is_numeric = np.array([pd.api.types.is_numeric_dtype(dtypes[col]) and not isinstance(dtypes[col], pd.CategoricalDtype)
+                           for col in columns], dtype=bool)
+    numeric_cols = columns[is_numeric]
+
+    constant = {}
+    if len(numeric_cols):
+        values = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        is_nan = np.isnan(values)
+        with warnings.catch_warnings():
+            # all-NaN columns warn here and are handled by all_nan below
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low = np.nanmin(values, axis=0)
+            high = np.nanmax(values, axis=0)
+        all_nan = is_nan.all(axis=0)
+        single = all_nan | (~is_nan.any(axis=0) & (low == high))
+        constant.update(zip(numeric_cols, single))
+
+    # categoricals, datetimes and other non-object dtypes
+    for col in columns[~is_numeric]:
+        constant[col] = df[col].nunique(dropna=False) == 1
+
+    return columns, [col for col in columns if constant[col]]
+
+
+def constant_prefixes(df):
+    """
+    Feature prefixes of the constant historical columns: a constant 'feature_year_2_Q3'
+    column yields 'feature_year', which then excludes that feature in every window.
+    Year 0 columns are not considered.
+    Args:
+        df (DataFrame): Modeling frame.
+
+    Returns:
+        tuple: (non-object column Index, list of prefixes)
+    """
+    columns, constant = constant_columns(df)
+    constant = [col for col in constant if "year_0" not in col]
+    return columns, ["_".join(col.split("_")[:-2]) for col in constant]
+
+
+class PrefixTrie:
+    """
+    Trie over a set of column prefixes that tells whether any of them occurs in a column name.
+    Matching follows `prefix in col`, i.e. a prefix may start anywhere in the name; each name is
+    scanned once per start position regardless of the number of prefixes.
+
+    Args:
+        prefixes (iterable): Prefixes to index.
+    """
+
+    def __init__(self, prefixes):
+        self.root = {}
+        for prefix in set(prefixes):
+            node = self.root
+            for ch in prefix:
+                node = node.setdefault(ch, {})
+            node[_END] = True
+
+    def occurs_in(self, name):
+        # an empty prefix occurs in every name
+        if _END in self.root:
+            return True
+        root = self.root
+        for start in range(len(name)):
+            node = root
+            for ch in name[start:]:
+                node = node.get(ch)
+                if node is None:
+                    break
+                if _END in node:
+                    return True
+        return False
+
+
+def drop_prefixed_columns(columns, prefixes, keep=()):
+    """
+    Removes the columns containing any of the given prefixes.
+    Args:
+        columns (iterable): Column names, order is preserved.
+        prefixes (iterable): Prefixes to exclude.
+        keep (iterable): Columns always kept, such as target columns.
+
+    Returns:
+        list: Remaining columns.
+    """
+    trie = PrefixTrie(prefixes)
+    keep = set(keep)
+    return [col for col in columns if col in keep or not trie.occurs_in(col)]
@@ -0,0 +1,135 @@
+import re
+from functools import lru_cache
+from collections import defaultdict
+
+# 'renewal_revenue_year_1_Q2_client' -> feature 'renewal_revenue', year 1, quarter 2, level '_client'
+_COLUMN = re.compile(r'^(?P<feature>.*?)_year_(?P<year>\d+)_Q(?P<quarter>[1-4])(?P<level>.*)$')
+_WINDOW = re.compile(r'year_(\d+)_Q(\d)')
+_YEAR = re.compile(r'year_(\d+)')
+
+
+class ColumnInfo:
+    """
+    One column name decomposed into feature, level suffix, year offset and quarter.
+    Columns without a year/quarter part have year and quarter set to None.
+    """
+
+    __slots__ = ('name', 'feature', 'level', 'year', 'quarter', 'windows', 'years')
+
+    def __init__(self, name):
+        self.name = name
+        match = _COLUMN.match(name)
+        if match:
+            self.feature = match.group('feature')
+            self.level = match.group('level')
+            self.year = int(match.group('year'))
+            self.quarter = int(match.group('quarter'))
+        else:
+            self.feature, self.level, self.year, self.quarter = name, '', None, None
+        # every year/quarter token in the name, some engineered columns carry more than one
+        self.windows = frozenset((int(y), int(q)) for y, q in _WINDOW.findall(name))
+        self.years = frozenset(int(y) for y in _YEAR.findall(name))
+
+
+class ColumnCatalog:
+    """
+    Parsed column names of a modeling frame with lookups by year/quarter window and year.
+    Columns are parsed once; every lookup returns names in the frame's column order.
+
+    Args:
+        columns (iterable): Column names.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.info = {col: ColumnInfo(col) for col in self.columns}
+        self._position = {col: i for i, col in enumerate(self.columns)}
+        self._by_window = defaultdict(list)
+        self._by_year = defaultdict(list)
+        for col, info in self.info.items():
+            for window in info.windows:
+                self._by_window[window].append(col)
+            for year in info.years:
+                self._by_year[year].append(col)
+
+    def _ordered(self, groups):
+        found = set()
+        for group in groups:
+            found.update(group)
+        return sorted(found, key=self._position.__getitem__)
+
+    def in_windows(self, windows):
+        """
+        Columns with a year/quarter part in any of the windows.
+        Args:
+            windows (iterable): 'year_{y}_Q{q}' strings (as from get_preceding_quarters) or (year, quarter) tuples.
+
+        Returns:
+            list: Column names.
+        """
+        keys = [parse_window(w) if isinstance(w, str) else tuple(w) for w in windows]
+        return self._ordered(self._by_window.get(key, ()) for key in keys)
+
+    def in_years(self, years):
+        """
+        Columns with a year part in any of the given years.
+        """
+        return self._ordered(self._by_year.get(year, ()) for year in years)
+
+    def feature_columns(self, feature_suffix, year):
+        """
+        Columns of one year whose feature name ends with feature_suffix,
+        e.g. ('Casualty_csr_revenue', 1) for the Casualty CSR revenue quarters of year 1.
+        """
+        return [col for col in self._by_year.get(year, ())
+                if self.info[col].year == year and self.info[col].feature.endswith(feature_suffix)]
+
+    def latest_window(self):
+        """
+        Most recent (year, quarter) among plain '{feature}_year_{y}_Q{q}' columns, ignoring
+        adjustment columns: the smallest year offset, then the largest quarter within it.
+
+        Returns:
+            tuple: (year, quarter), (10, -1) if no column qualifies.
+        """
+        most_recent = (10, -1)
+        for info in self.info.values():
+            if info.year is None or info.level or len(info.years) > 1 or info.feature.endswith('adjustments'):
+                continue
+            # only the first digit of the year is significant, as in the original column scan
+            year = int(str(info.year)[0])
+            if year < most_recent[0] or (year == most_recent[0] and info.quarter > most_recent[1]):
+                most_recent = (year, info.quarter)
+        return most_recent
+
+
+def parse_window(window):
+    """
+    Parses a 'year_{y}_Q{q}' string into a (year, quarter) tuple.
+    """
+    year, quarter = _WINDOW.search(window).groups()
+    return int(year), int(quarter)
+
+
+def shift_year(name, years=1):
+    """
+    Renames every 'year_{n}' in a column name to 'year_{n - years}'.
+    """
+    return _YEAR.sub(lambda match: f'year_{int(match.group(1)) - years}', name)
+
+
+@lru_cache(maxsize=32)
+def _cached_catalog(columns):
+    return ColumnCatalog(columns)
+
+
+def get_catalog(columns):
+    """
+    Returns the ColumnCatalog of a column list, reusing it for frames with identical columns.
+    Args:
+        columns (iterable): Column names, typically df.columns.
+
+    Returns:
+        ColumnCatalog
+    """
+    return _cached_catalog(tuple(columns))
@@ -0,0 +1,131 @@
+import numpy as np
+from api.utils.tuning.column_catalog import shift_year
+
+
+def find_correlated_groups(df, threshold=0.8, block_size=512):
+    """
+    Groups columns whose absolute pairwise correlation exceeds a threshold.
+    Correlated pairs are treated as edges of a graph and every connected component
+    becomes one group, so groups linked through a shared column are always merged.
+    Args:
+        df (DataFrame): Numeric features to cluster.
+        threshold (float): Absolute correlation above which two columns are linked.
+        block_size (int): Number of columns correlated per block, bounds peak memory
+            to roughly len(df.columns) * block_size floats.
+
+    Returns:
+        dict: Mapping of 'Group N' to the set of column names in that group. Groups are
+            numbered by the position of their first column in df.
+    """
+    columns = list(df.columns)
+    rows, cols = correlated_pairs(df, threshold=threshold, block_size=block_size)
+    labels = connected_components(len(columns), rows, cols)
+
+    linked = np.zeros(len(columns), dtype=bool)
+    linked[rows] = True
+    linked[cols] = True
+
+    # labels are the smallest column index of each component, so sorting by label keeps column order
+    groups = {}
+    for root in np.unique(labels[linked]):
+        members = np.flatnonzero(labels == root)
+        groups[f'Group {len(groups) + 1}'] = {columns[i] for i in members}
+
+    return groups
+
+
+def shift_correlated_groups(correlated_groups, years=1):
+    """
+    Maps correlated groups found on one window onto the window `years` years later,
+    renaming every 'year_{n}' in the member columns to 'year_{n - years}'.
+    Args:
+        correlated_groups (dict): Output of find_correlated_groups.
+        years (int): Number of years to shift by.
+
+    Returns:
+        dict: Groups with the same names and shifted column names.
+    """
+    return {group_name: {shift_year(col, years) for col in columns}
+            for group_name, columns in correlated_groups.items()}
+
+
+def correlated_pairs(df, threshold=0.8, block_size=512):
+    """
+    Finds all column index pairs (i < j) with absolute Pearson correlation above threshold.
+    Args:
+        df (DataFrame): Numeric features.
+        threshold (float): Absolute correlation threshold.
+        block_size (int): Number of columns correlated per block.
+
+    Returns:
+        tuple: Arrays (rows, cols) of column positions for each correlated pair.
+    """
+    values = df.to_numpy(dtype=np.float32)
+    n_cols = values.shape[1]
+
+    if np.isnan(values).any():
+        # pandas handles missing values pairwise, which a single matrix product cannot
+        corr = np.abs(df.corr().to_numpy())
+        rows, cols = np.nonzero(np.triu(corr > threshold, k=1))
+        return rows, cols
+
+    # standardize columns so that the dot product of two columns is their correlation
+    centered = values - values.mean(axis=0)
+    norms = np.sqrt((centered * centered).sum(axis=0))
+    constant = norms == 0
+    norms[constant] = 1
+    standardized = centered / norms
+    # constant columns have undefined correlation and are never linked
+    standardized[:, constant] = 0
+
+    rows, cols = [], []
+    for start in range(0, n_cols, block_size):
+        stop = min(start + block_size, n_cols)
+        # correlate this block against itself and all later columns only (upper triangle)
+        corr = np.abs(standardized[:, start:stop].T @ standardized[:, start:])
+        block_rows, block_cols = np.nonzero(np.triu(corr > threshold, k=1))
+        rows.append(block_rows + start)
+        cols.append(block_cols + start)
+
+    if not rows:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def connected_components(n, rows, cols):
+    """
+    Labels the connected components of an undirected graph given as an edge list.
+    Uses union-find with hooking onto the smaller root followed by full path compression,
+    vectorized over all edges per pass.
+    Args:
+        n (int): Number of nodes.
+        rows (array-like): First node of each edge.
+        cols (array-like): Second node of each edge.
+
+    Returns:
+        ndarray: Component label per node, equal to the smallest node index in its component.
+    """
+    parent = np.arange(n)
+    rows = np.asarray(rows, dtype=np.intp)
+    cols = np.asarray(cols, dtype=np.intp)
+
+    while True:
+        root_rows = parent[rows]
+        root_cols = parent[cols]
+        low = np.minimum(root_rows, root_cols)
+
+        # hook each root onto the smallest root it shares an edge with
+        hooked = parent.copy()
+        np.minimum.at(hooked, root_rows, low)
+        np.minimum.at(hooked, root_cols, low)
+
+        # path compression until every node points directly at its root
+        while True:
+            compressed = hooked[hooked]
+            if np.array_equal(compressed, hooked):
+                break
+            hooked = compressed
+
+        if np.array_equal(hooked, parent):
+            return parent
+        parent = hooked
@@ -0,0 +1,95 @@
+import os
+import pandas as pd
+
+# 'dummies' one-hot encodes categoricals, 'native' keeps them as pandas categoricals for XGBoost
+CATEGORICAL_ENCODING = os.environ.get('XGB_CATEGORICAL_ENCODING', 'dummies').lower()
+ENCODINGS = ('dummies', 'native')
+
+
+def _resolve(encoding):
+    encoding = (encoding or CATEGORICAL_ENCODING).lower()
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unknown categorical encoding {encoding!r}, expected one of {ENCODINGS}')
+    return encoding
+
+
+def xgb_encoding_params(encoding=None):
+    """
+    XGBoost constructor arguments required by the encoding.
+    """
+    if _resolve(encoding) == 'native':
+        return {'enable_categorical': True, 'tree_method': 'hist'}
+    return {}
+
+
+def category_vocabulary(frames, cat_cols):
+    """
+    Builds one sorted category list per column from the union of values in all frames,
+    so that the same value maps to the same code in every frame.
+    Args:
+        frames (list): DataFrames holding the categorical columns.
+        cat_cols (list): Categorical columns.
+
+    Returns:
+        dict: Column name to pd.Index of categories.
+    """
+    vocabulary = {}
+    for col in cat_cols:
+        values = pd.concat([pd.Series(frame[col].unique()) for frame in frames], ignore_index=True).dropna()
+        vocabulary[col] = pd.Index(values.unique()).sort_values()
+    return vocabulary
+
+
+def apply_vocabulary(X, vocabulary):
+    """
+    Casts the categorical columns of X to a fixed vocabulary, values outside it become missing.
+    """
+    X = X.copy()
+    for col, categories in vocabulary.items():
+        X[col] = pd.Categorical(X[col], categories=categories)
+    return X
+
+
+def encode_train_test(X_train, X_test, cat_cols, encoding=None):
+    """
+    Encodes the categorical columns of a train/test pair consistently.
+    'dummies' one-hot encodes both frames and keeps the columns present in both,
+    'native' keeps one categorical column per feature with a shared vocabulary.
+    Args:
+        X_train (DataFrame): Output of feature_engg for the train window.
+        X_test (DataFrame): Output of feature_engg for the test window.
+        cat_cols (list): Categorical columns.
+        encoding (str): 'dummies' or 'native'. Defaults to XGB_CATEGORICAL_ENCODING.
+
+    Returns:
+        tuple: (X_train, X_test) with identical columns.
+    """
+    if _resolve(encoding) == 'native':
+        vocabulary = category_vocabulary([X_train, X_test], cat_cols)
+        return apply_vocabulary(X_train, vocabulary), apply_vocabulary(X_test, vocabulary)
+
+    X_train = pd.get_dummies(X_train, columns=[x for x in cat_cols], drop_first=True)
+    X_test = pd.get_dummies(X_test, columns=[x for x in cat_cols], drop_first=True)
+
+    common_columns = X_train.columns.intersection(X_test.columns)
+    return X_train[common_columns], X_test[common_columns]
+
+
+def encode_like(X, cat_cols, reference, encoding=None):
+    """
+    Encodes a new frame exactly like the frame a model was fit on.
+    Args:
+        X (DataFrame): Output of feature_engg.
+        cat_cols (list): Categorical columns of X.
+        reference (DataFrame): Encoded training frame (only columns and dtypes are used).
+        encoding (str): Encoding of the reference frame.
+
+    Returns:
+        DataFrame: X with the reference columns, missing columns filled with 0.
+    """
+    if _resolve(encoding) == 'native':
+        vocabulary = {col: reference[col].cat.categories for col in cat_cols if col in reference.columns}
+        return apply_vocabulary(X, vocabulary).reindex(columns=reference.columns, fill_value=0)
+
+    X = pd.get_dummies(X, columns=[x for x in cat_cols], drop_first=True)
+    return X.reindex(columns=reference.columns, fill_value=0)
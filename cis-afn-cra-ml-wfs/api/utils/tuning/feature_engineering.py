@@ -1,168 +1,203 @@
 import pandas as pd
 import numpy as np
 
-def feature_engg(trn_df, tst_df, df_cat=None):
-    drop_cols = []
-    upd_cols_trn = {}
-    upd_cols_tst = {}
-    
-    cat_cols = []
-    
-    for col in trn_df.columns:
-        skew_pct = sum(trn_df[col] != 0)/len(trn_df[col])
-        #print(col, ":", np.round(skew_pct*100, 4))
-    
-        if (skew_pct < 0.05) or (len(np.unique(trn_df[col])) <= 5) or (len(np.unique(tst_df[col])) <= 5):
-            drop_cols.append(col)
-            
-        elif (skew_pct >= 0.05) & (skew_pct < 0.4):
-    
-            cat_cols.append(col + "_cat")
-    
-            if (sum(trn_df[col] < 0) > 0 & sum(tst_df[col] < 0) > 0):
-                #Trn DF
-                conditions_trn = [trn_df[col] < 0, trn_df[col] == 0, trn_df[col] > 0]
-                choices_trn = [-1, 0, 1]
-    
-                # Tst DF
-                conditions_tst = [tst_df[col] < 0, tst_df[col] == 0, tst_df[col] > 0]
-                choices_tst = [-1, 0, 1]
-            else:
-                #Trn DF
-                conditions_trn = [trn_df[col] <= 0, trn_df[col] > 0]
-                choices_trn = [0, 1]
-    
-                # Tst DF
-                conditions_tst = [tst_df[col] <= 0, tst_df[col] > 0]
-                choices_tst = [0, 1]
-                       
-            #upd_cat_ord[col + "_cat"] = CategoricalDtype(choices)        
-            try:
-                upd_cols_trn[col + "_cat"] = np.select(conditions_trn, choices_trn)
-            except:
-                print("Error creating categorical variables")
-    
-            #upd_cat_ord[col + "_cat"] = CategoricalDtype(choices)        
-            try:
-                upd_cols_tst[col + "_cat"] = np.select(conditions_tst, choices_tst)
-            except:
-                print("Error creating categorical variables")
-    
-        elif ((skew_pct > 0.4) & (skew_pct <= 0.6)):
-            cat_cols.append(col + "_cat")
-    
-            if ((sum(trn_df[col] < 0) > 0) & (sum(tst_df[col] < 0) > 0) & (sum(trn_df[col] == 0) > 0) & (sum(tst_df[col] == 0) > 0)):
-                #print(col)
-    
-                #Trn DF
-                conditions_trn = [
-                                trn_df[col] < 0, 
-                                trn_df[col] == 0, 
-                                (trn_df[col] > 0) & (trn_df[col] <= trn_df[col].quantile(0.99)),
-                                (trn_df[col] > trn_df[col].quantile(0.99))
-                             ]
-    
-                choices_trn = [-1, 0, 1, 2]
-    
-                # Tst DF
-                conditions_tst = [
-                        tst_df[col] < 0, 
-                        tst_df[col] == 0, 
-                        (tst_df[col] > 0) & (tst_df[col] <= trn_df[col].quantile(0.99)),
-                        (tst_df[col] > trn_df[col].quantile(0.99))
-                     ]
-        
-                choices_tst = [-1, 0, 1, 2]
-    
-            elif ((sum(trn_df[col] <= 0) > 0) & \
-                  (sum((trn_df[col] > 0) & (trn_df[col] <= trn_df[col].quantile(0.99))) > 0) & \
-                  (sum(trn_df[col] > trn_df[col].quantile(0.99)) > 0) & \
-                  (sum(tst_df[col] <= 0) > 0) & \
-                  (sum((tst_df[col] > 0) & (tst_df[col] <= trn_df[col].quantile(0.99))) > 0) & \
-                  (sum(tst_df[col] > trn_df[col].quantile(0.99)) > 0)):
-                #Trn DF
-                conditions_trn = [
-                                trn_df[col] <= 0, 
-                                (trn_df[col] > 0) & (trn_df[col] <= trn_df[col].quantile(0.99)),
-                                (trn_df[col] > trn_df[col].quantile(0.99))
-                             ]
-    
-                choices_trn = [0, 1, 2]
-    
-                # Tst DF
-                conditions_tst = [
-                        tst_df[col] <= 0, 
-                        (tst_df[col] > 0) & (tst_df[col] <= trn_df[col].quantile(0.99)),
-                        (tst_df[col] > trn_df[col].quantile(0.99))
-                     ]
-        
-                choices_tst = [0, 1, 2]
-            else:
-                conditions_trn = [
-                trn_df[col] <= 0, 
-                trn_df[col] > 0
-                     ]
-    
-                choices_trn = [0, 1]
-    
-                # Tst DF
-                conditions_tst = [
-                        tst_df[col] <= 0, 
-                        tst_df[col] > 0
-                     ]
-        
-                choices_tst = [0, 1]
-
-            #upd_cat_ord[col + "_cat"] = CategoricalDtype(choices)
-            
-            try:
-                upd_cols_trn[col + "_cat"] = np.select(conditions_trn, choices_trn)
-            except:
-                print("Error creating trn categorical variables")
-    
-            #upd_cat_ord[col + "_cat"] = CategoricalDtype(choices)
-            
-            try:
-                upd_cols_tst[col + "_cat"] = np.select(conditions_tst, choices_tst)
-            except:
-                print("Error creating tst categorical variables")
-    
-        else:
-            #drop_cols.append(col)
-    
-            # Trn DF
-            try:
-                upd_cols_trn[col + "_log"] = np.log(abs(trn_df[col]) + 0.001) * ((trn_df[col] + 0.0001)/(abs(trn_df[col] + 0.0001)))
-                #upd_cols_trn[col + "_log"] = trn_df[col]
-            except:
-                print("Error creating log transformed variables")
-    
-            # Tst DF
-            try:
-                upd_cols_tst[col + "_log"] = np.log(abs(tst_df[col]) + 0.001) * ((tst_df[col] + 0.0001)/(abs(tst_df[col] + 0.0001)))
-                #upd_cols_tst[col + "_log"] = trn_df[col]
-            except:
-                print("Error creating log transformed variables")
-    
-    
-    trn_df_xfm = pd.DataFrame(upd_cols_trn)
-    tst_df_xfm = pd.DataFrame(upd_cols_tst)
-
-    trn_df_xfm.reset_index(drop=True, inplace=True)
-    tst_df_xfm.reset_index(drop=True, inplace=True)
+
+def column_statistics(values, max_distinct=6):
+    """
+    Computes per-column statistics for a 2-D array in a single pass.
+    Args:
+        values (ndarray): 2-D float array, one column per feature.
+        max_distinct (int): Distinct counts are capped at this value.
+
+    Returns:
+        dict: Arrays keyed by 'nonzero_pct', 'n_neg', 'n_zero', 'n_le_zero' and 'n_distinct'.
+    """
+    n_rows = values.shape[0]
+
+    # distinct values, counted on the column-sorted matrix (NaNs sort last and count once)
+    sorted_values = np.sort(values, axis=0)
+    changed = (sorted_values[1:] != sorted_values[:-1]) & ~(np.isnan(sorted_values[1:]) & np.isnan(sorted_values[:-1]))
+    n_distinct = np.minimum(changed.sum(axis=0) + (n_rows > 0), max_distinct)
+
+    n_neg = (values < 0).sum(axis=0)
+    n_zero = (values == 0).sum(axis=0)
+
+    return {
+        'nonzero_pct': (values != 0).sum(axis=0) / n_rows,
+        'n_neg': n_neg,
+        'n_zero': n_zero,
+        'n_le_zero': n_neg + n_zero,
+        'n_distinct': n_distinct,
+    }
+
+
+def _upper_quantile(values, q=0.99):
+    """
+    Column-wise quantile matching pandas Series.quantile (linear interpolation, NaNs skipped).
+    """
+    if np.isnan(values).any():
+        return np.nanquantile(values, q, axis=0)
+    return np.quantile(values, q, axis=0)
+
+
+def _bin_counts(values, upper):
+    """
+    Counts values in the (0, upper] and (upper, inf) bins per column.
+    """
+    positive_low = ((values > 0) & (values <= upper)).sum(axis=0)
+    high = (values > upper).sum(axis=0)
+    return positive_low, high
+
+
+def _signed_log(values):
+    """
+    Sign-preserving log transform applied to widely spread columns.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log(np.abs(values) + 0.001) * ((values + 0.0001) / (np.abs(values + 0.0001)))
+
+
+def fit_feature_engg(trn_df, tst_df):
+    """
+    Decides how every column is transformed: dropped, binned into a '_cat' categorical or
+    log-transformed. All decisions are taken from statistics computed once over the whole
+    train and test matrices.
+    Args:
+        trn_df (DataFrame): Training features.
+        tst_df (DataFrame): Testing features, with the same columns as trn_df.
+
+    Returns:
+        dict: Transformation plan consumed by apply_feature_engg.
+    """
+    columns = list(trn_df.columns)
+    trn = trn_df.to_numpy(dtype=np.float64)
+    tst = tst_df[columns].to_numpy(dtype=np.float64)
+
+    trn_stats = column_statistics(trn)
+    tst_stats = column_statistics(tst)
+    skew_pct = trn_stats['nonzero_pct']
+
+    drop = (skew_pct < 0.05) | (trn_stats['n_distinct'] <= 5) | (tst_stats['n_distinct'] <= 5)
+    # 5-40% non-zero: two-way split at 0
+    binary = ~drop & (skew_pct >= 0.05) & (skew_pct < 0.4)
+    # 40-60% non-zero: split around 0 and the train 99th percentile
+    tiered = ~drop & (skew_pct > 0.4) & (skew_pct <= 0.6)
+    log = ~drop & ~binary & ~tiered
+
+    # the tiered bins depend on which bins are populated in both train and test
+    tiered_idx = np.flatnonzero(tiered)
+    upper = _upper_quantile(trn[:, tiered_idx])
+    trn_low, trn_high = _bin_counts(trn[:, tiered_idx], upper)
+    tst_low, tst_high = _bin_counts(tst[:, tiered_idx], upper)
+
+    signed = (trn_stats['n_neg'][tiered_idx] > 0) & (tst_stats['n_neg'][tiered_idx] > 0) & \
+             (trn_stats['n_zero'][tiered_idx] > 0) & (tst_stats['n_zero'][tiered_idx] > 0)
+    three_bins = ~signed & (trn_stats['n_le_zero'][tiered_idx] > 0) & (trn_low > 0) & (trn_high > 0) & \
+                 (tst_stats['n_le_zero'][tiered_idx] > 0) & (tst_low > 0) & (tst_high > 0)
+
+    return {
+        'columns': columns,
+        'binary': binary,
+        'tiered': tiered,
+        'log': log,
+        'upper': upper,
+        'signed': signed,
+        'three_bins': three_bins,
+    }
+
+
+def apply_feature_engg(plan, df):
+    """
+    Transforms a feature frame with a plan from fit_feature_engg, writing the binned and
+    log-transformed columns into preallocated arrays.
+    Args:
+        plan (dict): Output of fit_feature_engg.
+        df (DataFrame): Features with (at least) the planned columns.
+
+    Returns:
+        tuple: (df_xfm, cat_cols)
+    """
+    columns = plan['columns']
+    binary, tiered, log = plan['binary'], plan['tiered'], plan['log']
+    upper, signed, three_bins = plan['upper'], plan['signed'], plan['three_bins']
+    values = df[columns].to_numpy(dtype=np.float64)
+
+    def bin_tiered(values):
+        positive_low = (values > 0) & (values <= upper)
+        high = values > upper
+        codes_signed = np.select([values < 0, values == 0, positive_low, high], [-1, 0, 1, 2])
+        codes_three = np.select([values <= 0, positive_low, high], [0, 1, 2])
+        codes_two = np.select([values <= 0, values > 0], [0, 1])
+        return np.where(signed, codes_signed, np.where(three_bins, codes_three, codes_two))
+
+    tiered_idx = np.flatnonzero(tiered)
+    is_cat = binary | tiered
+    cat_idx = np.flatnonzero(is_cat)
+    log_idx = np.flatnonzero(log)
+    # position of each binned column inside the preallocated categorical block
+    cat_pos = np.cumsum(is_cat) - 1
+
+    cat_block = np.empty((values.shape[0], len(cat_idx)), dtype=np.int64)
+    cat_block[:, cat_pos[np.flatnonzero(binary)]] = np.select([values[:, binary] <= 0, values[:, binary] > 0], [0, 1])
+    cat_block[:, cat_pos[tiered_idx]] = bin_tiered(values[:, tiered_idx])
+    log_block = _signed_log(values[:, log_idx])
+
+    # keep the original column order, interleaving binned and log columns
+    upd_cols = {}
+    log_pos = 0
+    for i, col in enumerate(columns):
+        if is_cat[i]:
+            upd_cols[col + "_cat"] = cat_block[:, cat_pos[i]]
+        elif log[i]:
+            upd_cols[col + "_log"] = log_block[:, log_pos]
+            log_pos += 1
+
+    cat_cols = [col + "_cat" for i, col in enumerate(columns) if is_cat[i]]
+    return pd.DataFrame(upd_cols), cat_cols
+
+
+def add_categoricals(df_xfm, cat_cols, df_cat=None):
+    """
+    Appends the optional categorical columns and casts all categorical columns to pandas categoricals.
+    """
+    df_xfm.reset_index(drop=True, inplace=True)
+    cat_cols = list(cat_cols)
 
     if df_cat is not None:
-        # reset indices here?
-        df_cat.reset_index(drop=True, inplace=True)
-        trn_df_xfm = pd.concat([trn_df_xfm, df_cat], axis=1)
-        tst_df_xfm = pd.concat([tst_df_xfm, df_cat], axis=1)
-    
+        df_cat = df_cat.reset_index(drop=True)
+        df_xfm = pd.concat([df_xfm, df_cat], axis=1)
+
         for col in df_cat.columns:
             cat_cols.append(col)
-    
+
     for col in cat_cols:
-        trn_df_xfm[col] = pd.Categorical(trn_df_xfm[col])
-        tst_df_xfm[col] = pd.Categorical(tst_df_xfm[col])
-    
-    return(trn_df_xfm, tst_df_xfm, cat_cols)
-    
\ No newline at end of file
+        df_xfm[col] = pd.Categorical(df_xfm[col])
+
+    return df_xfm, cat_cols
+
+
+def feature_engg(trn_df, tst_df, df_cat=None, return_plan=False):
+    """
+    Bins sparse columns into '_cat' categoricals and log-transforms dense columns.
+    Args:
+        trn_df (DataFrame): Training features.
+        tst_df (DataFrame): Testing features, with the same columns as trn_df.
+        df_cat (DataFrame): Optional categorical columns appended to both outputs.
+        return_plan (bool): Also return the transformation plan, to apply it to later data.
+
+    Returns:
+        tuple: (trn_df_xfm, tst_df_xfm, cat_cols), followed by the plan if return_plan.
+    """
+    plan = fit_feature_engg(trn_df, tst_df)
+    trn_df_xfm, cat_cols = apply_feature_engg(plan, trn_df)
+    tst_df_xfm, cat_cols = apply_feature_engg(plan, tst_df)
+
+    if df_cat is not None:
+        # reset indices here?
+        df_cat.reset_index(drop=True, inplace=True)
+    trn_df_xfm, all_cat_cols = add_categoricals(trn_df_xfm, cat_cols, df_cat)
+    tst_df_xfm, all_cat_cols = add_categoricals(tst_df_xfm, cat_cols, df_cat)
+
+    if return_plan:
+        return(trn_df_xfm, tst_df_xfm, all_cat_cols, plan)
+    return(trn_df_xfm, tst_df_xfm, all_cat_cols)
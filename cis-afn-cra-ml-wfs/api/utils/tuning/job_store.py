@@ -0,0 +1,176 @@
+import io
+import os
+import json
+import uuid
+import logging
+from datetime import datetime, timezone
+import pandas as pd
+import redis
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# broker of the Celery workers, also holding job frames and results
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis-dev-svc:6379/0')
+# seconds a job, its input frame and its results are kept after the last update
+JOB_TTL = int(os.environ.get('JOB_RESULT_TTL', 24 * 3600))
+
+JOB_ACTIONS = ('train', 'score')
+
+
+def to_parquet_bytes(df):
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def from_parquet_bytes(data):
+    return pd.read_parquet(io.BytesIO(data))
+
+
+class JobStore:
+    """
+    Redis state of asynchronous cohort jobs.
+
+    A job is one modeling frame and a list of cohort specs, each run as its own Celery task.
+    The frame is stored once as Parquet; every finished cohort appends an event to the job's
+    event list (completion order, so clients can resume from an offset) and its result frames
+    to the job's result hash as Parquet. All keys of a job expire JOB_TTL seconds after its
+    last update.
+
+    Tasks are acknowledged late, so a cohort whose worker died before the ack runs again.
+    Only its first event is recorded: the job's done hash maps every finished cohort to its
+    event, and progress is counted from distinct cohorts.
+
+    Args:
+        client (redis.Redis): Redis connection.
+        ttl (int): Expiry of the job keys in seconds.
+    """
+
+    def __init__(self, client, ttl=JOB_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    @classmethod
+    def from_url(cls, url=None, ttl=JOB_TTL):
+        return cls(redis.Redis.from_url(url or REDIS_URL), ttl=ttl)
+
+    @staticmethod
+    def _keys(job_id):
+        return {
+            'job': f'job:{job_id}',
+            'frame': f'job:{job_id}:frame',
+            'events': f'job:{job_id}:events',
+            'results': f'job:{job_id}:results',
+            'done': f'job:{job_id}:done',
+        }
+
+    def _touch(self, pipe, job_id):
+        for key in self._keys(job_id).values():
+            pipe.expire(key, self.ttl)
+
+    def create(self, action, df, cohorts):
+        """
+        Registers a job and stores its input frame.
+
+        Returns:
+            str: Job id.
+        """
+        if action not in JOB_ACTIONS:
+            raise ValueError(f'Unknown job action {action!r}, expected one of {JOB_ACTIONS}')
+        job_id = uuid.uuid4().hex
+        keys = self._keys(job_id)
+        pipe = self.client.pipeline()
+        pipe.hset(keys['job'], mapping={'action': action, 'total': len(cohorts), 'cohorts': json.dumps(cohorts),
+                                        'created_at': datetime.now(timezone.utc).isoformat()})
+        pipe.set(keys['frame'], to_parquet_bytes(df))
+        self._touch(pipe, job_id)
+        pipe.execute()
+        logger.info(f'Created {action} job {job_id} with {len(cohorts)} cohorts')
+        return job_id
+
+    def frame(self, job_id):
+        data = self.client.get(self._keys(job_id)['frame'])
+        if data is None:
+            raise KeyError(f'Job {job_id} not found or expired')
+        return from_parquet_bytes(data)
+
+    def add_result(self, job_id, key, frames):
+        """
+        Stores the result frames of a finished cohort and appends its event.
+        Args:
+            job_id (str): Job id.
+            key (str): Cohort key, see model_key.
+            frames (dict): Result name -> DataFrame.
+        """
+        keys = self._keys(job_id)
+        pipe = self.client.pipeline()
+        # a rerun of the cohort overwrites the same fields
+        for name, df in frames.items():
+            pipe.hset(keys['results'], f'{key}|{name}', to_parquet_bytes(df))
+        pipe.execute()
+        self._add_event(job_id, key, {'cohort': key, 'frames': list(frames), 'error': None})
+
+    def add_error(self, job_id, key, error):
+        self._add_event(job_id, key, {'cohort': key, 'frames': [], 'error': error})
+
+    def _add_event(self, job_id, key, event):
+        """
+        Appends the event of a cohort unless the cohort already has one.
+
+        Returns:
+            bool: Whether the event was appended.
+        """
+        keys = self._keys(job_id)
+        event = json.dumps(event)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # the done hash and the event list change together, or not at all if another run got there first
+                    pipe.watch(keys['done'])
+                    if pipe.hexists(keys['done'], key):
+                        pipe.unwatch()
+                        logger.info(f'Job {job_id}: {key} already finished, ignoring its rerun')
+                        return False
+                    pipe.multi()
+                    pipe.hset(keys['done'], key, event)
+                    pipe.rpush(keys['events'], event)
+                    self._touch(pipe, job_id)
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+
+    def events(self, job_id, start=0):
+        """
+        Events of the cohorts finished so far, from offset start, in completion order.
+        """
+        return [json.loads(event) for event in self.client.lrange(self._keys(job_id)['events'], start, -1)]
+
+    def status(self, job_id):
+        """
+        Returns:
+            dict: action, total, completed, failed and finished, None if the job is unknown or expired.
+        """
+        job = self.client.hgetall(self._keys(job_id)['job'])
+        if not job:
+            return None
+        # one event per distinct finished cohort
+        events = [json.loads(event) for event in self.client.hvals(self._keys(job_id)['done'])]
+        total = int(job[b'total'])
+        failed = sum(event['error'] is not None for event in events)
+        return {
+            'job_id': job_id,
+            'action': job[b'action'].decode(),
+            'created_at': job[b'created_at'].decode(),
+            'total': total,
+            'completed': len(events) - failed,
+            'failed': failed,
+            'finished': len(events) >= total,
+        }
+
+    def result(self, job_id, key, name):
+        """
+        Parquet bytes of one result frame of a cohort, None if missing.
+        """
+        return self.client.hget(self._keys(job_id)['results'], f'{key}|{name}')
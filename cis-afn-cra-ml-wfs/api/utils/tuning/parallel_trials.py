@@ -0,0 +1,94 @@
+import time
+import logging
+import numpy as np
+from joblib import Parallel, delayed
+from hyperopt import Trials, space_eval
+from hyperopt.base import Domain, JOB_STATE_DONE, JOB_STATE_NEW, spec_from_misc
+from hyperopt.utils import coarse_utcnow
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ProcessPoolTrials(Trials):
+    """
+    Trials object that evaluates hyperopt suggestions in batches on a process pool.
+
+    hyperopt's fmin hands the whole search over to a trials object that defines fmin
+    (the same hook SparkTrials uses). Each round asks the search algorithm for n_workers
+    points, one at a time, so that TPE sees the still-pending points of the batch, then
+    evaluates the batch in parallel on joblib's loky workers and records the results.
+    Points already queued in the trials (see seed_trials) are evaluated first and, as in
+    hyperopt's own loop, count toward the max_evals budget.
+
+    Args:
+        n_workers (int): Number of trials evaluated concurrently.
+    """
+
+    asynchronous = False
+
+    def __init__(self, n_workers, exp_key=None, refresh=True):
+        super().__init__(exp_key=exp_key, refresh=refresh)
+        self.n_workers = max(1, int(n_workers))
+
+    def fmin(self, fn, space, algo, max_evals, rstate=None, return_argmin=True, timeout=None, early_stop_fn=None, **kwargs):
+        if rstate is None:
+            rstate = np.random.default_rng()
+        domain = Domain(fn, space)
+        start_time = time.time()
+        early_stop_args = []
+        queued = [trial for trial in self._dynamic_trials if trial['state'] == JOB_STATE_NEW]
+        # like hyperopt's FMinIter, max_evals counts every trial, including queued and earlier ones
+        n_suggest = max_evals - len(self.trials)
+
+        with Parallel(n_jobs=self.n_workers, backend='loky') as parallel:
+            while queued or n_suggest > 0:
+                if queued:
+                    batch, queued = queued[:self.n_workers], queued[self.n_workers:]
+                else:
+                    batch = self._suggest_batch(domain, algo, rstate, min(self.n_workers, n_suggest))
+                    n_suggest -= len(batch)
+                if not batch:
+                    break
+                params = [space_eval(space, spec_from_misc(trial['misc'])) for trial in batch]
+                results = parallel(delayed(fn)(p) for p in params)
+                self._record_results(batch, results)
+
+                # budgets are checked between batches, like hyperopt checks them between trials
+                if timeout is not None and time.time() - start_time >= timeout:
+                    logger.info(f'Stopping search after {timeout}s timeout')
+                    break
+                if early_stop_fn is not None:
+                    stop, early_stop_args = early_stop_fn(self, *early_stop_args)
+                    if stop:
+                        logger.info('Stopping search, early stop condition met')
+                        break
+
+        logger.info(f'Evaluated {len(self.trials)} trials on {self.n_workers} workers')
+        if return_argmin:
+            return self.argmin
+
+    def _suggest_batch(self, domain, algo, rstate, n_trials):
+        """
+        Asks the algorithm for up to n_trials new points, inserting each as pending before the next.
+        """
+        batch = []
+        for _ in range(n_trials):
+            new_ids = self.new_trial_ids(1)
+            self.refresh()
+            new_trials = algo(new_ids, domain, self, rstate.integers(2 ** 31 - 1))
+            if not new_trials:
+                break
+            self.insert_trial_docs(new_trials)
+            self.refresh()
+            batch.extend(self._dynamic_trials[-len(new_trials):])
+        return batch
+
+    def _record_results(self, batch, results):
+        now = coarse_utcnow()
+        for trial, result in zip(batch, results):
+            trial['state'] = JOB_STATE_DONE
+            trial['result'] = result
+            trial['book_time'] = trial['book_time'] or now
+            trial['refresh_time'] = now
+        self.refresh()
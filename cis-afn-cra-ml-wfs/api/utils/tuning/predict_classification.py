@@ -3,6 +3,17 @@ import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 
 
+def fit_classification(trn_df_xfm, target_df_trn, params):
+    params['n_estimators'] = int(params['n_estimators'])
+    params['min_samples_split'] = int(params['min_samples_split'])
+    params['min_samples_leaf'] = int(params['min_samples_leaf'])
+
+    rf_model = RandomForestClassifier(**params)
+
+    rf_model.fit(trn_df_xfm, target_df_trn)
+    return rf_model
+
+
 def predict_classification(trn_df_xfm, tst_df_xfm, target_df_trn, cat_cols, optimal_threshold, params):
 
     trn_df_xfm = pd.get_dummies(trn_df_xfm, columns=[x for x in cat_cols], drop_first=True)
@@ -12,13 +23,7 @@ def predict_classification(trn_df_xfm, tst_df_xfm, target_df_trn, cat_cols, opti
     trn_df_xfm = trn_df_xfm[common_columns]
     tst_df_xfm = tst_df_xfm[common_columns]
 
-    params['n_estimators'] = int(params['n_estimators'])
-    params['min_samples_split'] = int(params['min_samples_split'])
-    params['min_samples_leaf'] = int(params['min_samples_leaf'])
-
-    rf_model = RandomForestClassifier(**params)
-
-    rf_model.fit(trn_df_xfm, target_df_trn)
+    rf_model = fit_classification(trn_df_xfm, target_df_trn, params)
 
     y_pred_proba = rf_model.predict_proba(tst_df_xfm)[:, 1] 
 
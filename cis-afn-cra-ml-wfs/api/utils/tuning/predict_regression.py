@@ -1,19 +1,31 @@
 import xgboost as xgb
 import pandas as pd
+from api.utils.tuning.encoding import encode_train_test, xgb_encoding_params
+from api.utils.tuning.reg_model_optimizer import booster_params, XGB_MAX_BIN, XGB_N_JOBS
+from api.utils.util_functions.utils import get_cpu_limit
 
-def predict_regression(X_train, y_train, X_test, cat_cols, best_params):
-    
-    X_train = pd.get_dummies(X_train, columns=[x for x in cat_cols], drop_first=True)
-    X_test = pd.get_dummies(X_test, columns=[x for x in cat_cols], drop_first=True)
+def fit_regression(X_train, y_train, best_params, encoding=None, max_bin=None, n_jobs=None):
+    """
+    Fits the final model with the booster settings the search scored its parameters with (see booster_params),
+    so its binning matches the search and the early-stopped n_estimators.
+    Args:
+        max_bin (int): Histogram bins. Defaults to XGB_MAX_BIN, as in the search.
+        n_jobs (int): XGBoost threads. Defaults to XGB_N_JOBS, else the CPU limit.
+    """
+    best_params = dict(best_params, max_depth=int(best_params['max_depth']))
+    encoding_params = xgb_encoding_params(encoding)
+    params, num_boost_round = booster_params(best_params, int(n_jobs or XGB_N_JOBS or get_cpu_limit()),
+                                             int(max_bin or XGB_MAX_BIN), encoding_params)
+    params['n_jobs'] = params.pop('nthread')
+
+    xgb_model = xgb.XGBRegressor(n_estimators=num_boost_round, enable_categorical=encoding_params.get('enable_categorical', False), **params)
+    xgb_model.fit(X_train, y_train)
+    return xgb_model
 
-    common_columns = X_train.columns.intersection(X_test.columns)
-    X_train = X_train[common_columns]
-    X_test = X_test[common_columns]
+def predict_regression(X_train, y_train, X_test, cat_cols, best_params, encoding=None):
     
-    best_params['max_depth'] = int(best_params['max_depth'])
-    best_params['n_estimators'] = int(best_params['n_estimators'])
+    X_train, X_test = encode_train_test(X_train, X_test, cat_cols, encoding)
 
-    xgb_model = xgb.XGBRegressor(**best_params)
-    xgb_model.fit(X_train, y_train)
+    xgb_model = fit_regression(X_train, y_train, best_params, encoding)
     predictions = xgb_model.predict(X_test)
-    return predictions
\ No newline at end of file
+    return predictions
@@ -2,39 +2,16 @@ import logging
 import pandas as pd
 import json
 import numpy as np
+from api.utils.tuning.column_analysis import constant_prefixes, drop_prefixed_columns
+from api.utils.tuning.column_catalog import get_catalog
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 #  Find most recent year (should always be 0) and quarter (0-3) within data
 def get_last_year_quarter(df):
-    
-    # Initialize variables to track the most recent year and quarter
-    most_recent_year = 10
-    most_recent_quarter = -1
-
-    # Iterate through the column names
-
-    pattern = '.*_year_([0-9]\d*)_Q([1-4])$'
-    # Filter the DataFrame to include only the matching columns
-    no_adjust = [col for col in df.columns if 'adjustments_year_' not in col and col.count('year_') < 2]
-    df_no_adjust = df[no_adjust]
-    year_cols = df_no_adjust.filter(regex=pattern).columns
-    for column in list(year_cols):
-        # Split the column name to extract year and quarter
-        parts = column.split('year_')
-        year_quarter = parts[1]
-        year = int(year_quarter[0])  # Extract the year part
-        quarter = int(year_quarter[-1])  # Extract the quarter part (remove 'Q' and convert to int)
-
-        # Check if this year is more recent
-        if year < most_recent_year:
-            most_recent_year = year
-            most_recent_quarter = quarter  # Reset quarter to the current one
-        elif year == most_recent_year:
-            # If the year is the same, check for the greatest quarter
-            if quarter > most_recent_quarter:
-                most_recent_quarter = quarter
+    # smallest year offset and greatest quarter within it, among the plain year/quarter columns
+    most_recent_year, most_recent_quarter = get_catalog(df.columns).latest_window()
 
     # Output the most recent year and quarter
     return (most_recent_year,most_recent_quarter)
@@ -57,9 +34,19 @@ def get_preceding_quarters(year, quarter, num_quarters):
     return preceding_quarters
 
 
-def read_infile(df, zone, product, qtr, inference):
+def analyze_infile(df, zone, product):
+    """
+    Runs the parts of read_infile that do not depend on the tuning/inference window:
+    cleans final_mip_desc, extracts keys and categorical columns, finds zero-variance
+    columns and the latest year/quarter. The result can be reused for both passes.
+    Args:
+        df (DataFrame): Cohort modeling frame.
+        zone (str): Zone of the cohort, 'None' for all zones.
+        product (str): Product of the cohort, 'None' for all products.
 
-    
+    Returns:
+        dict: Cached analysis consumed by select_window.
+    """
     df.loc[df['final_mip_desc'] == 'Missing','final_mip_desc'] = np.nan
     df.loc[df.final_mip_desc.isnull(), 'final_mip_desc'] = "Others"
 
@@ -73,17 +60,7 @@ def read_infile(df, zone, product, qtr, inference):
         df_cat = df.loc[:, ['final_mip_desc', 'market_segment']]
 
     #Remove columns with 0 variance and their correspoinding year/qtr columns
-    x = df.dtypes
-    x = x[x != 'object'].index
-
-    temp = df[x]
-    y = temp.apply(lambda x: len(np.unique(x)) == 1)
-
-    y = y[y == True].index
-
-    y = [y for y in y if "year_0" not in y]
-
-    y = ["_".join(y.split("_")[:-2]) for y in y]
+    x, y = constant_prefixes(df)
 
     latest_year, latest_quarter = get_last_year_quarter(df)
 
@@ -91,6 +68,38 @@ def read_infile(df, zone, product, qtr, inference):
     preceding_quarters = get_preceding_quarters(latest_year, latest_quarter, 7)
     logger.info(f'Preceeding Quarters: {preceding_quarters}')
     logger.info(f'Latest Quarter: {latest_quarter}')
+
+    return {
+        'df': df,
+        'df_keys': df_keys,
+        'df_cat': df_cat,
+        'numeric_cols': x,
+        'constant_prefixes': y,
+        'latest_year': latest_year,
+        'latest_quarter': latest_quarter,
+        'preceding_quarters': preceding_quarters,
+    }
+
+
+def select_window(analysis, qtr, inference):
+    """
+    Selects the modeling columns and targets for the tuning or inference window
+    from a cached analyze_infile result.
+    Args:
+        analysis (dict): Output of analyze_infile.
+        qtr (int): Quarter offset (0-3) of the target to predict.
+        inference (bool): Whether to build the inference window.
+
+    Returns:
+        tuple: (df, target_df_trn, target_df_tst)
+    """
+    df = analysis['df']
+    x = analysis['numeric_cols']
+    y = analysis['constant_prefixes']
+    latest_year = analysis['latest_year']
+    latest_quarter = analysis['latest_quarter']
+    preceding_quarters = analysis['preceding_quarters']
+
     # define target columns for training
     if inference == False:
         target_cols_trn = [f'renewal_revenue_' + year_quarter for year_quarter in preceding_quarters[-4:]][::-1]
@@ -104,14 +113,7 @@ def read_infile(df, zone, product, qtr, inference):
     logger.info(f'Target Cols Test: {target_cols_tst}')
     
     cols_ignore = target_cols_trn + target_cols_tst
-    c_cols = []
-    for col in x:
-        if col in cols_ignore:
-            c_cols.append(col)
-        elif sum([itm in col for itm in y]) > 0:
-            continue
-        else:
-            c_cols.append(col)
+    c_cols = drop_prefixed_columns(x, y, keep=cols_ignore)
 
 
     df = df.loc[:, c_cols]
@@ -124,5 +126,11 @@ def read_infile(df, zone, product, qtr, inference):
     target_df_trn = df[target_cols_trn[qtr]]
     target_df_tst = df[target_cols_tst[qtr]]
 
-    return(df, df_keys, df_cat, target_df_trn, target_df_tst, latest_quarter)
-        
\ No newline at end of file
+    return(df, target_df_trn, target_df_tst)
+
+
+def read_infile(df, zone, product, qtr, inference):
+    analysis = analyze_infile(df, zone, product)
+    df, target_df_trn, target_df_tst = select_window(analysis, qtr, inference)
+
+    return(df, analysis['df_keys'], analysis['df_cat'], target_df_trn, target_df_tst, analysis['latest_quarter'])
@@ -1,57 +1,95 @@
 import pandas as pd
 import numpy as np
+from api.utils.tuning.column_analysis import constant_prefixes
+from api.utils.tuning.column_catalog import get_catalog
 
 
-def read_infile_cls(source_df, product, inference):
-    # df = source_df[source_df['Recurring'] == recurring]
-    # df.reset_index(drop=True, inplace=True)
-    df = source_df
+# a client's size is decided separately within each recurring split
+CLIENT_SIZE_KEYS = ['Recurring', 'client_number']
 
-    # establish conditons for when a client has revenue greater than 250k and greater than 10k (will be used to define client size)
-    if inference == False:
-        rev_train = list(df.filter(like='csr_revenue_year_2').columns)
-        rev_test = list(df.filter(like='csr_revenue_year_1').columns)
-    else:
-        rev_train = list(df.filter(like='csr_revenue_year_1').columns)
-        rev_test = list(df.filter(like='csr_revenue_year_1').columns)
-
-    train_condition_df = df.groupby('client_number')[rev_train].sum().reset_index()
-    test_condition_df = df.groupby('client_number')[rev_test].sum().reset_index()
-    
-    large_client_train_condition = train_condition_df[rev_train].sum(axis=1) > 250000
-    large_client_test_condition = test_condition_df[rev_test].sum(axis=1) > 250000
-    
-    mid_client_train_condition = train_condition_df[rev_train].sum(axis=1) > 10000
-    mid_client_test_condition = test_condition_df[rev_test].sum(axis=1) > 10000
-    
-    df['large_client_train_condition'] = large_client_train_condition
-    df['large_client_test_condition'] = large_client_test_condition
-    
-    df['mid_client_train_condition'] = mid_client_train_condition
-    df['mid_client_test_condition'] = mid_client_test_condition
 
+def client_size_table(df):
+    """
+    Builds the client size table of a run: per client, the revenue totals and the
+    large (>250k) / mid (>10k) flags of the train and test windows, for both the tuning
+    and the inference pass. Computed with a single groupby over the modeling frame.
+    Args:
+        df (DataFrame): Classification modeling frame.
+
+    Returns:
+        DataFrame: One row per Recurring, client_number and inference flag.
+    """
+    catalog = get_catalog(df.columns)
+    revenue = pd.DataFrame({
+        'revenue_year_2': df[catalog.feature_columns('csr_revenue', 2)].sum(axis=1),
+        'revenue_year_1': df[catalog.feature_columns('csr_revenue', 1)].sum(axis=1),
+    })
+    totals = revenue.groupby([df[key] for key in CLIENT_SIZE_KEYS]).sum()
+
+    tables = []
+    for inference in (False, True):
+        # tuning trains on year 2 revenue, inference on year 1; both test on year 1
+        train_total = totals['revenue_year_1'] if inference else totals['revenue_year_2']
+        test_total = totals['revenue_year_1']
+        tables.append(pd.DataFrame({
+            'inference': inference,
+            'train_revenue': train_total,
+            'test_revenue': test_total,
+            'large_client_train_condition': train_total > 250000,
+            'large_client_test_condition': test_total > 250000,
+            'mid_client_train_condition': train_total > 10000,
+            'mid_client_test_condition': test_total > 10000,
+        }))
+    return pd.concat(tables).reset_index()
+
+
+def join_client_sizes(df, client_sizes, inference):
+    """
+    Looks up the client size flags of every row of df in a client_size_table.
+    Args:
+        df (DataFrame): Classification modeling frame.
+        client_sizes (DataFrame): Output of client_size_table.
+        inference (bool): Whether to use the inference pass flags.
+
+    Returns:
+        DataFrame: Condition columns indexed like df.
+    """
+    table = client_sizes[client_sizes['inference'] == inference].drop(columns='inference')
+    conditions = df[CLIENT_SIZE_KEYS].merge(table, on=CLIENT_SIZE_KEYS, how='left')
+    conditions.index = df.index
+    return conditions
+
+
+def client_size_conditions(df, inference):
+    return join_client_sizes(df, client_size_table(df), inference)
+
+
+def add_client_size_conditions(df, inference):
+    # establish conditons for when a client has revenue greater than 250k and greater than 10k (will be used to define client size)
     df.reset_index(drop=True, inplace=True)
+    conditions = client_size_conditions(df, inference)
+    for col in conditions.columns:
+        df[col] = conditions[col]
+
     print(df.shape)
+    return df
 
+
+def analyze_infile_cls(df):
     df_keys = df.loc[:, ['client_number', 'Recurring']]
 
     #Remove columns with 0 variance and their correspoinding year/qtr columns
-    x = df.dtypes
-    x = x[x != 'object'].index
-    
-    temp = df[x]
-    y = temp.apply(lambda x: len(np.unique(x)) == 1)
-    
-    y = y[y == True].index
-    print(len(y))
-    
-    y = [y for y in y if "year_0" not in y]
+    x, y = constant_prefixes(df)
     print(len(y))
-    
-    y = ["_".join(y.split("_")[:-2]) for y in y]
 
+    return {'df_keys': df_keys, 'constant_prefixes': y}
+
+
+def read_infile_cls(source_df, product, inference):
+    # df = source_df[source_df['Recurring'] == recurring]
+    # df.reset_index(drop=True, inplace=True)
+    df = add_client_size_conditions(source_df, inference)
+    analysis = analyze_infile_cls(df)
 
-    df.reset_index(drop=True, inplace=True)
     print(df.shape)
-    return(df, df_keys)
-        
\ No newline at end of file
+    return(df, analysis['df_keys'])
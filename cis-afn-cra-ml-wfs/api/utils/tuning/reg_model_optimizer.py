@@ -1,29 +1,228 @@
+import os
+import math
+import uuid
 import logging
 import numpy as np
 import pandas as pd
 import xgboost as xgb
 import hyperopt
 from hyperopt import fmin, tpe, hp, STATUS_OK, Trials
+from hyperopt.fmin import generate_trial
 from hyperopt.pyll.base import scope
+from api.utils.tuning.parallel_trials import ProcessPoolTrials
+from api.utils.tuning.encoding import encode_train_test, xgb_encoding_params
+from api.utils.util_functions.utils import get_cpu_limit
 hyperopt.pyll.stochastic.tqdm = lambda *args, **kwargs: None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 'process' evaluates trials in parallel batches, 'serial' runs hyperopt's sequential loop
+OPTIMIZER_BACKEND = os.environ.get('REG_OPTIMIZER_BACKEND', 'process').lower()
+# trials evaluated concurrently by the process backend (defaults to CPU limit // XGB threads)
+OPTIMIZER_WORKERS = os.environ.get('REG_OPTIMIZER_WORKERS')
+# threads per XGBoost fit (defaults to 1 for the process backend, the CPU limit for serial)
+XGB_N_JOBS = os.environ.get('XGB_N_JOBS')
+# search budget: trial count, wall-clock seconds and trials without improvement before stopping
+OPTIMIZER_MAX_EVALS = int(os.environ.get('REG_OPTIMIZER_MAX_EVALS', 100))
+OPTIMIZER_TIMEOUT = os.environ.get('REG_OPTIMIZER_TIMEOUT')
+OPTIMIZER_PATIENCE = os.environ.get('REG_OPTIMIZER_PATIENCE')
+# boosting rounds without improvement on the test split before a trial stops adding trees, 0 to disable
+XGB_EARLY_STOPPING_ROUNDS = int(os.environ.get('XGB_EARLY_STOPPING_ROUNDS', 50))
+# histogram bins of the quantized matrices shared by all trials (XGBoost's default is 256)
+XGB_MAX_BIN = int(os.environ.get('XGB_MAX_BIN', 256))
+# warm starts from a previous search of the cohort: share of the trial budget spent, and the
+# part of it kept for new points rather than prior ones
+OPTIMIZER_WARM_BUDGET = float(os.environ.get('REG_OPTIMIZER_WARM_BUDGET', 0.3))
+OPTIMIZER_WARM_EXPLORE = float(os.environ.get('REG_OPTIMIZER_WARM_EXPLORE', 0.5))
+# best trials kept in the search history for the next warm start
+OPTIMIZER_HISTORY_SIZE = int(os.environ.get('REG_OPTIMIZER_HISTORY_SIZE', 5))
+
+# search space bounds, learning_rate is sampled log-uniformly within them
+PARAM_BOUNDS = {
+    'max_depth': (2, 5),
+    'n_estimators': (100, 2000),
+    'learning_rate': (math.exp(-4), math.exp(-1)),
+    'subsample': (0.6, 1),
+    'colsample_bytree': (0.6, 1),
+    'gamma': (0, 1),
+    'reg_alpha': (0, 50),
+    'reg_lambda': (10, 100),
+}
+INT_PARAMS = ('max_depth', 'n_estimators')
+
+# quantized matrices per process, keyed by TrainingMatrices.key; process workers outlive a
+# single search, so only the most recent few searches are kept
+_MATRIX_CACHE = {}
+_MATRIX_CACHE_SIZE = 4
+
+
+class TrainingMatrices:
+    """
+    Train/eval QuantileDMatrix pair built once per process and reused by every trial.
+
+    DMatrix objects cannot be pickled, so the frames travel to process workers and each
+    worker quantizes them on its first trial; later trials in that worker hit the cache.
+
+    Args:
+        X_train (DataFrame): Encoded training features.
+        y_train (Series): Training target.
+        X_test (DataFrame): Encoded evaluation features.
+        y_test (Series): Evaluation target.
+        max_bin (int): Number of histogram bins.
+        enable_categorical (bool): Whether X contains pandas categoricals for XGBoost.
+    """
+
+    def __init__(self, X_train, y_train, X_test, y_test, max_bin=XGB_MAX_BIN, enable_categorical=False):
+        self.key = uuid.uuid4().hex
+        self.X_train = X_train
+        self.y_train = y_train
+        self.X_test = X_test
+        self.y_test = y_test
+        self.max_bin = max_bin
+        self.enable_categorical = enable_categorical
+
+    def get(self):
+        """
+        Returns:
+            tuple: (dtrain, dtest), the evaluation matrix sharing the training quantile cuts.
+        """
+        if self.key not in _MATRIX_CACHE:
+            dtrain = xgb.QuantileDMatrix(self.X_train, self.y_train, max_bin=self.max_bin, enable_categorical=self.enable_categorical)
+            dtest = xgb.QuantileDMatrix(self.X_test, self.y_test, ref=dtrain, enable_categorical=self.enable_categorical)
+            while len(_MATRIX_CACHE) >= _MATRIX_CACHE_SIZE:
+                _MATRIX_CACHE.pop(next(iter(_MATRIX_CACHE)))
+            _MATRIX_CACHE[self.key] = (dtrain, dtest)
+        return _MATRIX_CACHE[self.key]
+
+    def release(self):
+        _MATRIX_CACHE.pop(self.key, None)
+
+
+def booster_params(params, n_jobs, max_bin, encoding_params):
+    """
+    Maps the sampled XGBRegressor parameters onto xgb.train arguments.
+
+    Returns:
+        tuple: (params for xgb.train, num_boost_round)
+    """
+    params = dict(params)
+    num_boost_round = int(params.pop('n_estimators'))
+    params.update({'objective': 'reg:squarederror', 'tree_method': 'hist', 'max_bin': max_bin, 'nthread': n_jobs})
+    params.update({k: v for k, v in encoding_params.items() if k != 'enable_categorical'})
+    return params, num_boost_round
+
+
+def get_trials_backend(backend=None, n_workers=None, xgb_n_jobs=None):
+    """
+    Resolves the trials object and XGBoost thread count for a hyperopt search.
+    Trials in flight x XGBoost threads per trial is kept within the container's CPU limit.
+    Args:
+        backend (str): 'process' or 'serial'. Defaults to REG_OPTIMIZER_BACKEND.
+        n_workers (int): Concurrent trials for the process backend. Defaults to REG_OPTIMIZER_WORKERS.
+        xgb_n_jobs (int): Threads per XGBoost fit. Defaults to XGB_N_JOBS.
+
+    Returns:
+        tuple: (trials, xgb_n_jobs)
+    """
+    backend = (backend or OPTIMIZER_BACKEND).lower()
+    cpu_limit = get_cpu_limit()
+
+    if backend == 'serial':
+        xgb_n_jobs = int(xgb_n_jobs or XGB_N_JOBS or cpu_limit)
+        return Trials(), xgb_n_jobs
+    elif backend == 'process':
+        xgb_n_jobs = int(xgb_n_jobs or XGB_N_JOBS or 1)
+        n_workers = int(n_workers or OPTIMIZER_WORKERS or max(1, cpu_limit // xgb_n_jobs))
+        return ProcessPoolTrials(n_workers=n_workers), xgb_n_jobs
+    else:
+        raise ValueError(f"Unknown optimizer backend '{backend}', expected 'process' or 'serial'")
+
+
+def no_improvement_stop(patience):
+    """
+    Builds a hyperopt early_stop_fn that stops once the best loss is `patience` finished trials old.
+    Only looks at the recorded losses, so it works the same for serial and batched trials.
+    """
+    def early_stop_fn(trials, *args):
+        losses = [np.inf if loss is None else loss for loss in trials.losses()]
+        if not losses:
+            return False, []
+        trials_since_best = len(losses) - 1 - int(np.argmin(losses))
+        return trials_since_best >= patience, []
+    return early_stop_fn
+
+
+def prior_points(prior_trials):
+    """
+    Turns prior best parameters or search history entries into points of the search space,
+    clipped to PARAM_BOUNDS. Entries missing a parameter are skipped.
+    """
+    points = []
+    for prior in prior_trials or []:
+        if any(name not in prior for name in PARAM_BOUNDS):
+            continue
+        point = {name: float(np.clip(float(prior[name]), low, high)) for name, (low, high) in PARAM_BOUNDS.items()}
+        for name in INT_PARAMS:
+            point[name] = int(round(point[name]))
+        points.append(point)
+    return points
+
+
+def warm_start_budget(max_evals, n_prior, budget=None, explore=None):
+    """
+    Splits a warm-started search into prior points and new trials.
+    Args:
+        max_evals (int): Trial budget of a cold search.
+        n_prior (int): Number of prior points available.
+        budget (float): Share of max_evals spent. Defaults to REG_OPTIMIZER_WARM_BUDGET.
+        explore (float): Share of that budget reserved for new points. Defaults to REG_OPTIMIZER_WARM_EXPLORE.
+
+    Returns:
+        tuple: (number of prior points evaluated, number of new trials)
+    """
+    budget = OPTIMIZER_WARM_BUDGET if budget is None else budget
+    explore = OPTIMIZER_WARM_EXPLORE if explore is None else explore
+    total = max(1, math.ceil(max_evals * budget))
+    n_explore = max(1, math.ceil(total * explore))
+    n_seeds = max(0, min(n_prior, total - n_explore))
+    return n_seeds, total - n_seeds
+
+
+def seed_trials(trials, points):
+    """
+    Queues points in a trials object; fmin evaluates them before asking TPE for new points.
+    """
+    tids = trials.new_trial_ids(len(points))
+    trials.insert_trial_docs([generate_trial(tid, point) for tid, point in zip(tids, points)])
+    trials.refresh()
+
+
+def search_history(trials, k=None):
+    """
+    Sampled parameters of the k best finished trials, best first, to warm-start the next search.
+    """
+    k = k or OPTIMIZER_HISTORY_SIZE
+    finished = sorted((trial for trial in trials.trials if trial['result'].get('status') == STATUS_OK),
+                      key=lambda trial: trial['result']['loss'])
+    return [{name: float(vals[0]) for name, vals in trial['misc']['vals'].items() if vals} for trial in finished[:k]]
+
 
 # Define the hyperparameter space
-def reg_model_optimizer(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols):
+def reg_model_optimizer(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols, backend=None, n_workers=None, xgb_n_jobs=None,
+                        max_evals=None, timeout=None, patience=None, early_stopping_rounds=None, encoding=None, max_bin=None,
+                        prior_trials=None, warm_budget=None, warm_explore=None, return_history=False):
     logging.getLogger('hyperopt').setLevel(logging.WARNING)
 
     space = {
-        'max_depth': scope.int(hp.quniform('max_depth', 2, 5, 1)),
-        'n_estimators': scope.int(hp.quniform('n_estimators', 100, 2000, 200)),
+        'max_depth': scope.int(hp.quniform('max_depth', *PARAM_BOUNDS['max_depth'], 1)),
+        'n_estimators': scope.int(hp.quniform('n_estimators', *PARAM_BOUNDS['n_estimators'], 200)),
         'learning_rate': hp.loguniform('learning_rate', -4, -1),
-        'subsample': hp.uniform('subsample', 0.6, 1),
-        'colsample_bytree': hp.uniform('colsample_bytree', 0.6, 1),
-        'gamma': hp.uniform ('gamma', 0,1),
-        'reg_alpha' : hp.uniform('reg_alpha', 0,50),
-        'reg_lambda' : hp.uniform('reg_lambda', 10,100),
+        'subsample': hp.uniform('subsample', *PARAM_BOUNDS['subsample']),
+        'colsample_bytree': hp.uniform('colsample_bytree', *PARAM_BOUNDS['colsample_bytree']),
+        'gamma': hp.uniform ('gamma', *PARAM_BOUNDS['gamma']),
+        'reg_alpha' : hp.uniform('reg_alpha', *PARAM_BOUNDS['reg_alpha']),
+        'reg_lambda' : hp.uniform('reg_lambda', *PARAM_BOUNDS['reg_lambda']),
     }
     
     def calc_score(y_test, y_pred):
@@ -32,9 +231,13 @@ def reg_model_optimizer(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, ca
     
     # Define the objective function to minimize
     def objective(params):
-        xgb_model = xgb.XGBRegressor(**params)
-        xgb_model.fit(X_train, y_train)
-        y_pred = xgb_model.predict(X_test)
+        dtrain, dtest = matrices.get()
+        params, num_boost_round = booster_params(params, xgb_n_jobs, max_bin, encoding_params)
+        booster = xgb.train(params, dtrain, num_boost_round=num_boost_round, evals=[(dtest, 'test')],
+                            early_stopping_rounds=early_stopping_rounds or None, verbose_eval=False)
+        # predictions use the best iteration found by early stopping, every round without it
+        best_iteration = booster.best_iteration if early_stopping_rounds else booster.num_boosted_rounds() - 1
+        y_pred = booster.predict(dtest, iteration_range=(0, best_iteration + 1))
         # Check if sum of y_test is zero
         if sum(y_test.values) == 0:
             # Calculate residuals
@@ -42,30 +245,51 @@ def reg_model_optimizer(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, ca
             score = np.sum(np.abs(residuals))
         else:
             score = calc_score(y_test, y_pred)
-        return {'loss': score, 'status': STATUS_OK, 'prediction': np.sum(y_pred), 'actual': np.sum(y_test)}
+        return {'loss': score, 'status': STATUS_OK, 'prediction': np.sum(y_pred), 'actual': np.sum(y_test),
+                'best_iteration': int(best_iteration)}
     
     # Perform the optimization
-    ## Create dtrain
+    ## Create dtrain and dtest with the same encoded columns
     X_train = trn_df_xfm
     y_train = target_df_trn
-    X_train = pd.get_dummies(X_train, columns=[x for x in cat_cols], drop_first=True)
-    logger.info('Created DF Train')
-    ## Create dtest
-    # Make predictions
     X_test = tst_df_xfm
     y_test = target_df_tst
-    X_test = pd.get_dummies(X_test, columns=[x for x in cat_cols], drop_first=True)
-    logger.info('Created DF Test')
-
-    d_cols = list(set(X_train.columns) - set(X_test.columns)) + list(set(X_test.columns) - set(X_train.columns))
-    f_cols = list(set(X_test.columns) - set(d_cols))
-    
-    X_train = X_train[f_cols]
-    X_test = X_test[f_cols]
-    logger.info('Created DF Train and Test with relevant features')
+    X_train, X_test = encode_train_test(X_train, X_test, cat_cols, encoding)
+    encoding_params = xgb_encoding_params(encoding)
+    logger.info(f'Created DF Train and Test with {X_train.shape[1]} relevant features')
     
-    trials = Trials()
-    logger.info('Initialized Trials')
-    best_params = fmin(objective, space, algo=tpe.suggest, max_evals=100, trials=trials, show_progressbar=False)
+    trials, xgb_n_jobs = get_trials_backend(backend, n_workers, xgb_n_jobs)
+    logger.info(f'Initialized {type(trials).__name__} with {xgb_n_jobs} XGBoost threads per trial')
+    max_evals = int(max_evals or OPTIMIZER_MAX_EVALS)
+    # prior points of the cohort are evaluated first, TPE then only refines around them;
+    # fmin's max_evals counts the queued points, so the budget is seeds + new trials
+    points = prior_points(prior_trials)
+    if points:
+        n_seeds, n_new = warm_start_budget(max_evals, len(points), warm_budget, warm_explore)
+        seed_trials(trials, points[:n_seeds])
+        max_evals = n_seeds + n_new
+        logger.info(f'Warm start with {n_seeds} prior points and {n_new} new trials')
+    timeout = timeout or OPTIMIZER_TIMEOUT
+    timeout = int(timeout) if timeout else None
+    patience = patience or OPTIMIZER_PATIENCE
+    early_stop_fn = no_improvement_stop(int(patience)) if patience else None
+    # 0 turns early stopping off
+    early_stopping_rounds = XGB_EARLY_STOPPING_ROUNDS if early_stopping_rounds is None else int(early_stopping_rounds)
+    max_bin = int(max_bin or XGB_MAX_BIN)
+    # quantize once, every trial trains on the same matrices
+    matrices = TrainingMatrices(X_train, y_train, X_test, y_test, max_bin=max_bin,
+                                enable_categorical=encoding_params.get('enable_categorical', False))
+
+    # released even when the search fails, the worker process outlives it
+    try:
+        best_params = fmin(objective, space, algo=tpe.suggest, max_evals=max_evals, trials=trials, timeout=timeout,
+                           early_stop_fn=early_stop_fn, show_progressbar=False)
+    finally:
+        matrices.release()
+    logger.info(f'Finished search after {len(trials.trials)} trials')
     rounded_best_params = {k: round(float(v), 5) if isinstance(v, (float, np.float64)) else int(v) for k, v in best_params.items()}
-    return rounded_best_params
\ No newline at end of file
+    # carry the early-stopped tree count so the final fit does not grow the full n_estimators
+    rounded_best_params['n_estimators'] = trials.best_trial['result']['best_iteration'] + 1
+    if return_history:
+        return rounded_best_params, search_history(trials)
+    return rounded_best_params
@@ -1,6 +1,8 @@
 import logging
 import pandas as pd
 import numpy as np
+from api.utils.tuning.correlated_groups import shift_correlated_groups
+from api.utils.tuning.column_catalog import get_catalog
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,39 +41,13 @@ def prep_test_df(df, correlated_groups, latest_quarter, inference):
     else:
         preceding_quarters = get_preceding_quarters(0, latest_quarter + 1, 8)
         logger.info(f'Inference Testing Cols: {preceding_quarters}')
-    tst_cols = [col for col in tst_cols if any(quarter in col for quarter in preceding_quarters)]
+    tst_cols = get_catalog(tst_cols).in_windows(preceding_quarters)
 
     tst_df = df[tst_cols]
     
-    ## Update column names by adjusting year values ##
-    # Step 1: Extract unique year values
-    tst_correlated_groups = {}
-    unique_years = set()
-    for columns in correlated_groups.values():
-        for col in columns:
-            # Extract the year part from the column name
-            year_part = col.split('_Q')[0][-1]  # split on _Q and grab the value right to the left, which is the year value
-            unique_years.add(year_part)
+    ## Update column names by adjusting year values to match the train set ##
+    tst_correlated_groups = shift_correlated_groups(correlated_groups)
 
-    # Step 2: Sort the unique year values
-    sorted_years = sorted(int(year) for year in unique_years)
-
-    # Step 3: Replace year values in the columns
-    for group_name, columns in correlated_groups.items():
-        temp = list(columns)
-        for year in sorted_years:
-            # Replace 'year_{year}' with 'year_{year - 1}'
-            temp = [x.replace(f"year_{year}", f"year_{year - 1}") for x in temp]
-    
-        tst_correlated_groups[group_name] = {}
-        for itm in temp:
-            if not tst_correlated_groups[group_name]:
-                tst_correlated_groups[group_name] = {itm}
-            else:
-                tst_correlated_groups[group_name].add(itm)
-    
-        #print(tst_correlated_groups[group_name])
-    
     corr_cols = []
     #print("Correlated Groups:")
     for group_name, columns in tst_correlated_groups.items():
@@ -1,28 +1,37 @@
 import pandas as pd
 import numpy as np
-def prep_test_df_cls(df, correlated_groups, client_size, product, inference):
+from api.utils.tuning.read_infile_cls import join_client_sizes
+from api.utils.tuning.correlated_groups import shift_correlated_groups
+from api.utils.tuning.column_catalog import get_catalog
+
+def prep_test_df_cls(df, correlated_groups, client_size, product, inference, client_sizes=None):
 
     # filter data according to client size (less than 10k ,between 10k and 250k, greater than 250k)
+    # join against the precomputed client size table, else use the columns written onto df by read_infile_cls
+    if client_sizes is not None:
+        conditions = join_client_sizes(df, client_sizes, inference)
+    else:
+        conditions = df
     if client_size == 'large':
-        df = df[(df['large_client_test_condition']==True)]
+        df = df[(conditions['large_client_test_condition']==True)]
     elif client_size == 'medium':
-        df = df[(df['large_client_test_condition']==False) & (df['mid_client_test_condition']==True)]
+        df = df[(conditions['large_client_test_condition']==False) & (conditions['mid_client_test_condition']==True)]
     else:
-        df = df[(df['mid_client_test_condition']==False)]
+        df = df[(conditions['mid_client_test_condition']==False)]
 
 
     tst_clients= df.index.tolist()
-    tst_cols = df.columns
+    catalog = get_catalog(df.columns)
     
     # Get target and feature cols
     if inference == False:
         
-        target_cols_tst = list(df.filter(like = f'{product}_csr_revenue_year_1').columns)
-        tst_cols = [col for col in tst_cols if "year_2" in col or "year_3" in col]
+        target_cols_tst = catalog.feature_columns(f'{product}_csr_revenue', 1)
+        tst_cols = catalog.in_years([2, 3])
 
     else:
-        target_cols_tst = list(df.filter(like = f'{product}_csr_revenue_year_1').columns)
-        tst_cols = [col for col in tst_cols if "year_1" in col or "year_2" in col]
+        target_cols_tst = catalog.feature_columns(f'{product}_csr_revenue', 1)
+        tst_cols = catalog.in_years([1, 2])
 
 
     tst_df = df[tst_cols]
@@ -31,34 +40,8 @@ def prep_test_df_cls(df, correlated_groups, client_size, product, inference):
     print(df.shape)
         
 
-    ## Need to update the feature names of our test set by updating the year values to match the train set ##
-    # Step 1: Extract unique year values
-    tst_correlated_groups = {}
-    unique_years = set()
-    for columns in correlated_groups.values():
-        for col in columns:
-            # Extract the year part from the column name
-            year_part = col.split('_Q')[0][-1]  # split on _Q and grab the value right to the left, which is the year value
-            unique_years.add(year_part)
-
-    # Step 2: Sort the unique year values
-    sorted_years = sorted(int(year) for year in unique_years)
-
-    # Step 3: Replace year values in the columns
-    for group_name, columns in correlated_groups.items():
-        temp = list(columns)
-        for year in sorted_years:
-            # Replace 'year_{year}' with 'year_{year - 1}'
-            temp = [x.replace(f"year_{year}", f"year_{year - 1}") for x in temp]
-    
-        tst_correlated_groups[group_name] = {}
-        for itm in temp:
-            if not tst_correlated_groups[group_name]:
-                tst_correlated_groups[group_name] = {itm}
-            else:
-                tst_correlated_groups[group_name].add(itm)
-    
-        #print(tst_correlated_groups[group_name])
+    ## Update column names by adjusting year values to match the train set ##
+    tst_correlated_groups = shift_correlated_groups(correlated_groups)
 
     corr_cols = []
     #print("Correlated Groups:")
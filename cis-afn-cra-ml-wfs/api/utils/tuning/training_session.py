@@ -0,0 +1,373 @@
+import logging
+from api.utils.tuning.read_infile import analyze_infile, select_window
+from api.utils.tuning.read_infile_cls import client_size_table, analyze_infile_cls
+from api.utils.tuning.trn_df import prep_trn_df
+from api.utils.tuning.test_df import prep_test_df
+from api.utils.tuning.trn_df_cls import prep_trn_df_cls
+from api.utils.tuning.test_df_cls import prep_test_df_cls
+from api.utils.tuning.correlated_groups import shift_correlated_groups
+from api.utils.tuning.feature_engineering import feature_engg, apply_feature_engg, add_categoricals
+from api.utils.tuning.reg_model_optimizer import reg_model_optimizer
+from api.utils.tuning.tune_classification import tune_classification
+from api.utils.tuning.predict_regression import predict_regression, fit_regression
+from api.utils.tuning.predict_classification import predict_classification
+from api.utils.tuning.encoding import encode_train_test, encode_like
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INFERENCE_MODES = ('refit', 'reuse')
+
+
+def _check_mode(mode):
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f'Unknown inference mode {mode!r}, expected one of {INFERENCE_MODES}')
+
+
+def _check_layout(expected, found):
+    # features are named by position, so restored models only score frames with the training layout
+    if list(expected.values()) != list(found.values()):
+        missing = [col for col in expected.values() if col not in set(found.values())]
+        raise ValueError(f'Inference features do not match the stored model layout, missing {missing[:10]}')
+
+
+class RegressionTrainingSession:
+    """
+    Tuning and inference passes of one regression cohort.
+
+    The window-independent part of read_infile (key/categorical extraction, zero-variance
+    analysis, latest quarter) is computed once and shared by both passes. After tune(),
+    predict() either refits on the inference window with the tuned parameters ('refit',
+    the original behaviour) or scores the inference window with the estimator fit on the
+    tuning window ('reuse'), which skips building the inference train frame entirely.
+    A tuned session can be persisted with artifacts() and restored with from_artifacts()
+    to score a later frame without tuning again.
+
+    Args:
+        source_df (DataFrame): Cohort modeling frame.
+        zone (str): Zone of the cohort, 'None' for all zones.
+        product (str): Product of the cohort, 'None' for all products.
+        quarter (int): Quarter offset (0-3) of the target to predict.
+        encoding (str): Categorical encoding for XGBoost, see encode_train_test.
+    """
+
+    def __init__(self, source_df, zone, product, quarter, encoding=None):
+        self.zone = zone
+        self.product = product
+        self.quarter = quarter
+        self.encoding = encoding
+        self.analysis = analyze_infile(source_df, zone, product)
+        self.best_params = None
+        self.search_history = None
+        self._tuning = None
+        self._estimator = None
+        self._reference = None
+        self._layout = None
+
+    @property
+    def df_keys(self):
+        return self.analysis['df_keys']
+
+    def prepare(self, inference):
+        """
+        Builds the train/test frames of the tuning or inference window.
+        """
+        latest_quarter = self.analysis['latest_quarter']
+        df, target_df_trn, target_df_tst = select_window(self.analysis, self.quarter, inference)
+        trn_df, feature_dict_trn, correlated_groups = prep_trn_df(df, latest_quarter, inference)
+        tst_df, feature_dict_tst = prep_test_df(df, correlated_groups, latest_quarter, inference)
+        trn_df_xfm, tst_df_xfm, cat_cols, plan = feature_engg(trn_df, tst_df, self.analysis['df_cat'], return_plan=True)
+        return {
+            'trn_df': trn_df,
+            'trn_df_xfm': trn_df_xfm,
+            'tst_df_xfm': tst_df_xfm,
+            'target_df_trn': target_df_trn,
+            'target_df_tst': target_df_tst,
+            'cat_cols': cat_cols,
+            'correlated_groups': correlated_groups,
+            'feature_dict_trn': feature_dict_trn,
+            'plan': plan,
+        }
+
+    def tune(self, prior_trials=None, **optimizer_kwargs):
+        """
+        Runs the hyperparameter search on the tuning window.
+        Args:
+            prior_trials (list): Search history or best parameters of a previous run, to warm-start the search.
+            **optimizer_kwargs: Passed through to reg_model_optimizer.
+
+        Returns:
+            dict: Best parameters.
+        """
+        self._tuning = self.prepare(inference=False)
+        self.best_params, self.search_history = reg_model_optimizer(self._tuning['trn_df_xfm'], self._tuning['tst_df_xfm'],
+                                                                    self._tuning['target_df_trn'], self._tuning['target_df_tst'],
+                                                                    self._tuning['cat_cols'], encoding=self.encoding, prior_trials=prior_trials,
+                                                                    return_history=True, **optimizer_kwargs)
+        self._estimator = None
+        self._layout = None
+        return self.best_params
+
+    @property
+    def estimator(self):
+        """
+        XGBRegressor fit with the tuned parameters on the tuning window train frame.
+        """
+        if self.best_params is None:
+            raise RuntimeError('tune() must be called before the estimator is available')
+        if self._estimator is None:
+            t = self._tuning
+            X_train, X_test = encode_train_test(t['trn_df_xfm'], t['tst_df_xfm'], t['cat_cols'], self.encoding)
+            self._estimator = fit_regression(X_train, t['target_df_trn'], dict(self.best_params), self.encoding)
+            # empty frame carrying the encoded columns and category vocabularies
+            self._reference = X_train.iloc[:0]
+        return self._estimator
+
+    def predict(self, mode='refit'):
+        """
+        Scores the inference window.
+        Args:
+            mode (str): 'refit' to fit a fresh model on the inference window,
+                'reuse' to score with the estimator from the tuning window.
+
+        Returns:
+            ndarray: One prediction per row of df_keys.
+        """
+        _check_mode(mode)
+        if self.best_params is None:
+            raise RuntimeError('tune() must be called before predict()')
+
+        if mode == 'refit':
+            w = self.prepare(inference=True)
+            return predict_regression(w['trn_df_xfm'], w['target_df_trn'], w['tst_df_xfm'], w['cat_cols'], dict(self.best_params), self.encoding)
+
+        tst_df_xfm, cat_cols = self._reuse_test_frame()
+        estimator = self.estimator
+        return estimator.predict(encode_like(tst_df_xfm, cat_cols, self._reference, self.encoding))
+
+    def _reuse_test_frame(self):
+        # only the inference test frame is needed, laid out like the tuning train frame:
+        # the tuning groups are shifted once here and once more inside prep_test_df
+        latest_quarter = self.analysis['latest_quarter']
+        df, _, _ = select_window(self.analysis, self.quarter, inference=True)
+        tst_groups = shift_correlated_groups(self._tuning['correlated_groups'])
+        tst_df, feature_dict_tst = prep_test_df(df, tst_groups, latest_quarter, inference=True)
+        if self._layout is None:
+            self._layout = feature_dict_tst
+        else:
+            _check_layout(self._layout, feature_dict_tst)
+
+        # binned with the tuning window thresholds the estimator was fit on
+        tst_df_xfm, cat_cols = apply_feature_engg(self._tuning['plan'], tst_df)
+        return add_categoricals(tst_df_xfm, cat_cols, self.analysis['df_cat'])
+
+    def artifacts(self):
+        """
+        Everything needed to score a later frame of this cohort in 'reuse' mode.
+
+        Returns:
+            dict: Picklable artifacts for ArtifactStore.save.
+        """
+        estimator = self.estimator
+        if self._layout is None:
+            self._reuse_test_frame()
+        return {
+            'zone': self.zone,
+            'product': self.product,
+            'quarter': self.quarter,
+            'encoding': self.encoding,
+            'best_params': self.best_params,
+            'search_history': self.search_history,
+            'estimator': estimator,
+            'reference': self._reference,
+            'constant_prefixes': self.analysis['constant_prefixes'],
+            'correlated_groups': self._tuning['correlated_groups'],
+            'feature_dict_trn': self._tuning['feature_dict_trn'],
+            'feature_dict_tst': self._layout,
+            'plan': self._tuning['plan'],
+        }
+
+    @classmethod
+    def from_artifacts(cls, source_df, artifacts):
+        """
+        Restores a tuned session on a new modeling frame of the same cohort.
+        The zero-variance exclusions of the training frame are kept, so the new frame
+        yields the feature layout the stored estimator was fit on.
+        Args:
+            source_df (DataFrame): Cohort modeling frame to score.
+            artifacts (dict): Output of artifacts().
+
+        Returns:
+            RegressionTrainingSession
+        """
+        session = cls(source_df, artifacts['zone'], artifacts['product'], artifacts['quarter'], artifacts['encoding'])
+        session.analysis['constant_prefixes'] = artifacts['constant_prefixes']
+        session.best_params = artifacts['best_params']
+        session.search_history = artifacts['search_history']
+        session._estimator = artifacts['estimator']
+        session._reference = artifacts['reference']
+        session._layout = artifacts['feature_dict_tst']
+        session._tuning = {key: artifacts[key] for key in ('correlated_groups', 'feature_dict_trn', 'plan')}
+        return session
+
+
+class ClassificationTrainingSession:
+    """
+    Tuning and inference passes of one classification cohort, see RegressionTrainingSession.
+
+    The zero-variance analysis, client keys and client size table of both windows are
+    computed once. source_df is never modified, so one frame can back several sessions.
+    Tuned sessions are persisted and restored with artifacts() and from_artifacts().
+
+    Args:
+        source_df (DataFrame): Modeling frame of one recurring flag.
+        client_size (str): 'large', 'medium' or 'small'.
+        product (str): Product line to model.
+        client_sizes (DataFrame): Optional precomputed client_size_table of the run.
+    """
+
+    def __init__(self, source_df, client_size, product, client_sizes=None):
+        self.source_df = source_df
+        self.client_size = client_size
+        self.product = product
+        self.client_sizes = client_size_table(source_df) if client_sizes is None else client_sizes
+        self.analysis = analyze_infile_cls(source_df)
+        self.best_params = None
+        self.optimal_threshold = None
+        self.feature_importance = None
+        self.estimator = None
+        self._tuning = None
+        self._layout = None
+
+    @property
+    def df_keys(self):
+        return self.analysis['df_keys']
+
+    def prepare(self, inference):
+        """
+        Builds the train/test frames of the tuning or inference window.
+        """
+        df = self.source_df
+        trn_df, feature_dict_trn, correlated_groups, target_df_trn = prep_trn_df_cls(df, client_size=self.client_size, product=self.product, inference=inference, client_sizes=self.client_sizes)
+        tst_df, feature_dict_tst, target_df_tst, tst_clients = prep_test_df_cls(df, correlated_groups, client_size=self.client_size, product=self.product, inference=inference, client_sizes=self.client_sizes)
+        trn_df_xfm, tst_df_xfm, cat_cols, plan = feature_engg(trn_df, tst_df, return_plan=True)
+        return {
+            'trn_df': trn_df,
+            'trn_df_xfm': trn_df_xfm,
+            'tst_df_xfm': tst_df_xfm,
+            'target_df_trn': target_df_trn,
+            'target_df_tst': target_df_tst,
+            'tst_clients': tst_clients,
+            'cat_cols': cat_cols,
+            'correlated_groups': correlated_groups,
+            'feature_dict_trn': feature_dict_trn,
+            'plan': plan,
+        }
+
+    def tune(self, prior_params=None):
+        """
+        Runs the grid search on the tuning window and keeps the best estimator.
+        Args:
+            prior_params (list): Best parameters of previous runs, to search a narrowed grid.
+
+        Returns:
+            tuple: (best_params, optimal_threshold)
+        """
+        t = self.prepare(inference=False)
+        self.best_params, self.optimal_threshold, self.feature_importance, t['trn_df_xfm'], self.estimator = \
+            tune_classification(t['trn_df_xfm'], t['tst_df_xfm'], t['target_df_trn'], t['target_df_tst'], t['cat_cols'], prior_params=prior_params)
+        self._tuning = t
+        self._layout = None
+        return self.best_params, self.optimal_threshold
+
+    @property
+    def tuning(self):
+        """
+        Tuning window frames, including the encoded train frame returned by tune_classification.
+        """
+        return self._tuning
+
+    def predict(self, mode='refit'):
+        """
+        Scores the inference window.
+        Args:
+            mode (str): 'refit' to fit a fresh RandomForest on the inference window,
+                'reuse' to score with the best estimator of the grid search.
+
+        Returns:
+            tuple: (prediction_values, y_pred_proba, tst_clients)
+        """
+        _check_mode(mode)
+        if self.best_params is None:
+            raise RuntimeError('tune() must be called before predict()')
+
+        if mode == 'refit':
+            w = self.prepare(inference=True)
+            prediction_values, y_pred_proba = predict_classification(w['trn_df_xfm'], w['tst_df_xfm'], w['target_df_trn'], w['cat_cols'], self.optimal_threshold, dict(self.best_params))
+            return prediction_values, y_pred_proba, w['tst_clients']
+
+        tst_df_xfm, cat_cols, tst_clients = self._reuse_test_frame()
+        reference = self._tuning['trn_df_xfm'].iloc[:0]
+        y_pred_proba = self.estimator.predict_proba(encode_like(tst_df_xfm, cat_cols, reference, 'dummies'))[:, 1]
+        prediction_values = (y_pred_proba >= self.optimal_threshold).astype(int)
+        return prediction_values, y_pred_proba, tst_clients
+
+    def _reuse_test_frame(self):
+        tst_groups = shift_correlated_groups(self._tuning['correlated_groups'])
+        tst_df, feature_dict_tst, target_df_tst, tst_clients = prep_test_df_cls(self.source_df, tst_groups, client_size=self.client_size, product=self.product, inference=True, client_sizes=self.client_sizes)
+        if self._layout is None:
+            self._layout = feature_dict_tst
+        else:
+            _check_layout(self._layout, feature_dict_tst)
+
+        tst_df_xfm, cat_cols = apply_feature_engg(self._tuning['plan'], tst_df)
+        tst_df_xfm, cat_cols = add_categoricals(tst_df_xfm, cat_cols)
+        return tst_df_xfm, cat_cols, tst_clients
+
+    def artifacts(self):
+        """
+        Everything needed to score a later frame of this cohort in 'reuse' mode.
+
+        Returns:
+            dict: Picklable artifacts for ArtifactStore.save.
+        """
+        if self.best_params is None:
+            raise RuntimeError('tune() must be called before artifacts()')
+        if self._layout is None:
+            self._reuse_test_frame()
+        return {
+            'client_size': self.client_size,
+            'product': self.product,
+            'best_params': self.best_params,
+            'optimal_threshold': self.optimal_threshold,
+            'feature_importance': self.feature_importance,
+            'estimator': self.estimator,
+            # empty frame carrying the dummy-encoded training columns
+            'reference': self._tuning['trn_df_xfm'].iloc[:0],
+            'correlated_groups': self._tuning['correlated_groups'],
+            'feature_dict_trn': self._tuning['feature_dict_trn'],
+            'feature_dict_tst': self._layout,
+            'plan': self._tuning['plan'],
+        }
+
+    @classmethod
+    def from_artifacts(cls, source_df, artifacts, client_sizes=None):
+        """
+        Restores a tuned session on a new modeling frame of the same recurring flag.
+        Args:
+            source_df (DataFrame): Modeling frame to score.
+            artifacts (dict): Output of artifacts().
+            client_sizes (DataFrame): Optional precomputed client_size_table of source_df.
+
+        Returns:
+            ClassificationTrainingSession
+        """
+        session = cls(source_df, artifacts['client_size'], artifacts['product'], client_sizes=client_sizes)
+        session.best_params = artifacts['best_params']
+        session.optimal_threshold = artifacts['optimal_threshold']
+        session.feature_importance = artifacts['feature_importance']
+        session.estimator = artifacts['estimator']
+        session._layout = artifacts['feature_dict_tst']
+        session._tuning = {key: artifacts[key] for key in ('correlated_groups', 'feature_dict_trn', 'plan')}
+        session._tuning['trn_df_xfm'] = artifacts['reference']
+        return session
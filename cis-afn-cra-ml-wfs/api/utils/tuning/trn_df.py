@@ -1,6 +1,8 @@
 import logging
 import numpy as np
 import pandas as pd
+from api.utils.tuning.correlated_groups import find_correlated_groups
+from api.utils.tuning.column_catalog import get_catalog
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -40,7 +42,7 @@ def prep_trn_df(df, latest_quarter, inference):
     else:
         preceding_quarters = get_preceding_quarters(1, latest_quarter + 1, 8)
         logger.info(f'Inference Training Columns {preceding_quarters}')
-    trn_cols = [col for col in trn_cols if any(quarter in col for quarter in preceding_quarters)]
+    trn_cols = get_catalog(trn_cols).in_windows(preceding_quarters)
 
     trn_df = df[trn_cols]
     #print("trn_df shape", trn_df.shape)
@@ -85,37 +87,3 @@ def prep_trn_df(df, latest_quarter, inference):
     trn_df.columns = list(feature_dict_trn.keys())
 
     return(trn_df, feature_dict_trn, correlated_groups)
-
-def find_correlated_groups(df, threshold=0.8):
-    # Calculate the correlation matrix
-    corr_matrix = df.corr().abs()
-    
-    # Create a boolean mask for the upper triangle of the correlation matrix
-    mask = np.triu(np.ones_like(corr_matrix, dtype=bool), k=1)
-    
-    # Get the pairs of correlated columns
-    correlated_pairs = corr_matrix.where(mask).stack().reset_index()
-    
-    # Filter pairs based on the threshold
-    correlated_pairs = correlated_pairs[correlated_pairs[0]> threshold]
-    
-    # Create a dictionary to hold groups of correlated columns
-    groups = {}
-    
-    for index, row in correlated_pairs.iterrows():
-        col1, col2 = row['level_0'], row['level_1']
-        
-        # Find or create a group for col1
-        group_found = False
-        for key in groups.keys():
-            if col1 in groups[key] or col2 in groups[key]:
-                groups[key].add(col1)
-                groups[key].add(col2)
-                group_found = True
-                break
-        
-        # If no group was found, create a new one
-        if not group_found:
-            groups[f'Group {len(groups) + 1}'] = {col1, col2}
-    
-    return groups
\ No newline at end of file
@@ -1,36 +1,44 @@
 import logging
 import pandas as pd
+from api.utils.tuning.correlated_groups import find_correlated_groups
+from api.utils.tuning.column_catalog import get_catalog
 import numpy as np
+from api.utils.tuning.read_infile_cls import join_client_sizes
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def prep_trn_df_cls(df, client_size, product, inference):
+def prep_trn_df_cls(df, client_size, product, inference, client_sizes=None):
 
     # filter data according to client size (less than 10k ,between 10k and 250k, greater than 250k)
+    # join against the precomputed client size table, else use the columns written onto df by read_infile_cls
+    if client_sizes is not None:
+        conditions = join_client_sizes(df, client_sizes, inference)
+    else:
+        conditions = df
     if client_size == 'large':
-        df = df[(df['large_client_train_condition']==True)]
+        df = df[(conditions['large_client_train_condition']==True)]
     elif client_size == 'medium':
-        df = df[(df['large_client_train_condition']==False) & (df['mid_client_train_condition']==True)]
+        df = df[(conditions['large_client_train_condition']==False) & (conditions['mid_client_train_condition']==True)]
     else:
-        df = df[(df['mid_client_train_condition']==False)]
+        df = df[(conditions['mid_client_train_condition']==False)]
     
 
     # Get target cols, which is the CSR for the current product in 2023
-    trn_cols = df.columns
+    catalog = get_catalog(df.columns)
 
 
     if inference == False:
 
-        target_cols_trn = list(df.filter(like = f'{product}_csr_revenue_year_2').columns)
+        target_cols_trn = catalog.feature_columns(f'{product}_csr_revenue', 2)
         target_df_trn = (df[target_cols_trn].sum(axis=1).round(0) > 0).astype(int)
-        trn_cols = [col for col in trn_cols if "year_4" in col or "year_3" in col]
+        trn_cols = catalog.in_years([4, 3])
 
     else:
 
-        target_cols_trn = list(df.filter(like = f'{product}_csr_revenue_year_1').columns)
+        target_cols_trn = catalog.feature_columns(f'{product}_csr_revenue', 1)
         target_df_trn = (df[target_cols_trn].sum(axis=1).round(0) > 0).astype(int)
-        trn_cols = [col for col in trn_cols if "year_2" in col or "year_3" in col]
+        trn_cols = catalog.in_years([2, 3])
 
 
    
@@ -75,38 +83,3 @@ def prep_trn_df_cls(df, client_size, product, inference):
     trn_df.columns = list(feature_dict_trn.keys())
 
     return(trn_df, feature_dict_trn, correlated_groups, target_df_trn)
-
-
-def find_correlated_groups(df, threshold=0.8):
-    # Calculate the correlation matrix
-    corr_matrix = df.corr().abs()
-    
-    # Create a boolean mask for the upper triangle of the correlation matrix
-    mask = np.triu(np.ones_like(corr_matrix, dtype=bool), k=1)
-    
-    # Get the pairs of correlated columns
-    correlated_pairs = corr_matrix.where(mask).stack().reset_index()
-    
-    # Filter pairs based on the threshold
-    correlated_pairs = correlated_pairs[correlated_pairs[0]> threshold]
-    
-    # Create a dictionary to hold groups of correlated columns
-    groups = {}
-    
-    for index, row in correlated_pairs.iterrows():
-        col1, col2 = row['level_0'], row['level_1']
-        
-        # Find or create a group for col1
-        group_found = False
-        for key in groups.keys():
-            if col1 in groups[key] or col2 in groups[key]:
-                groups[key].add(col1)
-                groups[key].add(col2)
-                group_found = True
-                break
-        
-        # If no group was found, create a new one
-        if not group_found:
-            groups[f'Group {len(groups) + 1}'] = {col1, col2}
-    
-    return groups
\ No newline at end of file
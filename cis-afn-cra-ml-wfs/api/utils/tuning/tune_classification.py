@@ -1,10 +1,122 @@
+import os
+import math
+import numbers
 import pandas as pd
 import numpy as np
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import GridSearchCV
-from sklearn.metrics import confusion_matrix
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, RandomizedSearchCV, ParameterGrid
+from api.utils.util_functions.utils import find_best_weights, get_cpu_limit
 
-def tune_classification(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols):
+# 'grid' (exhaustive), 'halving' (successive halving on n_estimators) or 'random' (fixed budget)
+SEARCH_STRATEGY = os.environ.get('TUNE_CLS_SEARCH', 'grid').lower()
+# number of sampled configurations for the 'random' strategy
+SEARCH_N_ITER = int(os.environ.get('TUNE_CLS_N_ITER', 20))
+SEARCH_STRATEGIES = ('grid', 'halving', 'random')
+# warm starts: configurations drawn from the full grid, as a share of the narrowed grid size
+SEARCH_WARM_EXPLORE = float(os.environ.get('TUNE_CLS_WARM_EXPLORE', 0.25))
+
+
+def narrow_param_grid(param_grid, prior_params, explore_fraction=None, random_state=42):
+    """
+    Narrows a grid around the best parameters of previous runs of the cohort.
+    Numeric parameters keep the prior value and its grid neighbours, other parameters only
+    the prior value. Single configurations sampled from the full grid are added for exploration.
+    Args:
+        param_grid (dict): Full grid.
+        prior_params (list): Best parameter dicts of previous runs.
+        explore_fraction (float): Explored configurations relative to the narrowed grid size.
+            Defaults to TUNE_CLS_WARM_EXPLORE.
+        random_state (int): Seed for the explored configurations.
+
+    Returns:
+        list: Grids accepted by every search strategy.
+    """
+    explore_fraction = SEARCH_WARM_EXPLORE if explore_fraction is None else explore_fraction
+    grids = []
+    for prior in prior_params:
+        grid = {}
+        for name, values in param_grid.items():
+            values = list(values)
+            value = prior.get(name)
+            if name not in prior or value not in values:
+                grid[name] = values
+            elif all(isinstance(v, numbers.Number) and not isinstance(v, bool) for v in values):
+                i = values.index(value)
+                grid[name] = values[max(0, i - 1):i + 2]
+            else:
+                grid[name] = [value]
+        if grid not in grids:
+            grids.append(grid)
+
+    narrowed = list(ParameterGrid(grids))
+    candidates = [config for config in ParameterGrid(param_grid) if config not in narrowed]
+    n_explore = min(len(candidates), math.ceil(len(narrowed) * explore_fraction))
+    rng = np.random.default_rng(random_state)
+    for i in rng.choice(len(candidates), size=n_explore, replace=False):
+        grids.append({name: [value] for name, value in candidates[i].items()})
+    return grids
+
+
+class FullBudgetHalvingGridSearchCV(HalvingGridSearchCV):
+    """
+    Successive halving whose refit trains the winning configuration with max_resources.
+
+    HalvingGridSearchCV refits best_estimator_ with the resource of the last round, which is
+    min_resources * factor ** k and usually falls short of max_resources (e.g. 144 of 150 trees),
+    or stops even earlier once few candidates are left.
+    """
+
+    def fit(self, X, y=None, **params):
+        super().fit(X, y, **params)
+        if self.refit and self.best_params_[self.resource] != self.max_resources:
+            self.best_params_ = dict(self.best_params_, **{self.resource: self.max_resources})
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y, **params)
+        return self
+
+
+def get_search(strategy, estimator, param_grid, cv=2, n_iter=SEARCH_N_ITER, random_state=42, n_jobs=None):
+    """
+    Builds the hyperparameter search for the RandomForest grid.
+    Args:
+        strategy (str): 'grid', 'halving' or 'random'.
+        estimator: Estimator to tune.
+        param_grid (dict): Grid of parameters, or list of grids, must contain 'n_estimators'.
+        cv (int): Number of folds.
+        n_iter (int): Number of configurations sampled by the 'random' strategy.
+        random_state (int): Seed for the 'random' and 'halving' strategies.
+        n_jobs (int): Parallel fits. Defaults to get_cpu_limit(), which is the thread cap of a cohort pool worker.
+
+    Returns:
+        Unfitted sklearn search object.
+    """
+    # not -1: that starts one process per machine CPU in every cohort pool worker
+    n_jobs = int(n_jobs or get_cpu_limit())
+
+    if strategy == 'grid':
+        return GridSearchCV(estimator=estimator, param_grid=param_grid, cv=cv, n_jobs=n_jobs)
+
+    if strategy == 'random':
+        return RandomizedSearchCV(estimator=estimator, param_distributions=param_grid, n_iter=n_iter,
+                                  cv=cv, n_jobs=n_jobs, random_state=random_state)
+
+    if strategy == 'halving':
+        # n_estimators is the budget: every configuration starts with a few trees and the best
+        # third moves on to three times as many; the winner is refit with the largest grid value
+        grids = param_grid if isinstance(param_grid, list) else [param_grid]
+        grid = [{k: v for k, v in g.items() if k != 'n_estimators'} for g in grids]
+        grid = grid if isinstance(param_grid, list) else grid[0]
+        factor = 3
+        max_resources = int(max(np.max(g['n_estimators']) for g in grids))
+        return FullBudgetHalvingGridSearchCV(estimator=estimator, param_grid=grid, resource='n_estimators',
+                                   max_resources=max_resources, min_resources=max(1, max_resources // factor ** 2),
+                                   factor=factor, cv=cv, n_jobs=n_jobs, random_state=random_state)
+
+    raise ValueError(f'Unknown search strategy {strategy!r}, expected one of {SEARCH_STRATEGIES}')
+
+
+def tune_classification(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, cat_cols, strategy=None, prior_params=None, explore_fraction=None):
     trn_df_xfm = pd.get_dummies(trn_df_xfm, columns=[x for x in cat_cols], drop_first=True)
     tst_df_xfm = pd.get_dummies(tst_df_xfm, columns=[x for x in cat_cols], drop_first=True)
     
@@ -34,55 +146,23 @@ def tune_classification(trn_df_xfm, tst_df_xfm, target_df_trn, target_df_tst, ca
         'criterion': ['entropy', 'log_loss']
     }
 
+    # routine refreshes only search around the previous best parameters of the cohort
+    if prior_params:
+        param_grid = narrow_param_grid(param_grid, prior_params, explore_fraction)
+
     # Hyperparameter tuning
-    grid_search = GridSearchCV(estimator=rf_model, param_grid=param_grid,
-                                cv=2, n_jobs=-1)
+    grid_search = get_search(strategy or SEARCH_STRATEGY, rf_model, param_grid)
 
     # Fit training set on the best parameters
     grid_search.fit(trn_df_xfm, target_df_trn)
 
     best_params = grid_search.best_params_
+    best_estimator = grid_search.best_estimator_
     
-    feature_importance = grid_search.best_estimator_.feature_importances_
+    feature_importance = best_estimator.feature_importances_
 
     y_pred_proba = grid_search.predict_proba(tst_df_xfm)[:, 1]
 
     best_weights, optimal_threshold = find_best_weights(target_df_tst, y_pred_proba)
 
-    return best_params, optimal_threshold, feature_importance, trn_df_xfm
-
-def find_best_weights(y_true, y_proba, weight_range=np.linspace(0.1, 10, 10)):
-    best_score = -np.inf
-    best_weights = (1, 1)
-    best_threshold = 0.5
-    for weight_tn in weight_range:
-        for weight_tp in weight_range:
-            threshold = find_optimal_threshold(y_true, y_proba, weight_tn=weight_tn, weight_tp=weight_tp)
-            y_pred = (y_proba >= threshold).astype(int)
-            tn, fp, fn, tp = confusion_matrix(y_true, y_pred).ravel()
-            score = (tn / (tn + fp) if (tn + fp) > 0 else 0) * weight_tn + (tp / (tp + fn) if (tp + fn) > 0 else 0) * weight_tp
-
-            if score > best_score:
-                best_score = score
-                best_weights = (weight_tn, weight_tp)
-                best_threshold = threshold
-
-    return best_weights, best_threshold  
-
-
-
-def find_optimal_threshold(y_true, y_proba, weight_tn, weight_tp):
- 
-    thresholds = np.linspace(0.01, 0.95, 2000)
-    best_threshold = 0.5
-    best_score = 0
-    for threshold in thresholds:
-        y_pred_thresh = (y_proba >= threshold).astype(int)
-        tn, fp, fn, tp = confusion_matrix(y_true, y_pred_thresh).ravel()
-        tp_rate = tp / (tp + fn) if (tp + fn) > 0 else 0
-        tn_rate = tn / (tn + fp) if (tn + fp) > 0 else 0
-        score = (tn_rate * weight_tn) + (tp_rate * weight_tp)
-        if score > best_score:
-            best_score = score
-            best_threshold = threshold
-    return best_threshold
\ No newline at end of file
+    return best_params, optimal_threshold, feature_importance, trn_df_xfm, best_estimator
@@ -1,5 +1,42 @@
+import os
 import numpy as np
-from sklearn.metrics import confusion_matrix
+
+def get_cpu_limit():
+    """
+    Number of CPUs available to this container.
+    Uses the CPU_LIMIT environment variable if set, then the cgroup CPU quota, then the CPU affinity.
+    Returns:
+        int: Number of usable CPUs (at least 1).
+    """
+    if os.environ.get('CPU_LIMIT'):
+        return max(1, int(float(os.environ['CPU_LIMIT'])))
+
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    try:
+        # cgroup v1
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, int(quota / period))
+    except (OSError, ValueError):
+        pass
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
 # Find most recent year (should always be 0) and quarter (0-3) within data
 def get_last_year_quarter(df):
     """
@@ -68,37 +105,108 @@ def get_preceding_quarters(year, quarter, num_quarters):
     return preceding_quarters
 
 
+def threshold_confusion_counts(y_true, y_proba, thresholds):
+    """
+    Computes confusion-matrix counts for every candidate threshold in one pass.
+    Probabilities are sorted once and the positive labels are cumulated, so the
+    counts for a threshold are read off at its insertion point in the sorted array.
+    Args:
+        y_true (array-like): Binary ground truth labels (0/1).
+        y_proba (array-like): Predicted probabilities of the positive class.
+        thresholds (array-like): Candidate thresholds; a sample is predicted positive when y_proba >= threshold.
+
+    Returns:
+        tuple: Arrays (tn, fp, fn, tp), each with one entry per threshold.
+    """
+    y_true = np.asarray(y_true) == 1
+    y_proba = np.asarray(y_proba, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    order = np.argsort(y_proba, kind='stable')
+    sorted_proba = y_proba[order]
+    # cum_pos[i] is the number of positives among the i lowest probabilities
+    cum_pos = np.concatenate(([0], np.cumsum(y_true[order], dtype=np.int64)))
+
+    n_pos = int(cum_pos[-1])
+    n_neg = len(y_true) - n_pos
+
+    # everything from the first index with proba >= threshold onwards is predicted positive
+    idx = np.searchsorted(sorted_proba, thresholds, side='left')
+    tp = n_pos - cum_pos[idx]
+    fp = (len(y_true) - idx) - tp
+    fn = n_pos - tp
+    tn = n_neg - fp
+    return tn, fp, fn, tp
+
+
+def _class_rates(tn, fp, fn, tp):
+    """
+    Returns (tn_rate, tp_rate) arrays, using 0 where a class has no samples.
+    """
+    tn, fp, fn, tp = (np.asarray(v, dtype=np.int64) for v in (tn, fp, fn, tp))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tn_rate = np.where((tn + fp) > 0, tn / (tn + fp), 0.0)
+        tp_rate = np.where((tp + fn) > 0, tp / (tp + fn), 0.0)
+    return tn_rate, tp_rate
+
+
 def find_best_weights(y_true, y_proba, weight_range=np.linspace(0.1, 10, 10), threshold_steps=1000):
-    best_score = -np.inf
-    best_weights = (1, 1)
-    best_threshold = 0.5
-    for weight_tn in weight_range:
-        for weight_tp in weight_range:
-            threshold = find_optimal_threshold(y_true, y_proba, weight_tn=weight_tn, weight_tp=weight_tp)
-            y_pred = (y_proba >= threshold).astype(int)
-            tn, fp, fn, tp = confusion_matrix(y_true, y_pred).ravel()
-            score = (tn / (tn + fp) if (tn + fp) > 0 else 0) * weight_tn + (tp / (tp + fn) if (tp + fn) > 0 else 0) * weight_tp
-
-            if score > best_score:
-                best_score = score
-                best_weights = (weight_tn, weight_tp)
-                best_threshold = threshold
+    """
+    Finds the (weight_tn, weight_tp) pair and threshold maximising the weighted sum of
+    true negative and true positive rates. All weight pairs and thresholds are scored
+    as a single broadcast; ties resolve to the first weight pair / lowest threshold,
+    matching an ordered scan over the grid.
+    Args:
+        y_true (array-like): Binary ground truth labels (0/1).
+        y_proba (array-like): Predicted probabilities of the positive class.
+        weight_range (array-like): Candidate weights used for both classes.
+        threshold_steps (int): Unused, kept for backwards compatibility.
+
+    Returns:
+        tuple: ((weight_tn, weight_tp), threshold)
+    """
+    weight_range = np.asarray(weight_range, dtype=np.float64)
+    thresholds = np.linspace(0.01, 0.95, 2000)
+
+    tn_rate, tp_rate = _class_rates(*threshold_confusion_counts(y_true, y_proba, thresholds))
+    default_tn_rate, default_tp_rate = _class_rates(*threshold_confusion_counts(y_true, y_proba, [0.5]))
+
+    # scores[i, j, k] = tn_rate(k) * weight_range[i] + tp_rate(k) * weight_range[j]
+    scores = (tn_rate[None, None, :] * weight_range[:, None, None]) + (tp_rate[None, None, :] * weight_range[None, :, None])
+
+    # optimal threshold per weight pair; fall back to 0.5 when no threshold scores above 0
+    best_idx = scores.argmax(axis=2)
+    best_scores = np.take_along_axis(scores, best_idx[..., None], axis=2)[..., 0]
+    found = best_scores > 0
+    pair_thresholds = np.where(found, thresholds[best_idx], 0.5)
+    default_scores = (default_tn_rate[0] * weight_range[:, None]) + (default_tp_rate[0] * weight_range[None, :])
+    pair_scores = np.where(found, best_scores, default_scores)
+
+    i, j = np.unravel_index(pair_scores.argmax(), pair_scores.shape)
+    best_weights = (weight_range[i], weight_range[j])
+    best_threshold = pair_thresholds[i, j]
 
     return best_weights, best_threshold
 
 
 def find_optimal_threshold(y_true, y_proba, weight_tn, weight_tp):
- 
+    """
+    Finds the threshold maximising tn_rate * weight_tn + tp_rate * weight_tp over a
+    fixed grid of 2000 thresholds in [0.01, 0.95]. Returns 0.5 if no threshold scores above 0.
+    Args:
+        y_true (array-like): Binary ground truth labels (0/1).
+        y_proba (array-like): Predicted probabilities of the positive class.
+        weight_tn (float): Weight applied to the true negative rate.
+        weight_tp (float): Weight applied to the true positive rate.
+
+    Returns:
+        float: The optimal threshold.
+    """
     thresholds = np.linspace(0.01, 0.95, 2000)
-    best_threshold = 0.5
-    best_score = 0
-    for threshold in thresholds:
-        y_pred_thresh = (y_proba >= threshold).astype(int)
-        tn, fp, fn, tp = confusion_matrix(y_true, y_pred_thresh).ravel()
-        tp_rate = tp / (tp + fn) if (tp + fn) > 0 else 0
-        tn_rate = tn / (tn + fp) if (tn + fp) > 0 else 0
-        score = (tn_rate * weight_tn) + (tp_rate * weight_tp)
-        if score > best_score:
-            best_score = score
-            best_threshold = threshold
-    return best_threshold
\ No newline at end of file
+    tn_rate, tp_rate = _class_rates(*threshold_confusion_counts(y_true, y_proba, thresholds))
+    scores = (tn_rate * weight_tn) + (tp_rate * weight_tp)
+
+    best = scores.argmax()
+    if scores[best] > 0:
+        return thresholds[best]
+    return 0.5
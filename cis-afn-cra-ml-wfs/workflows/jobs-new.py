@@ -6,11 +6,12 @@ import gc  # **ADDED LINE 1**
 from ops.build_ml_data import build_ml_data
 from ops.get_cohorts import get_cohorts
 from ops.initial_etl import initial_etl
+from ops.normalize_dates import normalize_dates
 from ops.request_train_reg import train_all_regression, train_regression
 from ops.get_raw_data import get_raw_data, get_raw_data_files
 from ops.post_results import post_results
 from ops.initial_etl_spoke import etl_spoke
-from ops.apply_manual_adj import apply_manual_adjustments
+from ops.apply_manual_adj import apply_manual_adjustments, prepare_hub_data
 from ops.apply_overrides_adjustments import apply_overrides_adjustments
 from ops.build_ml_data_cls import build_ml_data_cls
 from ops.request_train_cls import train_all_classification, train_classification
@@ -25,6 +26,7 @@ deployment_mode = os.environ['DEPLOYMENT_MODE'].lower()
 def regression_training():
     hub_data = get_raw_data_files()
     cleaned_df = initial_etl(hub_data)
+    cleaned_df = normalize_dates(cleaned_df)
     del hub_data; gc.collect()  # **ADDED LINE 2**
     spoke_df = etl_spoke()
     (adjusted_df, latest_year, latest_quarter) = apply_manual_adjustments(df_ml=cleaned_df, df_spoke=spoke_df)
@@ -42,7 +44,7 @@ def regression_training():
     post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/modeling_data',
                  blob_name='Cleaned Hub Data',
                  file_extension='csv',
-                 df=cleaned_df
+                 df=prepare_hub_data(cleaned_df)
     )
     post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/regression_reports/latest',
                  blob_name='Historical Regression Results Report',
@@ -65,6 +67,7 @@ def classification_training():
     
     hub_data = get_raw_data_files()
     cleaned_df = initial_etl(hub_data)
+    cleaned_df = normalize_dates(cleaned_df)
     del hub_data; gc.collect()  # **ADDED LINE 5**
     spoke_df = etl_spoke()
     (adjusted_df, latest_year, latest_quarter) = apply_manual_adjustments(df_ml=cleaned_df, df_spoke=spoke_df)
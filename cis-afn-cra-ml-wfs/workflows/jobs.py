@@ -5,11 +5,12 @@ import json
 from ops.build_ml_data import build_ml_data
 from ops.get_cohorts import get_cohorts
 from ops.initial_etl import initial_etl
+from ops.normalize_dates import normalize_dates
 from ops.request_train_reg import train_all_regression, train_regression
 from ops.get_raw_data import get_raw_data, get_raw_data_files
 from ops.post_results import post_results
 from ops.initial_etl_spoke import etl_spoke
-from ops.apply_manual_adj import apply_manual_adjustments
+from ops.apply_manual_adj import apply_manual_adjustments, prepare_hub_data
 from ops.apply_overrides_adjustments import apply_overrides_adjustments
 from ops.build_ml_data_cls import build_ml_data_cls
 from ops.request_train_cls import train_all_classification, train_classification
@@ -18,40 +19,55 @@ from ops.create_regression_report import create_regression_report
 from ops.create_revenue_report import create_revenue_report
 from ops.shift_source_data_blobs import shift_source_data_blobs
 from ops.revenue_dq_check import revenue_dq_check
+from ops.incremental_hub_data import get_cleaned_hub_data
+from utils.etl.incremental_cache import INCREMENTAL_REFRESH
+from utils.general.stage_runner import StageRunner
 deployment_mode = os.environ['DEPLOYMENT_MODE'].lower()
 # Regression Jobs #
 
 def regression_training():
-    hub_data = get_raw_data_files()
-    cleaned_df = initial_etl(hub_data)
-    spoke_df = etl_spoke()
-    (adjusted_df, latest_year, latest_quarter) = apply_manual_adjustments(df_ml=cleaned_df, df_spoke=spoke_df)
-    modeling_df = build_ml_data(adjusted_df, latest_year, latest_quarter)
-    final_model_df = apply_overrides_adjustments(df=modeling_df, df_ml=cleaned_df, df_spoke=spoke_df, latest_year=latest_year, latest_quarter=latest_quarter)
-    revenue_check_results = revenue_dq_check(source_df=cleaned_df, modeling_df=final_model_df, latest_year=latest_year, model_name='Regression')
-    (cohorts, df_for_training) = get_cohorts(final_model_df)
-    all_regression_results = train_all_regression(cohorts=cohorts, df=df_for_training)
+    # every step runs as a checkpointed stage, a rerun with the same STAGE_RUN_ID resumes from the first failed one
+    runner = StageRunner('regression_training')
+    if INCREMENTAL_REFRESH:
+        # only year_0 is pulled and cleaned, historical years come from the ETL cache
+        cleaned_df = runner.run('get_cleaned_hub_data', get_cleaned_hub_data)
+    else:
+        hub_data = runner.run('get_raw_data_files', get_raw_data_files)
+        cleaned_df = runner.run('initial_etl', initial_etl, hub_data)
+    cleaned_df = runner.run('normalize_dates', normalize_dates, cleaned_df)
+    spoke_df = runner.run('etl_spoke', etl_spoke)
+    (adjusted_df, latest_year, latest_quarter) = runner.run('apply_manual_adjustments', apply_manual_adjustments, df_ml=cleaned_df, df_spoke=spoke_df)
+    modeling_df = runner.run('build_ml_data', build_ml_data, adjusted_df, latest_year, latest_quarter)
+    final_model_df = runner.run('apply_overrides_adjustments', apply_overrides_adjustments, df=modeling_df, df_ml=cleaned_df, df_spoke=spoke_df, latest_year=latest_year, latest_quarter=latest_quarter)
+    revenue_check_results = runner.run('revenue_dq_check', revenue_dq_check, source_df=cleaned_df, modeling_df=final_model_df, latest_year=latest_year, model_name='Regression')
+    (cohorts, df_for_training) = runner.run('get_cohorts', get_cohorts, final_model_df)
+    all_regression_results = runner.run('train_all_regression', train_all_regression, cohorts=cohorts, df=df_for_training)
 
-    updated_report = create_regression_report(all_regression_results=all_regression_results, latest_quarter=latest_quarter, latest_year=latest_year)
-    revenue_report = create_revenue_report(source_df=cleaned_df, latest_year=latest_year, latest_quarter=latest_quarter, model_name='Regression')
+    updated_report = runner.run('create_regression_report', create_regression_report, all_regression_results=all_regression_results, latest_quarter=latest_quarter, latest_year=latest_year)
+    revenue_report = runner.run('create_revenue_report', create_revenue_report, source_df=cleaned_df, latest_year=latest_year, latest_quarter=latest_quarter, model_name='Regression')
 
-    post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/modeling_data',
-                 blob_name='Cleaned Hub Data',
-                 file_extension='csv',
-                 df=cleaned_df
+    hub_data_df = runner.run('prepare_hub_data', prepare_hub_data, cleaned_df)
+    runner.run('post_cleaned_hub_data', post_results,
+               container_name=f'data/AFN_ML/{deployment_mode}/cra/modeling_data',
+               blob_name='Cleaned Hub Data',
+               file_extension='csv',
+               df=hub_data_df
     )
-    post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/regression_reports/latest',
-                 blob_name='Historical Regression Results Report',
-                 file_extension='csv',
-                 df=updated_report)
-    post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/regression_reports/latest',
-                blob_name='Regression Revenue Report',
-                file_extension='csv',
-                df=revenue_report)
+    runner.run('post_regression_report', post_results,
+               container_name=f'data/AFN_ML/{deployment_mode}/cra/regression_reports/latest',
+               blob_name='Historical Regression Results Report',
+               file_extension='csv',
+               df=updated_report)
+    runner.run('post_revenue_report', post_results,
+               container_name=f'data/AFN_ML/{deployment_mode}/cra/regression_reports/latest',
+               blob_name='Regression Revenue Report',
+               file_extension='csv',
+               df=revenue_report)
 
     if latest_quarter == 4:
-        renamed_azure_blobs = shift_source_data_blobs()
+        renamed_azure_blobs = runner.run('shift_source_data_blobs', shift_source_data_blobs)
 
+    print(runner.report())
     return True
 
     
@@ -59,37 +75,48 @@ def regression_training():
 # Classification Job #
 def classification_training():
     
-    hub_data = get_raw_data_files()
-    cleaned_df = initial_etl(hub_data)
-    spoke_df = etl_spoke()
-    (adjusted_df, latest_year, latest_quarter) = apply_manual_adjustments(df_ml=cleaned_df, df_spoke=spoke_df)
-    modeling_df = build_ml_data_cls(adjusted_df, latest_year, latest_quarter)
-    revenue_check_results = revenue_dq_check(source_df=cleaned_df, modeling_df=modeling_df, latest_year=latest_year, model_name='Classification')
-    all_classifiction_results, feat_percentile_df, feat_imp_df  = train_all_classification(df=modeling_df)
+    runner = StageRunner('classification_training')
+    if INCREMENTAL_REFRESH:
+        # only year_0 is pulled and cleaned, historical years come from the ETL cache
+        cleaned_df = runner.run('get_cleaned_hub_data', get_cleaned_hub_data)
+    else:
+        hub_data = runner.run('get_raw_data_files', get_raw_data_files)
+        cleaned_df = runner.run('initial_etl', initial_etl, hub_data)
+    cleaned_df = runner.run('normalize_dates', normalize_dates, cleaned_df)
+    spoke_df = runner.run('etl_spoke', etl_spoke)
+    (adjusted_df, latest_year, latest_quarter) = runner.run('apply_manual_adjustments', apply_manual_adjustments, df_ml=cleaned_df, df_spoke=spoke_df)
+    modeling_df = runner.run('build_ml_data_cls', build_ml_data_cls, adjusted_df, latest_year, latest_quarter)
+    revenue_check_results = runner.run('revenue_dq_check', revenue_dq_check, source_df=cleaned_df, modeling_df=modeling_df, latest_year=latest_year, model_name='Classification')
+    all_classifiction_results, feat_percentile_df, feat_imp_df  = runner.run('train_all_classification', train_all_classification, df=modeling_df)
 
-    classification_report = create_cls_report(all_classifiction_results, cleaned_df, latest_year)
-    revenue_report = create_revenue_report(source_df=cleaned_df, classification_report = classification_report, latest_year=latest_year, latest_quarter=latest_quarter, model_name='Classification')
+    classification_report = runner.run('create_cls_report', create_cls_report, all_classifiction_results, cleaned_df, latest_year)
+    revenue_report = runner.run('create_revenue_report', create_revenue_report, source_df=cleaned_df, classification_report = classification_report, latest_year=latest_year, latest_quarter=latest_quarter, model_name='Classification')
 
-    post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
-            blob_name='Classification Prediction Report',
-            file_extension='csv',
-            df=classification_report)
+    runner.run('post_classification_report', post_results,
+               container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
+               blob_name='Classification Prediction Report',
+               file_extension='csv',
+               df=classification_report)
 
-    post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
-                blob_name='Classification Revenue Report',
-                file_extension='csv',
-                df=revenue_report)
+    runner.run('post_revenue_report', post_results,
+               container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
+               blob_name='Classification Revenue Report',
+               file_extension='csv',
+               df=revenue_report)
 
-    post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
-                blob_name='Classification Feature Percentile Report',
-                file_extension='csv',
-                df=feat_percentile_df)
+    runner.run('post_feature_percentile_report', post_results,
+               container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
+               blob_name='Classification Feature Percentile Report',
+               file_extension='csv',
+               df=feat_percentile_df)
 
-    post_results(container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
-                blob_name='Classification Feature Importance Report',
-                file_extension='csv',
-                df=feat_imp_df)
+    runner.run('post_feature_importance_report', post_results,
+               container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
+               blob_name='Classification Feature Importance Report',
+               file_extension='csv',
+               df=feat_imp_df)
 
+    print(runner.report())
     return True
     
 
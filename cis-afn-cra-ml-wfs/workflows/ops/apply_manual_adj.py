@@ -1,5 +1,35 @@
+import numpy as np
 import pandas as pd
 from utils.etl.adjustments_utls import *
+from ops.normalize_dates import DATE_COLUMNS
+
+# fill values of the hub columns with missing entries
+HUB_FILL_VALUES = {
+    'client_number': 'missing_client',
+    'entry_mode': 'Missing',
+    'basis_code': 'Missing',
+    'accrual_type_us': 'Missing',
+    'final_mip_desc': 'Missing',
+    'market_segment': 'Missing',
+}
+
+
+def prepare_hub_data(df_ml: pd.DataFrame):
+    """
+    Cleaned hub data as posted: df_ml with 'Recurring_Type' and 'quarter' added and missing values filled.
+
+    Args:
+        df_ml (pd.DataFrame): The main dataframe containing the hub-based ML data, left unchanged.
+
+    Returns:
+        pd.DataFrame: New dataframe.
+    """
+    return df_ml.assign(
+        Recurring_Type=np.where(df_ml['non_recurring_flag'].astype(bool), 'Non Recurring', 'Recurring'),
+        quarter=get_quarter(df_ml['month']).astype(int),
+        **{col: df_ml[col].fillna(value) for col, value in HUB_FILL_VALUES.items()},
+    )
+
 
 def apply_manual_adjustments(df_ml: pd.DataFrame, df_spoke: pd.DataFrame):
     """
@@ -23,27 +53,19 @@ def apply_manual_adjustments(df_ml: pd.DataFrame, df_spoke: pd.DataFrame):
         max_hub_year = df_ml['year'].max()
         latest_full_quarter = get_last_quarter(df=df_ml,max_year=max_hub_year)
         print(f'Latest Year: {max_hub_year}, Latest Full Quarter: Q{latest_full_quarter}')
-       
-        df_ml['Recurring_Type'] = df_ml['non_recurring_flag'].apply(lambda x: 'Non Recurring' if x else 'Recurring')
-        df_ml['quarter'] = df_ml['month'].apply(get_quarter)
 
-        #### FILL MISSING VALUES ########
-        df_ml['client_number']=df_ml['client_number'].fillna('missing_client')
-        df_ml['entry_mode'] = df_ml['entry_mode'].fillna('Missing')
-        df_ml['basis_code'] = df_ml['basis_code'].fillna('Missing')
-        df_ml['accrual_type_us'] = df_ml['accrual_type_us'].fillna('Missing')
-        df_ml['invoice_date'] = df_ml['invoice_date'].fillna('Missing')
-        df_ml['bill_effective_dt'] = df_ml['bill_effective_dt'].fillna('Missing')
-        df_ml['cv_effective_dt'] = df_ml['cv_effective_dt'].fillna('Missing')
-        df_ml['cv_expiration_dt'] = df_ml['cv_expiration_dt'].fillna('Missing')
-        df_ml['final_mip_desc'] = df_ml['final_mip_desc'].fillna('Missing')
-        df_ml['market_segment'] = df_ml['market_segment'].fillna('Missing')
-        
-        grouped_df_ml = df_ml.groupby(['year','month','client_number','product_line_cd',
+        group_columns = ['year','month','client_number','product_line_cd',
                    'product_line_nm','production_code','fcs_department_nr',
                    'revenue_id','duration_cd','company_number','product_subgroup_nm','billing_type','entry_mode','basis_code','accrual_type_us',
                    'invoice_date','bill_effective_dt','cv_effective_dt','cv_expiration_dt','non_recurring_flag','mi_lookup_level4','final_mip_desc',
-                   'market_segment'])[['net_revenue']].sum().reset_index()
+                   'market_segment']
+        #### FILL MISSING VALUES ########
+        # on a new frame of the grouped columns, df_ml is shared with the other steps
+        df_grouped = df_ml[group_columns + ['net_revenue']].fillna(HUB_FILL_VALUES)
+
+        # missing dates (NaT after normalize_dates) are kept as groups, rows missing any other key are dropped as before
+        grouped_df_ml = df_grouped.dropna(subset=[col for col in group_columns if col not in DATE_COLUMNS]) \
+            .groupby(group_columns, dropna=False)[['net_revenue']].sum().reset_index()
         
         grouped_df_ml['Manual Adjustments'] = 0
         grouped_df_ml['Restatements'] = 0
@@ -17,7 +17,8 @@ def apply_overrides_adjustments(df_ml: pd.DataFrame, df_spoke: pd.DataFrame, df:
         pd.DataFrame: DataFrame for ML containing adjustments features.
     """
     try:
-        
+        # the spoke frame is shared with the other steps, the columns below are added to a copy
+        df_spoke = df_spoke.copy()
         df_spoke['L4. Planning Product: Planning Year'] = df_spoke.apply(lambda row: determine_year(row, max_year=int(latest_year)), axis=1)
         print(df_spoke.shape)
         print(f'Found years: {df_spoke[df_spoke["L4. Planning Product: Planning Year"].isna()]}')
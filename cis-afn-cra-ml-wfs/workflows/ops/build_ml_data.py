@@ -1,12 +1,46 @@
 import pandas as pd
 import numpy as np
-from utils.etl.cat_features_extract import extract_categorical_variables, relabel_except
-from utils.etl.num_feature_data_prep import prepare_revenue_data
+from utils.etl.feature_engine import QUARTER_MONTHS, block_rows, compute_block_features, block_modes, pivot_block_features
+from utils.etl.num_feature_data_prep import feature_cost_report
 from utils.etl.num_feature_definitions import feature_definitions
+from utils.etl.incremental_cache import INCREMENTAL_REFRESH, cache_key, definitions_key, load_cached_frame, save_cached_frame
+from utils.general.stage_runner import frame_fingerprint
 import warnings
 warnings.filterwarnings("ignore")
 
-def build_ml_data(df_original: pd.DataFrame, latest_year, latest_quarter):
+# features are built per zone, year and quarter
+BLOCK_COLUMNS = ['mi_lookup_level4', 'year', 'quarter']
+CATEGORICAL_VARS = ['mi_lookup_level4', 'final_mip_desc', 'market_segment']
+# rows of the modeling frame
+RESULT_KEYS = ['company_number', 'product_line_nm', 'final_mip_desc', 'client_number', 'market_segment', 'mi_lookup_level4']
+
+
+def build_block_features(rows: pd.DataFrame, costs: list = None):
+    """
+    Features and client categoricals of the zone, year and quarter blocks in rows.
+
+    Args:
+        rows (pd.DataFrame): Block rows, see block_rows.
+        costs (list): If given, collects the time of every feature, see feature_cost_report.
+
+    Returns:
+        pd.DataFrame: One row per block, client and product.
+    """
+    rows = rows.copy()
+    rows[CATEGORICAL_VARS] = rows[CATEGORICAL_VARS].fillna('Missing')
+    rows["non_recurring_flag"] = rows["non_recurring_flag"].replace({'True': True, 'False': False})
+    rows["non_recurring_flag"] = rows["non_recurring_flag"].astype(bool)  # Convert to boolean type
+
+    block_df = compute_block_features(rows, feature_definitions, BLOCK_COLUMNS, costs)
+
+    # most frequent categorical values of each client in the block, market segments outside the main two relabeled
+    categorical_df = block_modes(rows, BLOCK_COLUMNS + ['client_number'], [var for var in CATEGORICAL_VARS if var not in BLOCK_COLUMNS])
+    categorical_df['market_segment'] = categorical_df['market_segment'].where(
+        categorical_df['market_segment'].isin(["Corporate", "Risk Management"]), 'Other')
+    return block_df.merge(categorical_df, on=BLOCK_COLUMNS + ['client_number'], how='left')
+
+
+def build_ml_data(df_original: pd.DataFrame, latest_year, latest_quarter, incremental: bool = None):
     """
     Builds machine learning features.
         
@@ -14,160 +48,64 @@ def build_ml_data(df_original: pd.DataFrame, latest_year, latest_quarter):
         df_original (pd.DataFrame): The dataframe used to build features.
         latest_year (int): The latest year found in df_original.
         latest_quarter (int): The latest full quarter found in df_original.
+        incremental (bool): Load the blocks of historical years from the ETL cache when their rows are
+            unchanged. Defaults to INCREMENTAL_REFRESH.
 
     Returns:
         pd.DataFrame: machine learning data with features.
     """
     try:
         zones = df_original['mi_lookup_level4'].dropna().unique()
-        quarters = [[1,2,3],[4,5,6],[7,8,9],[10,11,12]]
         available_years = df_original['year'].unique().tolist()
         last_year = int(latest_year)
 
         years = [val for val in available_years if val <= last_year]
         print(f'Found years: {years}')
 
-        dfs = []
-        all_quarters= [[1,2,3],[4,5,6],[7,8,9],[10,11,12]]
+        rows = block_rows(df_original, latest_year, latest_quarter, BLOCK_COLUMNS)
+
+        if incremental is None:
+            incremental = INCREMENTAL_REFRESH
 
+        # historical years do not change between the quarterly runs, only year_0 is rebuilt
+        cached, versions = [], {}
+        if incremental:
+            features_version = definitions_key(feature_definitions)
+            for year in years:
+                if year == last_year:
+                    continue
+                # row positions shift when the oldest year is dropped, so the index is not part of the version
+                versions[year] = cache_key(features_version, frame_fingerprint(df_original[df_original['year'] == year], index=False))
+                year_df = load_cached_frame('feature_blocks', year, versions[year])
+                if year_df is not None:
+                    print(f'Loaded features of {year} from cache')
+                    cached.append(year_df)
+
+        cached_years = [year_df['year'].iloc[0] for year_df in cached if len(year_df)]
+        costs = []
+        computed = build_block_features(rows[~rows['year'].isin(cached_years)], costs)
+        print(f'Feature costs:\n{feature_cost_report(costs).to_string()}')
+        for year in versions:
+            if year not in cached_years:
+                save_cached_frame('feature_blocks', year, versions[year], computed[computed['year'] == year])
+
+        block_df = pd.concat(cached + [computed], ignore_index=True)
+        block_df['company_number'] = 'Missing'
+        features = [col for col in computed.columns if col not in BLOCK_COLUMNS + RESULT_KEYS]
+
+        # columns are ordered as the zone, year, quarter blocks first add them
+        present = set(block_df[BLOCK_COLUMNS].drop_duplicates().itertuples(index=False, name=None))
+        block_order = []
         for zone in zones:
-        
             for year in years:
-                if year == int(latest_year):
-                    quarters=all_quarters[:int(latest_quarter)]
-                else:
-                    quarters=all_quarters
-                for quarter in quarters:
-
-                    print(f"Zone:{zone}, Year: {year}, Quarter:{quarter}")
-
-                    df = df_original[(df_original['year'] == year) & (df_original['production_code'].isin(['Renewal','New business','Expanded services'])) & (df_original['mi_lookup_level4'] == zone) & (df_original['month'].isin(quarter))]
-                    # df['client_number'] = df['client_numberO'].str.replace('-US', '', regex=False)
-
-                    df['client_number'].fillna('missing_client', inplace=True)
-
-                    df[['bill_effective_dt', 'invoice_date', 'cv_effective_dt', 'cv_expiration_dt','non_recurring_flag']] = df[['bill_effective_dt', 'invoice_date', 'cv_effective_dt', 'cv_expiration_dt','non_recurring_flag']].fillna('Missing')
-
-                    categorical_vars = ['mi_lookup_level4', 'final_mip_desc', 'market_segment']
-
-                    grouping_columns = ['client_number']     
-
-                    df[categorical_vars] = df[categorical_vars].fillna('Missing')            
-
-                    categorical_df = df.pipe(extract_categorical_variables, categorical_vars, grouping_columns).pipe(relabel_except, 'market_segment', ["Corporate", "Risk Management"], 'Other')
-
-                    df["non_recurring_flag"] = df["non_recurring_flag"].replace({'True': True, 'False': False})
-
-                    df["non_recurring_flag"] = df["non_recurring_flag"].astype(bool)  # Convert to boolean type
-
-                    df['quarter'] = ((df['month'] - 1) // 3) + 1
+                quarters = QUARTER_MONTHS[:int(latest_quarter)] if year == last_year else QUARTER_MONTHS
+                block_order += [(year, quarter) for quarter in range(1, len(quarters) + 1) if (zone, year, quarter) in present]
 
-                    base_year = None  # or set to a specific year like base_year = 2023
-        
-                    # Prepare the revenue data
-
-                    numerical_df = prepare_revenue_data(
-                        df=df,
-                        feature_definitions=feature_definitions,
-                        base_year=base_year
-                    )
-
-                    # Access DataFrames for different aggregation levels
-
-                    # For example, product-level DataFrame
-                    product_level_df = numerical_df.get('product_line_nm', pd.DataFrame())
-
-                    # Client-Level DataFrame
-                    client_level_df = numerical_df.get('client_number', pd.DataFrame())
-        
-
-                    # Client-Product-Level DataFrame
-                    client_product_level_df = numerical_df.get('client_number_product_line_nm', pd.DataFrame())
-        
-                    # Client-Product-Level DataFrame
-                    company_number_level_df = numerical_df.get('company_number', pd.DataFrame())
-        
-
-                    # Merge DataFrames as needed
-
-                    # merging client-level and client-product-level DataFrames
-                    if not client_product_level_df.empty and not client_level_df.empty:
-
-                        merged_df = pd.merge(
-                            client_product_level_df,
-                            client_level_df,
-                            on='client_number',
-                            how='left',
-                            suffixes=('_client_product', '_client')
-                        )
-        
-
-                    # merge product-level features
-                    if not merged_df.empty and not product_level_df.empty:
-
-                        final_num_df = pd.merge(
-                            merged_df,
-                            product_level_df,
-                            on='product_line_nm',
-                            how='left',
-                            suffixes=('', '_product')
-                        )
-        
-                    # merge company nummber level DataFrames
-
-                    # first, need to merge company number level df with our original df to get client number. drop client number duplicates in order to do merge
-                    if not final_num_df.empty and not company_number_level_df.empty:
-
-                        filtered_df = df[['company_number', 'client_number']].drop_duplicates(subset='client_number')
-                        company_client_df = pd.merge(
-                            company_number_level_df,
-                            filtered_df,
-                            on='company_number',
-                            how='left'
-                        )
-
-                        final_num_df_company = pd.merge(
-                            final_num_df,
-                            company_client_df,
-                            on='client_number',
-                            how='left',
-                            suffixes=('', '_company')
-                        )
-        
-                    # merge client categorical features
-                    if not final_num_df_company.empty and not categorical_df.empty:
-
-                        final_df = pd.merge(
-                            final_num_df_company,
-                            categorical_df,
-                            on='client_number',
-                            how='left',
-                            suffixes=('', '_client')
-                        )
-        
-                    if year == int(latest_year):
-                        y = 0
-                
-                    else:
-                        y = int(latest_year) - year
-        
-                    final_df.rename(columns=lambda x: x.replace('year_0', f'year_{y}'), inplace=True)
-        
-                    dfs.append(final_df)
-
-
-        base_df = pd.concat(dfs)
-        base_df['company_number'] = 'Missing'
-        
-        result_df = base_df.groupby(['company_number', 'product_line_nm', 'final_mip_desc',
-                            'client_number', 'market_segment', 'mi_lookup_level4'], 
-                            as_index=False).agg('first')
-        
+        result_df = pivot_block_features(block_df, RESULT_KEYS, features, latest_year, block_order).reset_index()
         result_df.fillna(0, inplace = True)
 
-
         return result_df
 
     except Exception as e:
         dagster_logger.info(e)
-        raise e
\ No newline at end of file
+        raise e
@@ -14,6 +14,8 @@ def create_cls_report(cls_report: pd.DataFrame, source_df: pd.DataFrame, latest_
         cls_report_clients['prediction_year'] = int(latest_year)
         cls_prediction_report = cls_report_clients[['client_number', 'client_nm', 'product_line_nm','Client Size', 'recurring', 'prediction_year', 'prediction', 'pred_renewal_prob', 'optimal_threshold', 'py_renewal_month', 'cy_renewal_month']]
         cls_prediction_report.rename(columns={'client_nm':'client_name', 'Client Size':'client_size','pred_renewal_prob': 'prediction_probability'}, inplace=True)
+        # missing clients are named as in the revenue report
+        cls_prediction_report['client_number'] = cls_prediction_report['client_number'].replace({'Missing': 'missing_client'})
 
         # post reports
         # post_df(container_name=f'data/AFN_ML/{deployment_mode}/cra/classification_reports/latest',
@@ -19,9 +19,8 @@ def create_revenue_report(source_df: pd.DataFrame, latest_year, latest_quarter,
 
 def regression_revenue_report(source_df, latest_year, latest_quarter):
      
-    # define quarter column
-    source_df['quarter'] = ((source_df['month'] - 1) // 3) + 1
-    source_df['quarter'] = source_df['quarter'].astype(int)
+    # define quarter column on a new frame, source_df is shared with the other steps
+    source_df = source_df.assign(quarter=(((source_df['month'] - 1) // 3) + 1).astype(int))
     
     # Group df by zone, product, year, quarter
     grouped = source_df.groupby(['mi_lookup_level4', 'product_line_nm', 'year', 'quarter'])
@@ -50,12 +49,11 @@ def regression_revenue_report(source_df, latest_year, latest_quarter):
     return result
     
 def classification_revenue_report(source_df, classification_report, latest_year, latest_quarter):
-    # add quarter column
-    source_df['quarter'] = ((source_df['month'] - 1) // 3) + 1
-    source_df['quarter'] = source_df['quarter'].astype(int)
+    # add quarter column on a new frame, source_df is shared with the other steps
+    source_df = source_df.assign(quarter=(((source_df['month'] - 1) // 3) + 1).astype(int))
 
-    # drop any rows with future months
-    source_df = source_df[~((source_df['year']==int(latest_year)) & (source_df['quarter'] > int(latest_quarter)))]
+    # drop any rows with future months; a copy, so the fills below change only this frame
+    source_df = source_df[~((source_df['year']==int(latest_year)) & (source_df['quarter'] > int(latest_quarter)))].copy()
 
     # fill in missing client numbers
     source_df['client_number'].fillna('missing_client', inplace=True)
@@ -119,9 +117,8 @@ def classification_revenue_report(source_df, classification_report, latest_year,
     final_df.reset_index(drop=True, inplace=True)
     
     # add client sizes
-    classification_report['client_number'].replace({'Missing':'missing_client'}, inplace=True)
-    classification_report = classification_report[['client_number','recurring', 'client_size']]
-    classification_report.drop_duplicates(inplace=True)
+    classification_report = classification_report[['client_number','recurring', 'client_size']] \
+        .replace({'client_number': {'Missing': 'missing_client'}}).drop_duplicates()
     
     report_w_client_size = pd.merge(final_df, classification_report, on=['client_number', 'recurring'], how='left')
     return report_w_client_size
\ No newline at end of file
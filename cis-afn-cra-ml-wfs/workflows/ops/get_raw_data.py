@@ -15,10 +15,13 @@ hub_container = azure_config['raw_data']['hub']['container'].replace("ENV_PLACEH
 hub_workspace_id = os.environ['HUB_WORKSPACE_ID']
 hub_model_id = os.environ['HUB_MODEL_ID']
 
-def get_raw_data_files():
+def get_raw_data_files(year_keys: list = None):
     """
     Function to retrieve raw data from a parquet file.
 
+    Args:
+        year_keys (list): Hub config keys to pull, e.g. ['year_0']. Defaults to all years.
+
     Returns:
         pd.Dataframe: Dataframe with all years of data concatenated
 """
@@ -39,6 +42,8 @@ def get_raw_data_files():
     
         yearly_dfs = []
         for key, value in hub_config.items():
+            if year_keys is not None and key not in year_keys:
+                continue
             file_source = value['file_source']
             if file_source == 'azure':
                 yearly_df = get_raw_data(blob_details=value)
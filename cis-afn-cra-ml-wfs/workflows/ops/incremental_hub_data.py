@@ -0,0 +1,53 @@
+import pandas as pd
+from ops.get_raw_data import get_raw_data, get_raw_data_files
+from ops.initial_etl import load_etl_mappings, clean_hub_data
+from utils.etl.incremental_cache import frames_key, load_cached_frame, save_cached_frame
+from utils.general.get_config import get_config
+
+azure_config = get_config('azure_config.json')
+
+
+def get_cleaned_hub_data():
+    """
+    Incremental replacement of get_raw_data_files followed by initial_etl.
+
+    Only year_0 is pulled from Anaplan and cleaned on every run. The historical hub blobs are static
+    until shift_source_data_blobs moves them once a year, so each one is cleaned once and cached
+    under the calendar year it holds (year_k holds the year of year_0 minus k); the cache is
+    versioned by the mapping tables, so a mapping change cleans the historical years again.
+
+    Returns:
+        pd.DataFrame: The post-ETL hub data of all years, the same as initial_etl(get_raw_data_files()).
+    """
+    try:
+        mappings = load_etl_mappings()
+        mappings_version = frames_key(*mappings.values())
+
+        year_keys = [key for key in azure_config['raw_data']['hub'] if key.startswith('year_')]
+        cleaned = {'year_0': clean_hub_data(get_raw_data_files(year_keys=['year_0']), mappings)}
+        current_year = int(cleaned['year_0']['year'].max())
+
+        for key in year_keys:
+            if key == 'year_0':
+                continue
+            data_year = current_year - int(key.split('_')[1])
+            cleaned[key] = load_cached_frame('cleaned_hub', data_year, mappings_version)
+            if cleaned[key] is not None:
+                print(f'Loaded cleaned {key} ({data_year}) from cache')
+                continue
+
+            blob_details = azure_config['raw_data']['hub'][key]
+            if blob_details['file_source'] == 'azure':
+                raw_df = get_raw_data(blob_details=blob_details)
+            else:
+                raw_df = get_raw_data_files(year_keys=[key])
+            cleaned[key] = clean_hub_data(raw_df, mappings)
+            save_cached_frame('cleaned_hub', data_year, mappings_version, cleaned[key])
+            print(f'Cleaned and cached {key} ({data_year})')
+
+        # same order and index as the full reload
+        df_cleaned = pd.concat([cleaned[key] for key in year_keys], ignore_index=False)
+        print(f'Found years: {df_cleaned["year"].unique()}')
+        return df_cleaned
+    except Exception as e:
+        raise e
@@ -11,6 +11,66 @@ azure_config = get_config('azure_config.json')
 load_dotenv(dotenv_path ='/Workspace/Shared/.env')
 deployment_mode =os.environ.get('DEPLOYMENT_MODE').lower()
 
+def load_etl_mappings():
+    """
+    Reads the mapping tables used by the initial ETL.
+
+    Returns:
+        dict: 'non_recurring', 'client_mapping' and 'zones' DataFrames.
+    """
+    #Get non recurring:
+    nr_df = get_df(container_name=azure_config['mappings']['container'].replace('ENV_PLACEHOLDER', deployment_mode),
+                    blob_name=azure_config['mappings']['non-recurring']['blob_name'],
+                    file_extension=azure_config['mappings']['non-recurring']['file_extension'])
+    print('Got NR DF')
+
+    # Read CMAP
+    cmap_df = get_df(container_name=azure_config['mappings']['container'].replace('ENV_PLACEHOLDER', deployment_mode),
+                        blob_name=azure_config['mappings']['client_mapping']['blob_name'],
+                        file_extension=azure_config['mappings']['client_mapping']['file_extension'])
+    print('Got cmap df')
+
+    # New Zones table
+    zones_full = get_df(container_name=azure_config['mappings']['container'].replace('ENV_PLACEHOLDER', deployment_mode),
+                        blob_name=azure_config['mappings']['zones']['blob_name'],
+                        file_extension=azure_config['mappings']['zones']['file_extension'])
+    print('got zones full')
+
+    return {'non_recurring': nr_df, 'client_mapping': cmap_df, 'zones': zones_full}
+
+
+def clean_hub_data(df: pd.DataFrame, mappings: dict):
+    """
+    Applies the initial ETL pipeline to hub data with already loaded mapping tables.
+
+    Args:
+        df (pd.DataFrame): Raw hub data.
+        mappings (dict): Mapping tables from load_etl_mappings.
+
+    Returns:
+        pd.DataFrame: The post-ETL hub data
+    """
+    # Process Zone Data
+    zones_full = mappings['zones'].copy()
+    zones_full['ZONES'] = zones_full["ZONES"].str.replace('OneMMC_', '')
+    zones_dictionary = zones_full.set_index('RC_DEPT')['ZONES'].to_dict()
+
+    # Extract industry and market mapping table
+    cn_industry_mapping, cn_market_mapping = mappings['client_mapping'].pipe(filter_cmap_df) \
+                                                .pipe(create_cmap_mapping_tables)
+
+    # Main Pipeline
+    df_cleaned = df.pipe(flag_non_recurring, mappings['non_recurring'])\
+    .pipe(add_prefix_to_column_values, 'Local Revenue Department')\
+    .assign(mi_lookup_level4=lambda x: x["RC_DEPT"].map(zones_dictionary))\
+    .pipe(keep_rows_based_on_list_values, 'mi_lookup_level4', dict_of_etl['zonesana'])\
+    .assign(final_mip_desc=lambda x: x["Company Number"].map(cn_industry_mapping))\
+    .assign(market_segment=lambda x: x["Company Number"].map(cn_market_mapping))\
+    .pipe(lambda x: x.rename(columns=str.lower))\
+    .pipe(lambda x: x.rename(columns=dict_of_etl["col_rename_dict"]))
+    return df_cleaned
+
+
 def initial_etl(df: pd.DataFrame):
 
     """
@@ -22,42 +82,7 @@ def initial_etl(df: pd.DataFrame):
         pd.DataFrame: The post-ETL hub data
     """
     try:
-    
-        #Get non recurring:
-        nr_df = get_df(container_name=azure_config['mappings']['container'].replace('ENV_PLACEHOLDER', deployment_mode),
-                        blob_name=azure_config['mappings']['non-recurring']['blob_name'],
-                        file_extension=azure_config['mappings']['non-recurring']['file_extension'])
-        print('Got NR DF')
-
-        # Read CMAP
-        cmap_df = get_df(container_name=azure_config['mappings']['container'].replace('ENV_PLACEHOLDER', deployment_mode),
-                            blob_name=azure_config['mappings']['client_mapping']['blob_name'],
-                            file_extension=azure_config['mappings']['client_mapping']['file_extension'])
-        print('Got cmap df')
-
-        # New Zones table
-        zones_full = get_df(container_name=azure_config['mappings']['container'].replace('ENV_PLACEHOLDER', deployment_mode),
-                            blob_name=azure_config['mappings']['zones']['blob_name'],
-                            file_extension=azure_config['mappings']['zones']['file_extension'])
-        print('got zones full')
-        
-        # Process Zone Data
-        zones_full['ZONES'] = zones_full["ZONES"].str.replace('OneMMC_', '')
-        zones_dictionary = zones_full.set_index('RC_DEPT')['ZONES'].to_dict()
-        
-        # Extract industry and market mapping table
-        cn_industry_mapping, cn_market_mapping = cmap_df.pipe(filter_cmap_df) \
-                                                    .pipe(create_cmap_mapping_tables)
-                                                    
-        # Main Pipeline
-        df_cleaned = df.pipe(flag_non_recurring, nr_df)\
-        .pipe(add_prefix_to_column_values, 'Local Revenue Department')\
-        .assign(mi_lookup_level4=lambda x: x["RC_DEPT"].map(zones_dictionary))\
-        .pipe(keep_rows_based_on_list_values, 'mi_lookup_level4', dict_of_etl['zonesana'])\
-        .assign(final_mip_desc=lambda x: x["Company Number"].map(cn_industry_mapping))\
-        .assign(market_segment=lambda x: x["Company Number"].map(cn_market_mapping))\
-        .pipe(lambda x: x.rename(columns=str.lower))\
-        .pipe(lambda x: x.rename(columns=dict_of_etl["col_rename_dict"]))
+        df_cleaned = clean_hub_data(df, load_etl_mappings())
         print(f'Found years: {df_cleaned["year"].unique()}')
 
         return df_cleaned
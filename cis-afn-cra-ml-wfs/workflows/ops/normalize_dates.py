@@ -0,0 +1,32 @@
+import pandas as pd
+from utils.etl.utils import parse_dates_factorized
+
+# date columns of the hub data, typed once after the initial ETL
+DATE_COLUMNS = ['invoice_date', 'bill_effective_dt', 'cv_effective_dt', 'cv_expiration_dt']
+
+
+def normalize_dates(df: pd.DataFrame):
+    """
+    Converts the hub date columns from strings to datetime64, right after the initial ETL.
+
+    Every distinct date string is parsed once; missing dates become NaT. The steps after it
+    (manual adjustments, the avg days features) consume the typed columns.
+
+    Args:
+        df (pd.DataFrame): The post-ETL hub data.
+
+    Returns:
+        pd.DataFrame: The post-ETL hub data with datetime64 date columns.
+    """
+    try:
+        # the other columns are shared with df, only the date columns are replaced
+        df = df.copy(deep=False)
+        for col in DATE_COLUMNS:
+            parsed = parse_dates_factorized(df[col])
+            unparsed = int((df[col].notna() & parsed.isna()).sum())
+            if unparsed:
+                print(f'{col}: {unparsed} values could not be parsed as dates and were set to NaT')
+            df[col] = parsed
+        return df
+    except Exception as e:
+        raise e
@@ -0,0 +1,61 @@
+import os
+import pandas as pd
+from api.utils.tuning.batch_scoring import score_cohorts
+
+deployment_mode = os.environ['DEPLOYMENT_MODE'].lower()
+is_test = bool(int(os.environ['IS_TEST']))
+
+if is_test:
+    environment_type = "test"
+else:
+    environment_type = deployment_mode
+
+
+def regression_cohorts(cohorts: list):
+    """
+    Regression cohort specs of a run, the same zone/product/quarter combinations train_all_regression trains.
+
+    Args:
+        cohorts (list): (product, zone) pairs from get_cohorts.
+
+    Returns:
+        list: Cohort specs for score_cohorts.
+    """
+    pairs = [('None', 'None')] + [(zone, product) for product, zone in cohorts]
+    pairs += [(zone, 'None') for zone in sorted(set(zone for product, zone in cohorts))]
+    return [{'kind': 'regression', 'zone': zone, 'product': product, 'quarter': quarter}
+            for quarter in range(0, 4) for zone, product in pairs]
+
+
+def classification_cohorts():
+    """
+    Classification cohort specs, the same recurring/product/client size combinations train_all_classification trains.
+    """
+    return [{'kind': 'classification', 'recurring': recurring, 'client_size': client_size, 'product': product}
+            for recurring in [True, False]
+            for product in ['Casualty', 'FINPRO', 'Property', 'Surety', 'Others']
+            for client_size in ['medium', 'large', 'small']]
+
+
+def score_all_regression(cohorts: list, df: pd.DataFrame):
+    """
+    Scores the modeling frame with the stored regression models instead of retraining them.
+    """
+    try:
+        print(f'Scoring {len(cohorts)} zone-product cohorts with stored regression models')
+        return score_cohorts(df, regression_cohorts(cohorts))['regression']
+    except Exception as e:
+        print(e)
+        raise e
+
+
+def score_all_classification(df: pd.DataFrame):
+    """
+    Scores the classification modeling frame with the stored classification models instead of retraining them.
+    """
+    try:
+        print('Scoring classification cohorts with stored models')
+        return score_cohorts(df, classification_cohorts())['classification']
+    except Exception as e:
+        print(e)
+        raise e
@@ -5,11 +5,14 @@ import re
 import math
 import tempfile
 import pandas as pd
-import concurrent.futures
+import numpy as np
 from io import StringIO
 from joblib import Parallel, delayed
 from requests.exceptions import Timeout, RequestException
 from api.main import train_model_cls
+from api.utils.tuning.read_infile_cls import client_size_table
+from utils.general.cohort_pool import run_cohorts
+from utils.general.api_jobs import submit_job, stream_job
 
 deployment_mode = os.environ['DEPLOYMENT_MODE'].lower()
 is_test = bool(int(os.environ['IS_TEST']))
@@ -19,25 +22,33 @@ if is_test:
 else:
     environment_type = deployment_mode
 
+# 'local' trains the cohorts on this machine's process pool, 'api' on the api service's Celery workers
+training_backend = os.environ.get('TRAINING_BACKEND', 'local').lower()
+
 def train_all_classification(df: pd.DataFrame):
     try:
         classification_results = []
 
-        # Helper function to run train_regression asynchronously
-        def run_training(recurring, product, client_size, cohort_df):
-            return train_classification(recurring, product, client_size, cohort_df)
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            futures = []
-            for recurring in [True ,False]:
-                cohort_df = df[df['Recurring'] == recurring]
-                for product in ['Casualty', 'FINPRO', 'Property', 'Surety', 'Others']:
-                    for client_size in ['medium','large','small']:
-                        futures.append(executor.submit(run_training, recurring, product, client_size, cohort_df))
-            
-            # Collect results
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
+        # client size flags of both passes for every client, computed once and shared by all 30 cohorts
+        client_sizes = client_size_table(df)
+
+        jobs = []
+        for recurring in [True ,False]:
+            rows = np.flatnonzero(df['Recurring'].to_numpy() == recurring)
+            for product in ['Casualty', 'FINPRO', 'Property', 'Surety', 'Others']:
+                for client_size in ['medium','large','small']:
+                    jobs.append(((recurring, product, client_size), rows,
+                                 {'recurring': recurring, 'product': product, 'client_size': client_size, 'client_sizes': client_sizes}))
+
+        # Collect results
+        if training_backend == 'api':
+            # the workers build the client size table of the job themselves
+            cohorts = [{'kind': 'classification', 'recurring': recurring, 'client_size': client_size, 'product': product}
+                       for (recurring, product, client_size), rows, kwargs in jobs]
+            for key, frames in stream_job(submit_job('train', df, cohorts)):
+                classification_results.append(frames)
+        else:
+            for key, result in run_cohorts(train_classification, df, jobs):
                 classification_results.append(result)
 
         # Concatenate all results
@@ -64,14 +75,14 @@ def train_all_classification(df: pd.DataFrame):
 
 
 
-def train_classification(recurring, product, client_size, cohort_df: pd.DataFrame):
+def train_classification(recurring, product, client_size, cohort_df: pd.DataFrame, client_sizes=None):
     """
     Train a single classification model.
     """
 
     try:
         print(f'Training classification model {recurring}, {product}, {client_size}')
-        cls_train_result = train_model_cls(recurring=recurring, product=product, client_size=client_size, df=cohort_df)
+        cls_train_result = train_model_cls(recurring=recurring, product=product, client_size=client_size, df=cohort_df, client_sizes=client_sizes)
         return cls_train_result
 
     except Exception as e:
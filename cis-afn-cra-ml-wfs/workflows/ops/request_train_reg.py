@@ -4,13 +4,17 @@ import time
 import re
 import tempfile
 import pandas as pd
+import numpy as np
 from io import StringIO
-import concurrent.futures
 from joblib import Parallel, delayed
 from requests.exceptions import Timeout, RequestException
 from api.main import train_model_regression
+from utils.general.cohort_pool import run_cohorts
+from utils.general.api_jobs import submit_job, stream_job
 deployment_mode = os.environ['DEPLOYMENT_MODE'].lower()
 is_test = bool(int(os.environ['IS_TEST']))
+# 'local' trains the cohorts on this machine's process pool, 'api' on the api service's Celery workers
+training_backend = os.environ.get('TRAINING_BACKEND', 'local').lower()
 
 if is_test:
     environment_type = "test"
@@ -22,36 +26,41 @@ def train_all_regression(cohorts: list, df: pd.DataFrame):
     try:
         regression_results = []
 
-        # Helper function to run train_regression asynchronously
-        def run_training(zone, product, quarter, cohort_df):
-            return train_regression(zone, product, quarter, cohort_df)
+        zone_values = df['mi_lookup_level4'].to_numpy()
+        product_values = df['product_line_nm'].to_numpy()
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
+        # row positions of each cohort, computed once and shared by the 4 quarters
+        cohort_rows = [('None', 'None', np.arange(len(df)))]
+        
+        # Model 2: Specific zone-product pairs
+        for zone_product in cohorts:
+            product, zone = zone_product
+            cohort_rows.append((zone, product, np.flatnonzero((zone_values == zone) & (product_values == product))))
+
+        # Model 3: Zones only
+        zones = [cohort[1] for cohort in cohorts]
+        unique_zones = list(set(zones))
+        for zone in unique_zones:
+            cohort_rows.append((zone, 'None', np.flatnonzero(zone_values == zone)))
+
+        # Loop through quarters 1 to 4
+        jobs = []
+        for quarter in range(0, 4):
+            for zone, product, rows in cohort_rows:
+                jobs.append(((zone, product, quarter), rows, {'zone': zone, 'product': product, 'quarter': quarter}))
+
+        if training_backend == 'api':
+            job_id = submit_job('train', df, [dict(kwargs, kind='regression') for key, rows, kwargs in jobs])
+            for key, frames in stream_job(job_id):
+                print(f'Got result for {key}')
+                regression_results.append(frames['prediction_results'])
+        else:
+            # cohorts already run in parallel, so each search evaluates its trials serially by default
+            worker_env = {'REG_OPTIMIZER_BACKEND': os.environ.get('REG_OPTIMIZER_BACKEND', 'serial')}
 
-            # Loop through quarters 1 to 4
-            for quarter in range(0, 4):
-                # Model 1: All zones/products
-                cohort_df = df
-                futures.append(executor.submit(run_training, 'None', 'None', quarter, cohort_df))
-                
-                # Model 2: Specific zone-product pairs
-                for zone_product in cohorts:
-                    product, zone = zone_product
-                    cohort_df = df[(df['mi_lookup_level4'] == zone) & (df['product_line_nm'] == product)]
-                    futures.append(executor.submit(run_training, zone, product, quarter, cohort_df))
-                    
-                # Model 3: Zones only
-                zones = [cohort[1] for cohort in cohorts]
-                unique_zones = list(set(zones))
-                for zone in unique_zones:
-                    cohort_df = df[(df['mi_lookup_level4'] == zone)]
-                    futures.append(executor.submit(run_training, zone, 'None', quarter, cohort_df))
-                
             # Collect results
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                print(f'Got result: {type(result)}')
+            for key, result in run_cohorts(train_regression, df, jobs, env=worker_env):
+                print(f'Got result for {key}: {type(result)}')
                 regression_results.append(result)
 
         # Concatenate all results
@@ -0,0 +1,423 @@
+# reference_feature_functions.py
+# The merge-based feature functions as they were before utils.etl.group_transforms, kept unchanged as the
+# reference the grouped transforms in utils.etl.num_feature_functions are tested against.
+from typing import List
+import numpy as np
+import pandas as pd
+from utils.etl.num_feature_functions import compute_normalized_column
+
+def compute_avg_days_to_invoice(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the average number of days to invoice date from the end of quarter date.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'avg_days_to_invoice' column added.
+    """
+    quarter_end_map = {1: "01-01", 2: "04-01", 3: "07-01", 4: "10-01"}
+    df.dropna(subset=["invoice_date"], inplace=True)
+    df["quarter_start_date"] = (
+        pd.to_datetime(df["invoice_date"]).dt.year.astype(int).astype(str) + "-" + df["quarter"].map(quarter_end_map)
+    )
+    df['quarter_start_date'] = pd.to_datetime(df["quarter_start_date"])
+    df['invoice_date'] = pd.to_datetime(df["invoice_date"])
+
+    # Calculate the difference in days
+    df["days_difference"] = (df["invoice_date"] - df["quarter_start_date"]).dt.days
+
+    # Group by 'quarter' and 'year' and calculate the average
+    block_columns = block_columns or []
+    avg_days = df.groupby(block_columns + ['quarter', 'year'])['days_difference'].mean().round(2).reset_index()
+    avg_days.rename(columns={'days_difference': 'avg_days_to_invoice'}, inplace=True)
+
+    # Merge the average back to the original DataFrame
+    df = df.merge(avg_days, on=block_columns + ["quarter", "year"], how="left")
+
+    return df
+
+
+def compute_avg_days_to_bill_effective(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the average number of days to billing effective date from the end of quarter date.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'avg_days_to_billing_effective' column added.
+    """
+    quarter_end_map = {1: "01-01", 2: "04-01", 3: "07-01", 4: "10-01"}
+    df.dropna(subset=["bill_effective_dt"], inplace=True)
+     # Create a new column for the quarter end date
+    df["quarter_start_date"] = (
+        pd.to_datetime(df["bill_effective_dt"]).dt.year.astype(int).astype(str) + "-" + df["quarter"].map(quarter_end_map)
+    )
+
+    # Convert to datetime
+    df["quarter_start_date"] = pd.to_datetime(df["quarter_start_date"])
+    df["bill_effective_dt"] = pd.to_datetime(df["bill_effective_dt"])
+
+    # Calculate the difference in days
+    df["days_difference"] = abs(df["bill_effective_dt"] - df["quarter_start_date"]).dt.days
+
+    # Group by 'quarter' and 'year' and calculate the average
+    block_columns = block_columns or []
+    avg_days = df.groupby(block_columns + ['quarter', 'year'])['days_difference'].mean().round(2).reset_index()
+    avg_days.rename(columns={'days_difference': 'avg_days_to_bill_effective'}, inplace=True)
+
+    # Merge the average back to the original DataFrame
+    df = df.merge(avg_days, on=block_columns + ["quarter", "year"], how="left")
+
+    return df
+
+
+def compute_avg_days_to_cv_effective_dt(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the average number of days to coverage effective date from the end of quarter date.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'avg_days_to_cv_effective' column added.
+    """
+    quarter_end_map = {1: "01-01", 2: "04-01", 3: "07-01", 4: "10-01"}
+    df.dropna(subset=["cv_effective_dt"], inplace=True)
+    df["quarter_start_date"] = (
+        pd.to_datetime(df["cv_effective_dt"]).dt.year.astype(int).astype(str) + "-" + df["quarter"].map(quarter_end_map)
+    )
+    
+    # Convert to datetime
+    df["quarter_start_date"] = pd.to_datetime(df["quarter_start_date"])
+    df["cv_effective_dt"] = pd.to_datetime(df["cv_effective_dt"])
+
+    # Calculate the difference in days
+    df["days_difference"] = abs(df["cv_effective_dt"] - df["quarter_start_date"]).dt.days
+
+    # Group by 'quarter' and 'year' and calculate the average
+    block_columns = block_columns or []
+    avg_days = df.groupby(block_columns + ['quarter', 'year'])['days_difference'].mean().round(2).reset_index()
+    avg_days.rename(columns={'days_difference': 'avg_days_to_cv_effective'}, inplace=True)
+
+    # Merge the average back to the original DataFrame
+    df = df.merge(avg_days, on=block_columns + ["quarter", "year"], how="left")
+
+    return df
+
+def compute_avg_days_to_cv_exp_dt(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the average number of date to coverage expiration date from the end of quarter date.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'avg_days_to_cv_exp' column added.
+    """
+    quarter_end_map = {1: "01-01", 2: "04-01", 3: "07-01", 4: "10-01"}
+    df.dropna(subset=["cv_expiration_dt"], inplace=True)
+    df["quarter_start_date"] = (
+        pd.to_datetime(df["cv_expiration_dt"]).dt.year.astype(int).astype(str) + "-" + df["quarter"].map(quarter_end_map)
+    )
+    
+    # Convert to datetime
+    df["quarter_start_date"] = pd.to_datetime(df["quarter_start_date"])
+    df["cv_expiration_dt"] = pd.to_datetime(df["cv_expiration_dt"])
+
+    # Calculate the difference in days
+    df["days_difference"] = abs(df["cv_expiration_dt"] - df["quarter_start_date"]).dt.days
+
+    # Group by 'quarter' and 'year' and calculate the average
+    block_columns = block_columns or []
+    avg_days = df.groupby(block_columns + ['quarter', 'year'])['days_difference'].mean().round(2).reset_index()
+    avg_days.rename(columns={'days_difference': 'avg_days_to_cv_exp'}, inplace=True)
+
+    # Merge the average back to the original DataFrame
+    df = df.merge(avg_days, on=block_columns + ["quarter", "year"], how="left")
+
+    return df
+
+def compute_non_recurring_percentage(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the current quarter's percentage of non recurring revenue by dividing non-recurring revenue by new business
+    revenue.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'client_nr_percentage' column added.
+    """
+
+    df["non_recurring_revenue"] = df["net_revenue"].where(df["non_recurring_flag"], 0)
+    df["new_business_revenue"] = df["net_revenue"].where(df["production_code"].isin(["New business", "Expanded services"]), 0)
+
+    block_columns = block_columns or []
+    df_quarter = df.groupby(block_columns + ["quarter"]).agg({"non_recurring_revenue": "sum", "new_business_revenue": "sum"}).reset_index()
+
+    # Calculate the client_nr_percentage
+    df_quarter["client_nr_percentage"] = (df_quarter["non_recurring_revenue"] / df_quarter["new_business_revenue"]) * 100
+
+    # # Merge the client_nr_percentage column back to the original dataframe
+    df = pd.merge(df, df_quarter[block_columns + ["quarter", "client_nr_percentage"]], on=block_columns + ["quarter"], how="left")
+
+    return df
+
+
+def compute_avg_stickiness(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the average client stickiness.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'avg_client_stickiness' column added.
+    """
+    block_columns = block_columns or []
+
+    # get total number of product lines
+    total_prod_lines = df["product_line_nm"].nunique()
+
+    # Count number of unique product lines per period and per company number
+    unique_product_lines = df.groupby(block_columns + ["company_number", "quarter"])["product_line_nm"].nunique().reset_index(name='unique_product_lines')
+
+    # each block has its own total
+    if block_columns:
+        block_prod_lines = df.groupby(block_columns)["product_line_nm"].nunique().reset_index()
+        total_prod_lines = unique_product_lines[block_columns].merge(block_prod_lines, on=block_columns, how="left")["product_line_nm"].to_numpy()
+
+    # Calculate the percentage stickiness by dividing number of company lines by total lines
+    unique_product_lines["client_avg_stickiness"] = (unique_product_lines['unique_product_lines'] / total_prod_lines).round(2)
+    
+    # merge back to original df
+    df = df.merge(unique_product_lines, on=block_columns + ["company_number", "quarter"], how='left')
+
+    return df
+
+
+def compute_renewal_rate(df: pd.DataFrame, grouping_columns: List[str], block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the Renewal Ratio within the data processing step.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        grouping_columns (List[str]): Columns to group by.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+            Periods are only compared within a block.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'renewal_rate_ratio' column added.
+    """
+    # Ensure necessary columns are present
+    required_columns = ["year", "quarter", "net_revenue", "production_code"]
+    for col in required_columns:
+        if col not in df.columns:
+            raise ValueError(f"Column '{col}' not found in DataFrame.")
+    block_columns = block_columns or []
+
+    # Normalize 'production_code'
+    df = compute_normalized_column(df, "production_code")
+    renewal_codes = ["renewal"]
+
+    # Compute renewal revenue
+    df["renewal_revenue"] = df["net_revenue"].where(df["production_code_normalized"].isin(renewal_codes), 0)
+
+    #######
+    # Aggregate renewal revenue by year and quarter
+    renewal_revenue_total = df.groupby(block_columns + grouping_columns + ["year", "quarter"])["renewal_revenue"].sum().reset_index()
+    renewal_revenue_total.rename(columns={"renewal_revenue": "total_renewal_revenue"}, inplace=True)
+
+    # Merge the total renewal revenue back into the original DataFrame
+    df = df.merge(renewal_revenue_total, on=block_columns + grouping_columns + ["year", "quarter"], how="left")
+    ##############
+
+    # Compute total revenue per group, year, and quarter
+    total_revenue = df.groupby(block_columns + grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
+    total_revenue.rename(columns={"net_revenue": "total_revenue"}, inplace=True)
+
+    # Shift total revenue by 1 year to get last year's same quarter total revenue
+    total_revenue["year"] = total_revenue["year"] + 1  # Shift forward by 1 year
+
+    # Merge shifted total revenue back into the original DataFrame
+    df = df.merge(total_revenue, on=block_columns + grouping_columns + ["year", "quarter"], how="left")
+
+    # Get the grouping columns as a string to use in the new column name
+    grouping_str = '_'.join(grouping_columns)
+    grouping_str = grouping_str.replace('client_number', 'client').replace('product_line_nm', 'product')
+
+    # Calculate the Renewal Revenue Ratio -- ###########
+    df[f"renewal_revenue_ratio_{grouping_str}"] = (df["total_renewal_revenue"].round(0) / df["total_revenue"].round(0)).round(2)
+
+    # Handle division by zero or missing values
+    df[f"renewal_revenue_ratio_{grouping_str}"].replace([np.inf, -np.inf], np.nan, inplace=True)
+    df[f"renewal_revenue_ratio_{grouping_str}"].fillna(0, inplace=True)
+
+    # Calculate the standard deviation of the renewal ratio rate
+
+    # Apply threshold
+    df[f"renewal_revenue_ratio_{grouping_str}"] = np.where(
+    df[f"renewal_revenue_ratio_{grouping_str}"] > 20,
+    20, # Set to 20 if above 20
+    np.where(
+        df[f"renewal_revenue_ratio_{grouping_str}"] < -20,
+        -20,  # Set to -20 if below -20
+        df[f"renewal_revenue_ratio_{grouping_str}"]
+    )# Set to mean + std_dev if above upper threshold
+    )
+    return df
+
+def compute_qq_growth(df: pd.DataFrame, grouping_columns: List[str], block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the QoQ growth in 'net_revenue' within the data processing step.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        grouping_columns (List[str]): Columns to group by.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+            Periods are only compared within a block.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'qq_growth_rate' column added.
+    """
+    # Ensure necessary columns are present
+    required_columns = ["quarter", "net_revenue"]
+    for col in required_columns:
+        if col not in df.columns:
+            raise ValueError(f"Column '{col}' not found in DataFrame.")
+    block_columns = block_columns or []
+
+    # Sum 'net_revenue' per product per period
+    product_revenue = df.groupby(block_columns + grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
+    product_revenue.rename(columns={"net_revenue": "current_revenue"}, inplace=True)
+    df = df.merge(product_revenue, on=block_columns + grouping_columns + ["year", "quarter"], how="left")
+
+    # Get previous quarter's revenue
+    product_revenue = df.groupby(block_columns + grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
+    product_revenue.rename(columns={"net_revenue": "prev_quarter_revenue"}, inplace=True)
+
+    # Shift total revenue by 1 year to get last year's same quarter total revenue
+    product_revenue["quarter"] = product_revenue["quarter"] + 1
+    df = df.merge(product_revenue, on=block_columns + grouping_columns + ["year", "quarter"], how="left")
+    # Get the grouping columns as a string to use in the new column name
+    grouping_str = '_'.join(grouping_columns)
+    grouping_str = grouping_str.replace('client_number', 'client').replace('product_line_nm', 'product')
+
+    # Round revenues to nearest whole number
+    df["prev_quarter_revenue"] = df["prev_quarter_revenue"].round(0)
+    df["current_revenue"] = df["current_revenue"].round(0)
+
+    # Calculate the percentage growth by comparing current revenue to the previous quarter's revenue
+    df[f"qq_growth_rate_{grouping_str}"] = (
+        (df["current_revenue"].round(0) - df["prev_quarter_revenue"].round(0))
+        / (abs(df["prev_quarter_revenue"].round(0)))
+        * 100
+    ).round(2)
+    
+    # Handle division by zero or missing values
+    df[f"qq_growth_rate_{grouping_str}"].replace([np.inf, -np.inf], np.nan, inplace=True)
+    df[f"qq_growth_rate_{grouping_str}"].fillna(0, inplace=True)
+
+    # Apply threshold
+    df[f"qq_growth_rate_{grouping_str}"] = np.where(
+    df[f"qq_growth_rate_{grouping_str}"] > 200,
+    200,  # Set to 200 if above 200
+    np.where(
+        df[f"qq_growth_rate_{grouping_str}"] < -200,
+        -200,  # Set to -200 if below -200
+        df[f"qq_growth_rate_{grouping_str}"]  # Keep original value if within thresholds
+    )
+    )
+    return df
+
+
+def compute_yy_growth(df: pd.DataFrame, grouping_columns: List[str], block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the YoY growth in 'net_revenue' within the data processing step.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        grouping_columns (List[str]): Columns to group by.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+            Periods are only compared within a block.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'yy_growth_rate' column added.
+    """
+    # Ensure necessary columns are present
+    required_columns = ["quarter", "net_revenue"]
+    for col in required_columns:
+        if col not in df.columns:
+            raise ValueError(f"Column '{col}' not found in DataFrame.")
+    block_columns = block_columns or []
+
+    # Sum 'net_revenue' per product per period
+    curr_rev = df.groupby(block_columns + grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
+    curr_rev.rename(columns={"net_revenue": "curr_rev"}, inplace=True)
+    df = df.merge(curr_rev, on=block_columns + grouping_columns + ["year", "quarter"], how="left")
+
+    # Get previous quarter's revenue
+    prev_rev = df.groupby(block_columns + grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
+    prev_rev.rename(columns={"net_revenue": "prev_revenue"}, inplace=True)
+
+    # Shift total revenue by 1 year to get last year's same quarter total revenue
+    prev_rev["year"] = prev_rev["year"] + 1
+    df = df.merge(prev_rev, on=block_columns + grouping_columns + ["year", "quarter"], how="left")
+    
+    # Get the grouping columns as a string to use in the new column name
+    grouping_str = '_'.join(grouping_columns)
+    grouping_str = grouping_str.replace('client_number', 'client').replace('product_line_nm', 'product')
+
+    # Round revenues to nearest whole number
+    df["prev_revenue"] = df["prev_revenue"].round(0)
+    df["curr_rev"] = df["curr_rev"].round(0)
+
+    # Calculate the percentage growth by comparing current revenue to the previous quarter's revenue
+    df[f"yy_growth_rate_{grouping_str}"] = (
+        (df["curr_rev"].round(0) - df["prev_revenue"].round(0))
+        / (abs(df["prev_revenue"].round(0)))
+        * 100
+    ).round(2)
+
+    # Handle division by zero or missing values
+    df[f"yy_growth_rate_{grouping_str}"].replace([np.inf, -np.inf], np.nan, inplace=True)
+    df[f"yy_growth_rate_{grouping_str}"].fillna(0, inplace=True)
+
+    # Apply threshold
+    df[f"yy_growth_rate_{grouping_str}"] = np.where(
+    df[f"yy_growth_rate_{grouping_str}"] > 200,
+    200,  # Set to 200 if above 200
+    np.where(
+        df[f"yy_growth_rate_{grouping_str}"] < -200,
+        -200,  # Set to -200 if below -200
+        df[f"yy_growth_rate_{grouping_str}"]  # Keep original value if within thresholds
+    )
+    )
+    return df
+
+
+def compute_num_subproducts(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
+    """
+    Computes the number of subproducts within a client.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'num_client_subproducts' column added.
+    """
+
+    block_columns = block_columns or []
+    num_client_subproducts = df.groupby(block_columns + ['client_number', 'quarter'])["product_subgroup_nm"].nunique().reset_index()
+    num_client_subproducts.rename(columns={"product_subgroup_nm": "num_client_subproducts"}, inplace=True)
+    df = df.merge(num_client_subproducts, on=block_columns + ['client_number', 'quarter'], how='left')
+    return df
@@ -0,0 +1,102 @@
+# test_group_transforms.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.etl.num_feature_functions as feature_functions
+from tests.fixtures import reference_feature_functions as reference
+
+# the reference functions use chained inplace fillna/replace, which pandas warns about
+pytestmark = pytest.mark.filterwarnings("ignore::FutureWarning")
+
+DATE_COLUMNS = ["invoice_date", "bill_effective_dt", "cv_effective_dt", "cv_expiration_dt"]
+GROUPINGS = [["client_number"], ["product_line_nm"], ["client_number", "product_line_nm"]]
+
+
+@pytest.fixture(scope="module")
+def transactions() -> pd.DataFrame:
+    """
+    Small synthetic transaction set over three years with missing keys, missing dates and a non-range index.
+    """
+    rng = np.random.default_rng(24)
+    n = 600
+    year = rng.choice([2022, 2023, 2024], n)
+    quarter = rng.integers(1, 5, n)
+    df = pd.DataFrame(
+        {
+            "row_id": np.arange(n),
+            "year": year,
+            "quarter": quarter,
+            "client_number": rng.choice([f"C{i}" for i in range(8)], n).astype(object),
+            "company_number": rng.choice([f"CN{i}" for i in range(5)], n).astype(object),
+            "product_line_nm": rng.choice(["Casualty", "FINPRO", "Property", "Surety"], n).astype(object),
+            "product_subgroup_nm": rng.choice(["s1", "s2", "s3"], n).astype(object),
+            "production_code": rng.choice(["Renewal", "New business", "Expanded services", " renewal "], n),
+            "non_recurring_flag": rng.random(n) < 0.2,
+            "mi_lookup_level4": rng.choice(["East", "West"], n),
+            "net_revenue": rng.normal(1000, 400, n).round(2),
+        }
+    )
+    for column in DATE_COLUMNS:
+        offsets = pd.to_timedelta(rng.integers(0, 500, n), "D")
+        df[column] = pd.to_datetime(df["year"].astype(str) + "-01-01") + offsets
+
+    # missing keys and dates on disjoint rows
+    rows = rng.permutation(n)
+    df.loc[rows[:20], "client_number"] = np.nan
+    df.loc[rows[20:40], "company_number"] = np.nan
+    df.loc[rows[40:60], "product_line_nm"] = np.nan
+    df.loc[rows[60:80], "product_subgroup_nm"] = np.nan
+    for i, column in enumerate(DATE_COLUMNS):
+        df.loc[rows[80 + 10 * i:90 + 10 * i], column] = pd.NaT
+
+    df["block"] = df.groupby(["mi_lookup_level4", "year", "quarter"]).ngroup()
+    df.index = df.index * 3 + 7
+    return df
+
+
+def _cases():
+    cases = []
+    for grouping_columns in GROUPINGS:
+        for name in ["compute_renewal_rate", "compute_qq_growth", "compute_yy_growth"]:
+            cases.append((name, {"grouping_columns": grouping_columns}))
+    for name in [
+        "compute_non_recurring_percentage",
+        "compute_avg_stickiness",
+        "compute_num_subproducts",
+        "compute_avg_days_to_invoice",
+        "compute_avg_days_to_bill_effective",
+        "compute_avg_days_to_cv_effective_dt",
+        "compute_avg_days_to_cv_exp_dt",
+    ]:
+        cases.append((name, {}))
+    return [
+        pytest.param(name, dict(kwargs, **blocks), id=f"{name}-{'-'.join(kwargs.get('grouping_columns', []))}-{bool(blocks)}")
+        for name, kwargs in cases
+        for blocks in [{}, {"block_columns": ["block"]}]
+    ]
+
+
+@pytest.mark.parametrize("name, kwargs", _cases())
+def test_matches_merge_based_reference(transactions, name, kwargs):
+    expected = getattr(reference, name)(transactions.copy(), **kwargs)
+    result = getattr(feature_functions, name)(transactions.copy(), **kwargs)
+
+    # only the feature column is added
+    added = [c for c in result.columns if c not in transactions.columns and not c.endswith("_normalized")]
+    assert len(added) == 1
+    feature = added[0]
+
+    # same rows in the same order, and the index of the input is kept
+    np.testing.assert_array_equal(result["row_id"].to_numpy(), expected["row_id"].to_numpy())
+    pd.testing.assert_index_equal(result.index, transactions.index[transactions.index.isin(result.index)])
+
+    assert result[feature].dtype == expected[feature].dtype
+    np.testing.assert_array_equal(result[feature].to_numpy(), expected[feature].to_numpy())
+
+
+def test_shifted_values_are_found(transactions):
+    result = feature_functions.compute_yy_growth(transactions.copy(), grouping_columns=["client_number"])
+    assert (result["yy_growth_rate_client"] != 0).any()
+    # a missing client has no previous period
+    assert (result.loc[result["client_number"].isna(), "yy_growth_rate_client"] == 0).all()
@@ -0,0 +1,39 @@
+# test_tune_classification.py
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from api.utils.tuning.tune_classification import get_search, narrow_param_grid
+
+PARAM_GRID = {
+    'n_estimators': np.arange(100, 200, 50),
+    'max_depth': [None, 10, 20],
+    'min_samples_split': [2, 5],
+    'min_samples_leaf': [1, 2],
+    'bootstrap': [True, False],
+    'criterion': ['entropy', 'log_loss'],
+}
+
+
+@pytest.fixture(scope='module')
+def training_set():
+    rng = np.random.default_rng(7)
+    X = pd.DataFrame(rng.random((200, 4)), columns=['a', 'b', 'c', 'd'])
+    y = (X['a'] + rng.normal(0, 0.2, 200) > 0.5).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize('grid', [
+    pytest.param(PARAM_GRID, id='full'),
+    pytest.param(narrow_param_grid(PARAM_GRID, [{'n_estimators': 150, 'max_depth': 10, 'min_samples_split': 2,
+                                                 'min_samples_leaf': 1, 'bootstrap': True, 'criterion': 'entropy'}]),
+                 id='warm-start'),
+])
+def test_halving_refits_with_largest_n_estimators(training_set, grid):
+    X, y = training_set
+    search = get_search('halving', RandomForestClassifier(random_state=42), grid, n_jobs=1).fit(X, y)
+
+    assert search.best_estimator_.n_estimators == 150
+    assert search.best_params_['n_estimators'] == 150
+    assert len(search.best_estimator_.estimators_) == 150
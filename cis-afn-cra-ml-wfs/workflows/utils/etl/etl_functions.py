@@ -197,21 +197,17 @@ def pivot_revenue_by_product(df):
     else:
         result_df = df[['client_number']].drop_duplicates().reset_index(drop=True)
 
-    # For each product, create product-specific renewal revenue columns
-    for product in products:
-        # Filter data for this product
-        product_data = df[df['product_line_nm'] == product][['client_number'] + renewal_revenue_cols]
+    if not renewal_revenue_cols:
+        return result_df
 
-        # Rename ONLY renewal revenue columns to include product prefix
-        rename_dict = {}
-        for col in renewal_revenue_cols:
-            new_col_name = f"{product}_{col}"
-            rename_dict[col] = new_col_name
+    # Product-specific renewal revenue columns of all products in one pivot, one row per client and product
+    product_df = df.pivot_table(index='client_number', columns='product_line_nm', values=renewal_revenue_cols,
+                                aggfunc='first', dropna=False)
+    product_df = product_df[[(col, product) for product in products for col in renewal_revenue_cols]]
+    product_df.columns = [f"{product}_{col}" for col, product in product_df.columns]
 
-        product_data = product_data.rename(columns=rename_dict)
-
-        # Merge with result dataframe
-        result_df = result_df.merge(product_data, on='client_number', how='left')
+    # Merge with result dataframe
+    result_df = result_df.merge(product_df.reset_index(), on='client_number', how='left')
 
     return result_df
  
\ No newline at end of file
@@ -0,0 +1,143 @@
+from typing import List
+import numpy as np
+import pandas as pd
+from utils.etl.num_feature_data_prep import prepare_revenue_data
+from utils.etl.num_feature_definitions import FeatureDefinition
+
+# production codes whose revenue the features are built from
+CSR_PRODUCTION_CODES = ['Renewal', 'New business', 'Expanded services']
+QUARTER_MONTHS = [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10, 11, 12]]
+# the non recurring flag is filled with a placeholder before the features are built; the date columns
+# are datetime64 since normalize_dates and keep their missing values as NaT
+PLACEHOLDER_COLUMNS = ['non_recurring_flag']
+
+# level frames joined onto the client-product level, with their join keys, in merge order
+CLIENT_PRODUCT_LEVEL = 'client_number_product_line_nm'
+JOINED_LEVELS = [('client_number', ['client_number']), ('product_line_nm', ['product_line_nm']), ('company_number', ['company_number'])]
+
+
+def block_rows(df_original: pd.DataFrame, latest_year, latest_quarter, block_columns: List[str]) -> pd.DataFrame:
+    """
+    Rows of every block the features are built for, with the fills every block gets.
+
+    A block is one value of block_columns (e.g. zone, year and quarter) within the CSR production codes of the
+    years up to latest_year, the latest year only up to latest_quarter. Rows with a missing block value belong
+    to no block.
+
+    Args:
+        df_original (pd.DataFrame): The dataframe used to build features.
+        latest_year (int): The latest year found in df_original.
+        latest_quarter (int): The latest full quarter found in df_original.
+        block_columns (List[str]): Block columns; 'quarter' is derived from month.
+
+    Returns:
+        pd.DataFrame: Block rows in their original order, with a 'quarter' column.
+    """
+    last_year = int(latest_year)
+    latest_months = [month for months in QUARTER_MONTHS[:int(latest_quarter)] for month in months]
+    all_months = [month for months in QUARTER_MONTHS for month in months]
+
+    mask = (df_original['year'] <= last_year) & df_original['production_code'].isin(CSR_PRODUCTION_CODES)
+    mask &= np.where(df_original['year'] == last_year, df_original['month'].isin(latest_months), df_original['month'].isin(all_months))
+    rows = df_original[mask].copy()
+    rows['quarter'] = ((rows['month'] - 1) // 3) + 1
+    rows = rows.dropna(subset=block_columns)
+
+    rows['client_number'] = rows['client_number'].fillna('missing_client')
+    rows[PLACEHOLDER_COLUMNS] = rows[PLACEHOLDER_COLUMNS].fillna('Missing')
+    return rows
+
+
+def compute_block_features(rows: pd.DataFrame, feature_definitions: List[FeatureDefinition], block_columns: List[str],
+                           costs: List[dict] = None) -> pd.DataFrame:
+    """
+    Computes the features of all blocks in one grouped pass.
+
+    The result is the same as running prepare_revenue_data on every block separately and merging its levels onto
+    the client-product level (client, product, then company via each client's first company number in the block),
+    but every feature is computed once over all rows with the block added to its group keys.
+
+    Args:
+        rows (pd.DataFrame): Block rows, see block_rows.
+        feature_definitions (List[FeatureDefinition]): Features to compute.
+        block_columns (List[str]): Block columns, including 'year' and 'quarter'.
+        costs (List[dict]): If given, collects the time of every feature, see feature_cost_report.
+
+    Returns:
+        pd.DataFrame: One row per block, client and product with the block columns, client_number, product_line_nm,
+            company_number and the features of every level (each level's features sorted by name, as the pivot does).
+    """
+    rows = rows.copy()
+    # one id per block, so that year and quarter shifts inside the features never reach another block
+    rows['block'] = rows.groupby(block_columns, sort=False).ngroup()
+    levels = prepare_revenue_data(df=rows, feature_definitions=feature_definitions, block_columns=['block'], costs=costs)
+
+    def level_frame(name, keys):
+        level_df = levels[name].drop(columns=['year_offset', 'quarter'])
+        features = sorted(col for col in level_df.columns if col not in ['block'] + keys)
+        # the pivot of a single block averages one value per cell and fills the missing ones
+        level_df[features] = level_df[features].astype(float).fillna(0)
+        return level_df[['block'] + keys + features]
+
+    block_df = level_frame(CLIENT_PRODUCT_LEVEL, ['client_number', 'product_line_nm'])
+    for name, keys in JOINED_LEVELS:
+        if name not in levels:
+            continue
+        if name == 'company_number':
+            client_company = rows.drop_duplicates(subset=['block', 'client_number'])[['block', 'client_number', 'company_number']]
+            block_df = block_df.merge(client_company, on=['block', 'client_number'], how='left')
+        block_df = block_df.merge(level_frame(name, keys), on=['block'] + keys, how='left')
+
+    blocks = rows.drop_duplicates(subset='block')[['block'] + block_columns]
+    block_df = blocks.merge(block_df, on='block', how='right').drop(columns='block')
+    return block_df
+
+
+def block_modes(rows: pd.DataFrame, keys: List[str], columns: List[str]) -> pd.DataFrame:
+    """
+    Most frequent value of each column per group of keys (the smallest one on ties, as Series.mode),
+    the same as extract_categorical_variables per block.
+    """
+    result_df = rows[keys].drop_duplicates().reset_index(drop=True)
+    for col in columns:
+        counts = rows.groupby(keys + [col]).size().reset_index(name='count')
+        counts = counts.sort_values(keys + ['count'], ascending=[True] * len(keys) + [False], kind='stable')
+        result_df = result_df.merge(counts.drop_duplicates(subset=keys)[keys + [col]], on=keys, how='left')
+    return result_df
+
+
+def wide_column(feature: str, year_offset, quarter) -> str:
+    return f'{feature}_year_{year_offset}_Q{int(quarter)}'
+
+
+def pivot_block_features(block_df: pd.DataFrame, index: List[str], features: List[str], latest_year, block_order: list) -> pd.DataFrame:
+    """
+    Pivots block features to the wide layout, one '<feature>_year_<offset>_Q<quarter>' column per feature and period.
+
+    Args:
+        block_df (pd.DataFrame): Block features with 'year' and 'quarter' columns.
+        index (List[str]): Row keys of the wide frame; block_df must have one row per keys, year and quarter.
+        features (List[str]): Feature columns to pivot.
+        latest_year (int): Year of offset 0.
+        block_order (list): (year, quarter) of the blocks in the order their columns were first added.
+
+    Returns:
+        pd.DataFrame: Wide frame sorted by index, missing periods as NaN.
+    """
+    last_year = int(latest_year)
+    block_df = block_df.copy()
+    block_df['year_offset'] = [0 if year == last_year else last_year - year for year in block_df['year']]
+    offsets = dict(zip(block_df['year'], block_df['year_offset']))
+
+    wide = block_df.set_index(index + ['year_offset', 'quarter'])[features].unstack(['year_offset', 'quarter'])
+    wide.columns = [wide_column(feature, year_offset, quarter) for feature, year_offset, quarter in wide.columns]
+
+    ordered = []
+    for year, quarter in block_order:
+        if year not in offsets:
+            continue
+        for feature in features:
+            col = wide_column(feature, offsets[year], quarter)
+            if col in wide.columns and col not in ordered:
+                ordered.append(col)
+    return wide[ordered].sort_index()
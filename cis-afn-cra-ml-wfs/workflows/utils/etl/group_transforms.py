@@ -0,0 +1,53 @@
+# group_transforms.py
+from typing import List, Union
+import pandas as pd
+
+
+def _values(df: pd.DataFrame, values: Union[str, pd.Series]) -> pd.Series:
+    return df[values] if isinstance(values, str) else values
+
+
+def group_transform(df: pd.DataFrame, keys: List[str], values: Union[str, pd.Series], func: str) -> pd.Series:
+    """
+    Aggregates values within the groups of keys and broadcasts the result back to the rows of df.
+
+    Parameters:
+        df (pd.DataFrame): Frame holding the key columns.
+        keys (List[str]): Group columns.
+        values (Union[str, pd.Series]): Column of df, or a Series aligned to df.
+        func (str): Aggregation, e.g. 'sum', 'mean' or 'nunique'.
+
+    Returns:
+        pd.Series: The group aggregate of every row, aligned to df; NaN for rows with a missing key.
+    """
+    return _values(df, values).groupby([df[key] for key in keys]).transform(func)
+
+
+def shifted_group_sum(
+    df: pd.DataFrame, keys: List[str], values: Union[str, pd.Series], shift_column: str, periods: int = 1
+) -> pd.Series:
+    """
+    Sum of values in the group whose shift_column is periods lower than the row's own group, aligned to df.
+
+    E.g. with keys [client, year, quarter] and shift_column 'year', every row gets its client's sum of the same
+    quarter in the previous year. The group sums are looked up through their shifted keys instead of being merged.
+
+    Parameters:
+        df (pd.DataFrame): Frame holding the key columns.
+        keys (List[str]): Group columns, including shift_column.
+        values (Union[str, pd.Series]): Column of df, or a Series aligned to df.
+        shift_column (str): Period column of keys.
+        periods (int): Periods to look back.
+
+    Returns:
+        pd.Series: The sum of the earlier group, NaN where that group has no rows or a key is missing.
+    """
+    sums = _values(df, values).groupby([df[key] for key in keys]).sum()
+
+    # the sum of period p belongs to the rows of period p + periods
+    shifted_keys = sums.index.to_frame(index=False)
+    shifted_keys[shift_column] = shifted_keys[shift_column] + periods
+    sums.index = pd.MultiIndex.from_frame(shifted_keys)
+
+    looked_up = sums.reindex(pd.MultiIndex.from_frame(df[keys]))
+    return pd.Series(looked_up.to_numpy(), index=df.index)
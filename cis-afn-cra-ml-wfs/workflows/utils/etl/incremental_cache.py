@@ -0,0 +1,84 @@
+import os
+import re
+import json
+import hashlib
+import pandas as pd
+from utils.general.stage_runner import frame_fingerprint
+
+# only re-ETL and re-featurize year_0, historical years come from the cache below
+INCREMENTAL_REFRESH = bool(int(os.environ.get('INCREMENTAL_REFRESH', 0)))
+# cache of cleaned historical hub years and their feature blocks; point it at a persistent
+# mount (e.g. under /dbfs) so it survives between the quarterly runs
+ETL_CACHE_DIR = os.environ.get('ETL_CACHE_DIR', '/tmp/cra_etl_cache')
+# set to 1 to ignore cached entries and rebuild them, e.g. after a historical blob was re-uploaded
+ETL_CACHE_REFRESH = bool(int(os.environ.get('ETL_CACHE_REFRESH', 0)))
+
+
+def cache_key(*parts):
+    """
+    Short hash of the given parts, used as the version of a cache entry.
+    """
+    return hashlib.sha256(json.dumps([str(part) for part in parts]).encode()).hexdigest()[:16]
+
+
+def frames_key(*frames):
+    return cache_key(*[frame_fingerprint(df) for df in frames])
+
+
+def definitions_key(feature_definitions):
+    """
+    Version of a list of FeatureDefinition, changes with the names, aggregation levels,
+    aggregation functions and the code of the compute functions.
+    """
+    parts = []
+    for feature in feature_definitions:
+        function = getattr(feature.compute_function, 'func', feature.compute_function)
+        keywords = getattr(feature.compute_function, 'keywords', {})
+        code = function.__code__
+        parts.append([feature.name, feature.aggregation_levels, feature.aggfunc, function.__qualname__,
+                      hashlib.sha256(code.co_code).hexdigest(), repr(code.co_consts), sorted(keywords.items())])
+    return cache_key(*parts)
+
+
+def _paths(namespace, name):
+    name = re.sub(r'[^\w.-]+', '_', str(name))
+    directory = os.path.join(ETL_CACHE_DIR, namespace)
+    return os.path.join(directory, f'{name}.parquet'), os.path.join(directory, f'{name}.json')
+
+
+def load_cached_frame(namespace: str, name: str, key: str):
+    """
+    Loads a cached frame.
+
+    Args:
+        namespace (str): Cache namespace, e.g. 'cleaned_hub'.
+        name (str): Entry name within the namespace.
+        key (str): Expected version of the entry.
+
+    Returns:
+        pd.DataFrame: The cached frame, None if it is missing, of another version or ETL_CACHE_REFRESH is set.
+    """
+    data_path, meta_path = _paths(namespace, name)
+    if ETL_CACHE_REFRESH or not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        if json.load(f)['key'] != key:
+            return None
+    return pd.read_parquet(data_path)
+
+
+def save_cached_frame(namespace: str, name: str, key: str, df: pd.DataFrame):
+    """
+    Saves a frame (index included) under namespace/name with version key.
+    """
+    data_path, meta_path = _paths(namespace, name)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    # the old version is dropped before the data is replaced and the new version is written last,
+    # so a failed run never leaves an entry whose version does not match its data
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    df.to_parquet(data_path + '.tmp')
+    os.replace(data_path + '.tmp', data_path)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump({'key': key, 'rows': len(df)}, f)
+    os.replace(meta_path + '.tmp', meta_path)
@@ -1,27 +1,63 @@
 # prepare_data.py
+import time
+import inspect
 from typing import Dict, List
 import pandas as pd
-from utils.etl.num_feature_definitions import FeatureDefinition
+from utils.etl.num_feature_definitions import FeatureDefinition, IntermediateDefinition, intermediate_definitions
+
+# columns added by prepare_revenue_data itself
+DERIVED_COLUMNS = ["date", "quarter", "year_offset"]
 
 
 def prepare_revenue_data(
-    df: pd.DataFrame, feature_definitions: List[FeatureDefinition], base_year: int = None
+    df: pd.DataFrame,
+    feature_definitions: List[FeatureDefinition],
+    base_year: int = None,
+    block_columns: List[str] = None,
+    intermediates: List[IntermediateDefinition] = None,
+    costs: List[dict] = None,
 ) -> Dict[str, pd.DataFrame]:
     """
     Processes revenue data and returns a dictionary of DataFrames keyed by aggregation level.
 
+    The features and the intermediate columns they read form a graph through their declared inputs and outputs.
+    Only the intermediates some feature reads are computed, once, before the levels; each level then works on
+    the columns its own features read instead of a copy of the whole frame.
+
     Parameters:
         df (pd.DataFrame): Input DataFrame containing revenue data.
         feature_definitions (List[FeatureDefinition]): List of feature definitions.
         base_year (int, optional): The base year for dynamic column naming (e.g., year_0).
             If None, uses the maximum year in the data.
+        block_columns (List[str], optional): Columns identifying blocks of rows whose features are computed
+            independently of each other, as if each block was processed on its own. The blocks are added to
+            every group key and the levels are returned in long format (block columns, level columns,
+            'year_offset', 'quarter' and one column per feature) instead of pivoted.
+        intermediates (List[IntermediateDefinition], optional): Shared intermediate columns.
+            Defaults to intermediate_definitions.
+        costs (List[dict], optional): If given, one record per computed step is appended to it,
+            see feature_cost_report.
 
     Returns:
         Dict[str, pd.DataFrame]: A dictionary where keys are aggregation level names and
             values are DataFrames with aggregated features in a wide format.
     """
-    # Copy DataFrame to avoid modifying the original
-    df = df.copy()
+    if intermediates is None:
+        intermediates = intermediate_definitions
+    intermediate_steps = required_intermediates(feature_definitions, intermediates)
+
+    # Copy only the columns read by the features, or all of them if a feature does not declare its inputs
+    source_columns = read_columns(feature_definitions + intermediate_steps)
+    if source_columns is None:
+        df = df.copy()
+    else:
+        source_columns -= {column for step in intermediate_steps for column in step.outputs}
+        source_columns |= set((block_columns or []) + ["year", "month"])
+        source_columns |= {column for feature in feature_definitions for level in feature.aggregation_levels for column in level}
+        missing = source_columns - set(df.columns) - set(DERIVED_COLUMNS)
+        if missing:
+            raise ValueError(f"Columns {sorted(missing)} not found in DataFrame.")
+        df = df[[column for column in df.columns if column in source_columns]]
 
     # Initial preprocessing
     # Convert 'year' and 'month' to a datetime 'date' column
@@ -37,6 +73,10 @@ def prepare_revenue_data(
     # Calculate 'year_offset' so that current year is 'year_0', prior year is 'year_1', etc.
     df["year_offset"] = base_year - df["year"]
 
+    # Shared intermediates are computed once for all levels
+    for step in intermediate_steps:
+        df = run_step(step, df, "intermediates", costs)
+
     # Organize features by their aggregation levels
     features_by_level = {}
     for feature in feature_definitions:
@@ -48,7 +88,7 @@ def prepare_revenue_data(
     result_dfs = {}
     for level_key, features in features_by_level.items():
         # Process features at this level using the helper function
-        pivot_df = process_features_at_level(df, features, list(level_key))
+        pivot_df = process_features_at_level(df, features, list(level_key), block_columns, costs)
         # Create a name for the aggregation level
         level_name = "_".join(level_key) if level_key else "overall"
         result_dfs[level_name] = pivot_df
@@ -56,28 +96,151 @@ def prepare_revenue_data(
     return result_dfs
 
 
-def process_features_at_level(df: pd.DataFrame, features: List[FeatureDefinition], level: List[str]) -> pd.DataFrame:
+def read_columns(steps: list):
+    """
+    Columns read by the given steps, None if one of them does not declare its inputs.
+    """
+    columns = set()
+    for step in steps:
+        if step.inputs is None:
+            return None
+        columns.update(step.inputs)
+    return columns
+
+
+def order_steps(steps: list) -> list:
+    """
+    Orders features or intermediates so that each runs after the steps writing the columns it reads.
+
+    Steps otherwise keep their definition order. A column read by a step comes from the last step writing it
+    that is defined before the reader (or from the first writer after it if there is none), and steps writing
+    the same column keep their relative order, so definitions listed in a valid order run as listed.
+
+    Raises:
+        ValueError: If the steps read each other's outputs in a cycle.
+    """
+    writers = {}
+    for i, step in enumerate(steps):
+        for column in step.outputs:
+            writers.setdefault(column, []).append(i)
+
+    depends_on = []
+    for i, step in enumerate(steps):
+        dependencies = set()
+        for column in step.inputs or []:
+            earlier = [j for j in writers.get(column, []) if j < i]
+            later = [j for j in writers.get(column, []) if j > i]
+            dependencies.update(earlier[-1:] or later[:1])
+        for column in step.outputs:
+            earlier = [j for j in writers[column] if j < i]
+            dependencies.update(earlier[-1:])
+        depends_on.append(dependencies)
+
+    ordered, done = [], set()
+    while len(ordered) < len(steps):
+        ready = [i for i in range(len(steps)) if i not in done and depends_on[i] <= done]
+        if not ready:
+            cycle = [steps[i].name for i in range(len(steps)) if i not in done]
+            raise ValueError(f"Feature steps {cycle} depend on each other in a cycle.")
+        done.add(ready[0])
+        ordered.append(steps[ready[0]])
+    return ordered
+
+
+def required_intermediates(features: List[FeatureDefinition], intermediates: List[IntermediateDefinition]) -> list:
+    """
+    The intermediates read by the features, directly or through other intermediates, in the order they run.
+    """
+    by_output = {column: step for step in intermediates for column in step.outputs}
+    required = set()
+    pending = list(read_columns(features) or [])
+    while pending:
+        step = by_output.get(pending.pop())
+        if step is not None and step.name not in required:
+            required.add(step.name)
+            pending.extend(step.inputs)
+    return order_steps([step for step in intermediates if step.name in required])
+
+
+def run_step(step, df: pd.DataFrame, level_name: str, costs: List[dict] = None, **kwargs) -> pd.DataFrame:
+    start = time.perf_counter()
+    df = step.compute_function(df, **kwargs)
+    if costs is not None:
+        costs.append({"level": level_name, "step": step.name, "rows": len(df), "seconds": time.perf_counter() - start})
+    return df
+
+
+def feature_cost_report(costs: List[dict]) -> pd.DataFrame:
+    """
+    Time spent per feature, intermediate and level aggregation over all calls that recorded costs.
+
+    Parameters:
+        costs (List[dict]): Records appended by prepare_revenue_data.
+
+    Returns:
+        pd.DataFrame: One row per step and level with the number of calls, rows and seconds, most expensive first.
+    """
+    report = pd.DataFrame(costs, columns=["level", "step", "rows", "seconds"])
+    report = report.groupby(["step", "level"], as_index=False).agg(
+        calls=("seconds", "size"), rows=("rows", "sum"), seconds=("seconds", "sum")
+    )
+    report["seconds"] = report["seconds"].round(3)
+    return report.sort_values("seconds", ascending=False, ignore_index=True)
+
+
+def accepts_block_columns(compute_function) -> bool:
+    """
+    Whether a feature's compute function aggregates over groups of rows and takes block_columns.
+    """
+    return "block_columns" in inspect.signature(compute_function).parameters
+
+
+def process_features_at_level(
+    df: pd.DataFrame,
+    features: List[FeatureDefinition],
+    level: List[str],
+    block_columns: List[str] = None,
+    costs: List[dict] = None,
+) -> pd.DataFrame:
     """
     Processes features at a specific aggregation level.
 
     Parameters:
-        df (pd.DataFrame): Input DataFrame.
+        df (pd.DataFrame): Input DataFrame, with the intermediates the features read.
         features (List[FeatureDefinition]): List of features to process.
         level (List[str]): List of columns to group by.
+        block_columns (List[str], optional): Columns of independently computed blocks, see prepare_revenue_data.
+        costs (List[dict], optional): Records of the computed steps, see prepare_revenue_data.
 
     Returns:
-        pd.DataFrame: Aggregated and pivoted DataFrame for the specified level.
+        pd.DataFrame: Aggregated and pivoted DataFrame for the specified level, aggregated in long format with blocks.
     """
-    groupby_cols = level + ["year_offset", "quarter"] if level else ["year_offset", "quarter"]
-    df_level = df.copy()
+    level_name = "_".join(level) if level else "overall"
+    groupby_cols = (block_columns or []) + level + ["year_offset", "quarter"]
+
+    # The features only get the columns they read, the group keys and 'year'
+    level_columns = read_columns(features)
+    if level_columns is None:
+        df_level = df.copy()
+    else:
+        level_columns |= set(groupby_cols + ["year"])
+        df_level = df[[column for column in df.columns if column in level_columns]]
 
     # Apply feature computation functions relevant to this level
-    for feature in features:
-        df_level = feature.compute_function(df_level)
+    for feature in order_steps(features):
+        if block_columns and accepts_block_columns(feature.compute_function):
+            df_level = run_step(feature, df_level, level_name, costs, block_columns=block_columns)
+        else:
+            df_level = run_step(feature, df_level, level_name, costs)
 
     # Aggregate features
+    start = time.perf_counter()
     agg_dict = {feature.name: feature.aggfunc for feature in features}
     agg_df = df_level.groupby(groupby_cols).agg(agg_dict).reset_index()
+    if costs is not None:
+        costs.append({"level": level_name, "step": "aggregate", "rows": len(df_level), "seconds": time.perf_counter() - start})
+    if block_columns:
+        return agg_df
 
     # Pivot the DataFrame to wide format
     pivot_df = agg_df.pivot_table(
@@ -1,5 +1,5 @@
 # feature_definitions.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from functools import partial
 from typing import Callable, List
@@ -33,7 +33,8 @@ from utils.etl.num_feature_functions import (
     compute_qq_growth,
     compute_yy_growth,
     compute_num_subproducts,
-    compute_expanded_services_revenue
+    compute_expanded_services_revenue,
+    compute_normalized_column
 )
 
 # Import feature functions
@@ -110,6 +111,40 @@ class FeatureDefinition:
     compute_function: Callable[[pd.DataFrame], pd.DataFrame]
     aggregation_levels: List[List[str]]  # List of levels, each level is a list of columns
     aggfunc: str = "sum"  # Default aggregation function
+    inputs: List[str] = None  # Columns read by compute_function, source or intermediate; None reads every column
+    outputs: List[str] = None  # Columns written by compute_function, defaults to [name]
+
+    def __post_init__(self):
+        if self.outputs is None:
+            self.outputs = [self.name]
+
+
+@dataclass
+class IntermediateDefinition:
+    """
+    A column shared by several features, computed once on the input data before the features of any level.
+    """
+    name: str
+    compute_function: Callable[[pd.DataFrame], pd.DataFrame]
+    inputs: List[str] = field(default_factory=list)
+
+    @property
+    def outputs(self) -> List[str]:
+        return [self.name]
+
+
+# Define intermediate columns; only the ones read by some feature are computed
+intermediate_definitions = [
+    IntermediateDefinition(
+        name=f"{column}_normalized",
+        compute_function=partial(compute_normalized_column, column=column),
+        inputs=[column],
+    )
+    for column in ["basis_code", "duration_cd", "entry_mode", "billing_type", "production_code"]
+]
+
+revenue_inputs = ["net_revenue", "production_code"]
+billing_volume_inputs = ["billing_type_normalized", "revenue_id"]
 
 
 # Define feature definitions
@@ -119,36 +154,42 @@ feature_definitions = [
         compute_function=compute_non_recurring_revenue,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="sum",
+        inputs=["net_revenue", "non_recurring_flag"],
     ),
     FeatureDefinition(
         name="renewal_revenue",
         compute_function=compute_renewal_revenue,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="sum",
+        inputs=revenue_inputs,
     ),
     FeatureDefinition(
         name="new_business_revenue",
         compute_function=compute_new_business_revenue,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="sum",
+        inputs=revenue_inputs,
     ),
     FeatureDefinition(
         name="expanded_services_revenue",
         compute_function=compute_expanded_services_revenue,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="sum",
+        inputs=revenue_inputs,
     ),
     FeatureDefinition(
         name="fee_dollar_value",
         compute_function=compute_fee_dollar_value,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="sum",
+        inputs=["net_revenue", "basis_code_normalized"],
     ),
     FeatureDefinition(
         name="comm_dollar_value",
         compute_function=compute_commission_dollar_value,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="sum",
+        inputs=["net_revenue", "basis_code_normalized"],
     ),
     # Add more features with their respective aggregation levels and functions
     FeatureDefinition(
@@ -156,72 +197,84 @@ feature_definitions = [
         compute_function=compute_annual_policies_dollar_value,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="sum",
+        inputs=["net_revenue", "duration_cd_normalized"],
     ),
     FeatureDefinition(
         name="multiyear_policy_dollar_value",
         compute_function=compute_multiyear_policies_dollar_value,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="sum",
+        inputs=["net_revenue", "duration_cd_normalized"],
     ),
     FeatureDefinition(
         name="volume_of_journals",
         compute_function=compute_journal_volume,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=["entry_mode_normalized", "accrual_type_us", "revenue_id"],
     ),
     FeatureDefinition(
         name="volume_of_original_billings",
         compute_function=compute_volume_original_billings,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
     FeatureDefinition(
         name="volume_of_other_billings",
         compute_function=compute_volume_other_billing_type,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
     FeatureDefinition(
         name="volume_of_endorsements",
         compute_function=compute_volume_of_endorsements,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
     FeatureDefinition(
         name="volume_of_audits",
         compute_function=compute_volume_of_audits,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
     FeatureDefinition(
         name="volume_of_cancellations",
         compute_function=compute_volume_of_cancellations,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
     FeatureDefinition(
         name="volume_of_reportings",
         compute_function=compute_volume_of_reportings,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
     FeatureDefinition(
         name="volume_of_installments",
         compute_function=compute_volume_of_installments,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
     FeatureDefinition(
         name="volume_of_rewrites",
         compute_function=compute_volume_of_rewrites,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
     FeatureDefinition(
         name="volume_of_reinstatements",
         compute_function=compute_volume_of_reinstatements,
         aggregation_levels=[["client_number", "product_line_nm"]],
         aggfunc="count",
+        inputs=billing_volume_inputs,
     ),
 
     # quarter:
@@ -239,105 +292,121 @@ feature_definitions = [
     #     compute_function=compute_avg_days_to_invoice,
     #     aggregation_levels=[["client_number", "product_line_nm"]],
     #     aggfunc="last",
+    #     inputs=["invoice_date", "year", "quarter"],
     # ),
     # FeatureDefinition(
     #     name="avg_days_to_bill_effective",
     #     compute_function=compute_avg_days_to_bill_effective,
     #     aggregation_levels=[["client_number", "product_line_nm"]],
     #     aggfunc="last",
+    #     inputs=["bill_effective_dt", "year", "quarter"],
     # ),
     # FeatureDefinition(
     #     name="avg_days_to_cv_effective",
     #     compute_function=compute_avg_days_to_cv_effective_dt,
     #     aggregation_levels=[["client_number", "product_line_nm"]],
     #     aggfunc="last",
+    #     inputs=["cv_effective_dt", "year", "quarter"],
     # ),
     # FeatureDefinition(
     #     name="avg_days_to_cv_exp",
     #     compute_function=compute_avg_days_to_cv_exp_dt,
     #     aggregation_levels=[["client_number", "product_line_nm"]],
     #     aggfunc="last",
+    #     inputs=["cv_expiration_dt", "year", "quarter"],
     # ),
     FeatureDefinition(
         name="client_nr_percentage",
         compute_function=compute_non_recurring_percentage,
         aggregation_levels=[["client_number"]],
         aggfunc="last",
+        inputs=["net_revenue", "non_recurring_flag", "production_code", "quarter"],
     ),
     FeatureDefinition(
         name="client_avg_stickiness",
         compute_function=compute_avg_stickiness,
         aggregation_levels=[["company_number"]],
         aggfunc="last",
+        inputs=["company_number", "product_line_nm", "quarter"],
     ),
     #client retention rate
     FeatureDefinition(
         name='renewal_revenue_ratio_client',
         compute_function=compute_renewal_rate_client,
         aggregation_levels=[client_level_grouping],
-        aggfunc='last'  # Since the ratio is already computed per record
+        aggfunc='last',  # Since the ratio is already computed per record
+        inputs=["year", "quarter", "net_revenue", "production_code", "production_code_normalized"] + client_level_grouping,
     ),
     # client product retention rate
     FeatureDefinition(
         name='renewal_revenue_ratio_client_product',
         compute_function=compute_renewal_rate_client_product,
         aggregation_levels=[client_product_level_grouping],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["year", "quarter", "net_revenue", "production_code", "production_code_normalized"] + client_product_level_grouping,
     ),
     # product retention rate
     FeatureDefinition(
         name='renewal_revenue_ratio_product',
         compute_function=compute_renewal_rate_product,
         aggregation_levels=[product_level_grouping],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["year", "quarter", "net_revenue", "production_code", "production_code_normalized"] + product_level_grouping,
     ),
     # client QoQ csr growth
     FeatureDefinition(
         name='qq_growth_rate_client',
         compute_function=compute_growth_client,
         aggregation_levels=[client_level_grouping],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["year", "quarter", "net_revenue"] + client_level_grouping,
     ),
     # product QoQ csr growth
     FeatureDefinition(
         name='qq_growth_rate_product',
         compute_function=compute_growth_product,
         aggregation_levels=[product_level_grouping],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["year", "quarter", "net_revenue"] + product_level_grouping,
     ),
     # client product QoQ csr growth
     FeatureDefinition(
         name='qq_growth_rate_client_product',
         compute_function=compute_growth_client_product,
         aggregation_levels=[client_product_level_grouping],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["year", "quarter", "net_revenue"] + client_product_level_grouping,
     ),
     # client YoY csr growth
     FeatureDefinition(
         name='yy_growth_rate_client',
         compute_function=compute_growth_client_year,
         aggregation_levels=[client_level_grouping],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["year", "quarter", "net_revenue"] + client_level_grouping,
     ),
     # product YoY csr growth
     FeatureDefinition(
         name='yy_growth_rate_product',
         compute_function=compute_growth_product_year,
         aggregation_levels=[product_level_grouping],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["year", "quarter", "net_revenue"] + product_level_grouping,
     ),
     # client product YoY csr growth
     FeatureDefinition(
         name='yy_growth_rate_client_product',
         compute_function=compute_growth_client_product_year,
         aggregation_levels=[client_product_level_grouping],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["year", "quarter", "net_revenue"] + client_product_level_grouping,
     ),
     # number subproducts per client
     FeatureDefinition(
         name='num_client_subproducts',
         compute_function=compute_num_subproducts,
         aggregation_levels=[["client_number"]],
-        aggfunc='last'
+        aggfunc='last',
+        inputs=["client_number", "product_subgroup_nm", "quarter"],
     )
 ]
\ No newline at end of file
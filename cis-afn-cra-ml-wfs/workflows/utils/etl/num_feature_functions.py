@@ -2,6 +2,17 @@
 from typing import List
 import numpy as np
 import pandas as pd
+from utils.etl.group_transforms import group_transform, shifted_group_sum
+from utils.etl.utils import quarter_start_dates
+
+def compute_normalized_column(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """
+    Adds '<column>_normalized' with the lowercase, stripped values of column, unless an earlier step already added it.
+    """
+    if f"{column}_normalized" not in df.columns:
+        df[f"{column}_normalized"] = df[column].str.lower().str.strip()
+    return df
+
 
 def compute_non_recurring_revenue(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -163,7 +174,7 @@ def compute_fee_dollar_value(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'fee_dollar_value' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["basis_code_normalized"] = df["basis_code"].str.lower().str.strip()
+    df = compute_normalized_column(df, "basis_code")
 
     # Define the target bases codes
     target_codes = ["fee in lieu of commission", "fee for services"]
@@ -186,7 +197,7 @@ def compute_commission_dollar_value(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'commission_dollar_value' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["basis_code_normalized"] = df["basis_code"].str.lower().str.strip()
+    df = compute_normalized_column(df, "basis_code")
 
     # Define the target bases codes
     target_codes = ["fee in lieu of commission", "fee for services"]
@@ -213,7 +224,7 @@ def compute_annual_policies_dollar_value(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'annual_policy_dollar_value' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["duration_cd_normalized"] = df["duration_cd"].str.lower().str.strip()
+    df = compute_normalized_column(df, "duration_cd")
 
     # Define the target bases codes
     target_codes = ["annual policy"]
@@ -236,7 +247,7 @@ def compute_multiyear_policies_dollar_value(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'multiyear_policy_dollar_value' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["duration_cd_normalized"] = df["duration_cd"].str.lower().str.strip()
+    df = compute_normalized_column(df, "duration_cd")
 
     # Define the target bases codes
     target_codes = ["policy period is more than 1 year"]
@@ -259,7 +270,7 @@ def compute_journal_volume(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_journals' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["entry_mode_normalized"] = df["entry_mode"].str.lower().str.strip()
+    df = compute_normalized_column(df, "entry_mode")
 
     # Define the target bases codes
     target_codes = ["journal entry"]
@@ -284,7 +295,7 @@ def compute_volume_original_billings(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_original_billings' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["original"]
@@ -306,7 +317,7 @@ def compute_volume_other_billing_type(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_other_billings' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["other"]
@@ -328,7 +339,7 @@ def compute_volume_of_endorsements(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_endorsements' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["endorsement"]
@@ -350,7 +361,7 @@ def compute_volume_of_audits(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_audits' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["audit"]
@@ -372,7 +383,7 @@ def compute_volume_of_cancellations(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_cancellations' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["cancellation"]
@@ -394,7 +405,7 @@ def compute_volume_of_reportings(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_reportings' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["reporting"]
@@ -416,7 +427,7 @@ def compute_volume_of_installments(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_installments' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["installment"]
@@ -438,7 +449,7 @@ def compute_volume_of_rewrites(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_rewrites' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["rewrite"]
@@ -460,7 +471,7 @@ def compute_volume_of_reinstatements(df: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: DataFrame with 'volume_of_reinstatement' column added.
     """
     # Normalize 'bases code' to lowercase and strip whitespace
-    df["billing_type_normalized"] = df["billing_type"].str.lower().str.strip()
+    df = compute_normalized_column(df, "billing_type")
 
     # Define the target bases codes
     target_codes = ["re-instatement"]
@@ -595,193 +606,172 @@ def compute_volume_of_reinstatements(df: pd.DataFrame) -> pd.DataFrame:
 #     return df['Quarter']
 
 
-def compute_avg_days_to_invoice(df: pd.DataFrame) -> pd.DataFrame:
+def compute_avg_days_to_invoice(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the average number of days to invoice date from the end of quarter date.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
 
     Returns:
         pd.DataFrame: DataFrame with 'avg_days_to_invoice' column added.
     """
-    quarter_end_map = {1: "01-01", 2: "04-01", 3: "07-01", 4: "10-01"}
+    # 'invoice_date' is datetime64 since normalize_dates, missing dates are NaT
     df.dropna(subset=["invoice_date"], inplace=True)
-    df["quarter_start_date"] = (
-        pd.to_datetime(df["invoice_date"]).dt.year.astype(int).astype(str) + "-" + df["quarter"].map(quarter_end_map)
-    )
-    df['quarter_start_date'] = pd.to_datetime(df["quarter_start_date"])
-    df['invoice_date'] = pd.to_datetime(df["invoice_date"])
+    invoice_date = df["invoice_date"]
+    quarter_start_date = quarter_start_dates(invoice_date.dt.year, df["quarter"])
 
     # Calculate the difference in days
-    df["days_difference"] = (df["invoice_date"] - df["quarter_start_date"]).dt.days
+    days_difference = (invoice_date - quarter_start_date).dt.days
 
-    # Group by 'quarter' and 'year' and calculate the average
-    avg_days = df.groupby(['quarter', 'year'])['days_difference'].mean().round(2).reset_index()
-    avg_days.rename(columns={'days_difference': 'avg_days_to_invoice'}, inplace=True)
-
-    # Merge the average back to the original DataFrame
-    df = df.merge(avg_days, on=["quarter", "year"], how="left")
+    # Average per 'quarter' and 'year', attached to every row of the period
+    block_columns = block_columns or []
+    df["avg_days_to_invoice"] = group_transform(df, block_columns + ["quarter", "year"], days_difference, "mean").round(2)
 
     return df
 
 
-def compute_avg_days_to_bill_effective(df: pd.DataFrame) -> pd.DataFrame:
+def compute_avg_days_to_bill_effective(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the average number of days to billing effective date from the end of quarter date.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
 
     Returns:
-        pd.DataFrame: DataFrame with 'avg_days_to_billing_effective' column added.
+        pd.DataFrame: DataFrame with 'avg_days_to_bill_effective' column added.
     """
-    quarter_end_map = {1: "01-01", 2: "04-01", 3: "07-01", 4: "10-01"}
+    # 'bill_effective_dt' is datetime64 since normalize_dates, missing dates are NaT
     df.dropna(subset=["bill_effective_dt"], inplace=True)
-     # Create a new column for the quarter end date
-    df["quarter_start_date"] = (
-        pd.to_datetime(df["bill_effective_dt"]).dt.year.astype(int).astype(str) + "-" + df["quarter"].map(quarter_end_map)
-    )
-
-    # Convert to datetime
-    df["quarter_start_date"] = pd.to_datetime(df["quarter_start_date"])
-    df["bill_effective_dt"] = pd.to_datetime(df["bill_effective_dt"])
+    bill_effective_dt = df["bill_effective_dt"]
+    quarter_start_date = quarter_start_dates(bill_effective_dt.dt.year, df["quarter"])
 
     # Calculate the difference in days
-    df["days_difference"] = abs(df["bill_effective_dt"] - df["quarter_start_date"]).dt.days
+    days_difference = abs(bill_effective_dt - quarter_start_date).dt.days
 
-    # Group by 'quarter' and 'year' and calculate the average
-    avg_days = df.groupby(['quarter', 'year'])['days_difference'].mean().round(2).reset_index()
-    avg_days.rename(columns={'days_difference': 'avg_days_to_bill_effective'}, inplace=True)
-
-    # Merge the average back to the original DataFrame
-    df = df.merge(avg_days, on=["quarter", "year"], how="left")
+    # Average per 'quarter' and 'year', attached to every row of the period
+    block_columns = block_columns or []
+    df["avg_days_to_bill_effective"] = group_transform(df, block_columns + ["quarter", "year"], days_difference, "mean").round(2)
 
     return df
 
 
-def compute_avg_days_to_cv_effective_dt(df: pd.DataFrame) -> pd.DataFrame:
+def compute_avg_days_to_cv_effective_dt(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the average number of days to coverage effective date from the end of quarter date.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
 
     Returns:
         pd.DataFrame: DataFrame with 'avg_days_to_cv_effective' column added.
     """
-    quarter_end_map = {1: "01-01", 2: "04-01", 3: "07-01", 4: "10-01"}
+    # 'cv_effective_dt' is datetime64 since normalize_dates, missing dates are NaT
     df.dropna(subset=["cv_effective_dt"], inplace=True)
-    df["quarter_start_date"] = (
-        pd.to_datetime(df["cv_effective_dt"]).dt.year.astype(int).astype(str) + "-" + df["quarter"].map(quarter_end_map)
-    )
-    
-    # Convert to datetime
-    df["quarter_start_date"] = pd.to_datetime(df["quarter_start_date"])
-    df["cv_effective_dt"] = pd.to_datetime(df["cv_effective_dt"])
+    cv_effective_dt = df["cv_effective_dt"]
+    quarter_start_date = quarter_start_dates(cv_effective_dt.dt.year, df["quarter"])
 
     # Calculate the difference in days
-    df["days_difference"] = abs(df["cv_effective_dt"] - df["quarter_start_date"]).dt.days
+    days_difference = abs(cv_effective_dt - quarter_start_date).dt.days
 
-    # Group by 'quarter' and 'year' and calculate the average
-    avg_days = df.groupby(['quarter', 'year'])['days_difference'].mean().round(2).reset_index()
-    avg_days.rename(columns={'days_difference': 'avg_days_to_cv_effective'}, inplace=True)
-
-    # Merge the average back to the original DataFrame
-    df = df.merge(avg_days, on=["quarter", "year"], how="left")
+    # Average per 'quarter' and 'year', attached to every row of the period
+    block_columns = block_columns or []
+    df["avg_days_to_cv_effective"] = group_transform(df, block_columns + ["quarter", "year"], days_difference, "mean").round(2)
 
     return df
 
-def compute_avg_days_to_cv_exp_dt(df: pd.DataFrame) -> pd.DataFrame:
+
+def compute_avg_days_to_cv_exp_dt(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
     """
-    Computes the average number of date to coverage expiration date from the end of quarter date.
+    Computes the average number of days to coverage expiration date from the end of quarter date.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
 
     Returns:
         pd.DataFrame: DataFrame with 'avg_days_to_cv_exp' column added.
     """
-    quarter_end_map = {1: "01-01", 2: "04-01", 3: "07-01", 4: "10-01"}
+    # 'cv_expiration_dt' is datetime64 since normalize_dates, missing dates are NaT
     df.dropna(subset=["cv_expiration_dt"], inplace=True)
-    df["quarter_start_date"] = (
-        pd.to_datetime(df["cv_expiration_dt"]).dt.year.astype(int).astype(str) + "-" + df["quarter"].map(quarter_end_map)
-    )
-    
-    # Convert to datetime
-    df["quarter_start_date"] = pd.to_datetime(df["quarter_start_date"])
-    df["cv_expiration_dt"] = pd.to_datetime(df["cv_expiration_dt"])
+    cv_expiration_dt = df["cv_expiration_dt"]
+    quarter_start_date = quarter_start_dates(cv_expiration_dt.dt.year, df["quarter"])
 
     # Calculate the difference in days
-    df["days_difference"] = abs(df["cv_expiration_dt"] - df["quarter_start_date"]).dt.days
-
-    # Group by 'quarter' and 'year' and calculate the average
-    avg_days = df.groupby(['quarter', 'year'])['days_difference'].mean().round(2).reset_index()
-    avg_days.rename(columns={'days_difference': 'avg_days_to_cv_exp'}, inplace=True)
+    days_difference = abs(cv_expiration_dt - quarter_start_date).dt.days
 
-    # Merge the average back to the original DataFrame
-    df = df.merge(avg_days, on=["quarter", "year"], how="left")
+    # Average per 'quarter' and 'year', attached to every row of the period
+    block_columns = block_columns or []
+    df["avg_days_to_cv_exp"] = group_transform(df, block_columns + ["quarter", "year"], days_difference, "mean").round(2)
 
     return df
 
-def compute_non_recurring_percentage(df: pd.DataFrame) -> pd.DataFrame:
+
+def compute_non_recurring_percentage(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the current quarter's percentage of non recurring revenue by dividing non-recurring revenue by new business
     revenue.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
 
     Returns:
         pd.DataFrame: DataFrame with 'client_nr_percentage' column added.
     """
 
-    df["non_recurring_revenue"] = df["net_revenue"].where(df["non_recurring_flag"], 0)
-    df["new_business_revenue"] = df["net_revenue"].where(df["production_code"].isin(["New business", "Expanded services"]), 0)
-
-    df_quarter = df.groupby("quarter").agg({"non_recurring_revenue": "sum", "new_business_revenue": "sum"}).reset_index()
-
-    # Calculate the client_nr_percentage
-    df_quarter["client_nr_percentage"] = (df_quarter["non_recurring_revenue"] / df_quarter["new_business_revenue"]) * 100
+    non_recurring_revenue = df["net_revenue"].where(df["non_recurring_flag"], 0)
+    new_business_revenue = df["net_revenue"].where(df["production_code"].isin(["New business", "Expanded services"]), 0)
 
-    # # Merge the client_nr_percentage column back to the original dataframe
-    df = pd.merge(df, df_quarter[["quarter", "client_nr_percentage"]], on="quarter", how="left")
+    # Calculate the client_nr_percentage of every row's quarter
+    quarter_keys = (block_columns or []) + ["quarter"]
+    df["client_nr_percentage"] = (
+        group_transform(df, quarter_keys, non_recurring_revenue, "sum") / group_transform(df, quarter_keys, new_business_revenue, "sum")
+    ) * 100
 
     return df
 
 
-def compute_avg_stickiness(df: pd.DataFrame) -> pd.DataFrame:
+def compute_avg_stickiness(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the average client stickiness.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
 
     Returns:
         pd.DataFrame: DataFrame with 'avg_client_stickiness' column added.
     """
-    # get total number of product lines
-    total_prod_lines = df["product_line_nm"].nunique()
+    block_columns = block_columns or []
+
+    # get total number of product lines, each block has its own total
+    if block_columns:
+        total_prod_lines = group_transform(df, block_columns, "product_line_nm", "nunique")
+    else:
+        total_prod_lines = df["product_line_nm"].nunique()
 
     # Count number of unique product lines per period and per company number
-    unique_product_lines = df.groupby(["company_number", "quarter"])["product_line_nm"].nunique().reset_index(name='unique_product_lines')
+    unique_product_lines = group_transform(df, block_columns + ["company_number", "quarter"], "product_line_nm", "nunique")
 
     # Calculate the percentage stickiness by dividing number of company lines by total lines
-    unique_product_lines["client_avg_stickiness"] = (unique_product_lines['unique_product_lines'] / total_prod_lines).round(2)
-    
-    # merge back to original df
-    df = df.merge(unique_product_lines, on=["company_number", "quarter"], how='left')
+    df["client_avg_stickiness"] = (unique_product_lines / total_prod_lines).round(2)
 
     return df
 
 
-def compute_renewal_rate(df: pd.DataFrame, grouping_columns: List[str]) -> pd.DataFrame:
+def compute_renewal_rate(df: pd.DataFrame, grouping_columns: List[str], block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the Renewal Ratio within the data processing step.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
         grouping_columns (List[str]): Columns to group by.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+            Periods are only compared within a block.
 
     Returns:
         pd.DataFrame: DataFrame with 'renewal_rate_ratio' column added.
@@ -791,65 +781,43 @@ def compute_renewal_rate(df: pd.DataFrame, grouping_columns: List[str]) -> pd.Da
     for col in required_columns:
         if col not in df.columns:
             raise ValueError(f"Column '{col}' not found in DataFrame.")
+    period_keys = (block_columns or []) + grouping_columns + ["year", "quarter"]
 
     # Normalize 'production_code'
-    df["production_code_normalized"] = df["production_code"].str.lower().str.strip()
+    df = compute_normalized_column(df, "production_code")
     renewal_codes = ["renewal"]
 
     # Compute renewal revenue
-    df["renewal_revenue"] = df["net_revenue"].where(df["production_code_normalized"].isin(renewal_codes), 0)
+    renewal_revenue = df["net_revenue"].where(df["production_code_normalized"].isin(renewal_codes), 0)
 
-    #######
-    # Aggregate renewal revenue by year and quarter
-    renewal_revenue_total = df.groupby(grouping_columns + ["year", "quarter"])["renewal_revenue"].sum().reset_index()
-    renewal_revenue_total.rename(columns={"renewal_revenue": "total_renewal_revenue"}, inplace=True)
+    # Total renewal revenue of the period
+    total_renewal_revenue = group_transform(df, period_keys, renewal_revenue, "sum")
 
-    # Merge the total renewal revenue back into the original DataFrame
-    df = df.merge(renewal_revenue_total, on=grouping_columns + ["year", "quarter"], how="left")
-    ##############
-
-    # Compute total revenue per group, year, and quarter
-    total_revenue = df.groupby(grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
-    total_revenue.rename(columns={"net_revenue": "total_revenue"}, inplace=True)
-
-    # Shift total revenue by 1 year to get last year's same quarter total revenue
-    total_revenue["year"] = total_revenue["year"] + 1  # Shift forward by 1 year
-
-    # Merge shifted total revenue back into the original DataFrame
-    df = df.merge(total_revenue, on=grouping_columns + ["year", "quarter"], how="left")
+    # Total revenue of the same quarter last year
+    total_revenue = shifted_group_sum(df, period_keys, "net_revenue", shift_column="year")
 
     # Get the grouping columns as a string to use in the new column name
     grouping_str = '_'.join(grouping_columns)
     grouping_str = grouping_str.replace('client_number', 'client').replace('product_line_nm', 'product')
 
-    # Calculate the Renewal Revenue Ratio -- ###########
-    df[f"renewal_revenue_ratio_{grouping_str}"] = (df["total_renewal_revenue"].round(0) / df["total_revenue"].round(0)).round(2)
-
-    # Handle division by zero or missing values
-    df[f"renewal_revenue_ratio_{grouping_str}"].replace([np.inf, -np.inf], np.nan, inplace=True)
-    df[f"renewal_revenue_ratio_{grouping_str}"].fillna(0, inplace=True)
-
-    # Calculate the standard deviation of the renewal ratio rate
+    # Calculate the Renewal Revenue Ratio, division by zero or missing values give 0
+    ratio = (total_renewal_revenue.round(0) / total_revenue.round(0)).round(2)
+    ratio = ratio.replace([np.inf, -np.inf], np.nan).fillna(0)
 
     # Apply threshold
-    df[f"renewal_revenue_ratio_{grouping_str}"] = np.where(
-    df[f"renewal_revenue_ratio_{grouping_str}"] > 20,
-    20, # Set to 20 if above 20
-    np.where(
-        df[f"renewal_revenue_ratio_{grouping_str}"] < -20,
-        -20,  # Set to -20 if below -20
-        df[f"renewal_revenue_ratio_{grouping_str}"]
-    )# Set to mean + std_dev if above upper threshold
-    )
+    df[f"renewal_revenue_ratio_{grouping_str}"] = np.where(ratio > 20, 20, np.where(ratio < -20, -20, ratio))
     return df
 
-def compute_qq_growth(df: pd.DataFrame, grouping_columns: List[str]) -> pd.DataFrame:
+
+def compute_qq_growth(df: pd.DataFrame, grouping_columns: List[str], block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the QoQ growth in 'net_revenue' within the data processing step.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
         grouping_columns (List[str]): Columns to group by.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+            Periods are only compared within a block.
 
     Returns:
         pd.DataFrame: DataFrame with 'qq_growth_rate' column added.
@@ -859,58 +827,34 @@ def compute_qq_growth(df: pd.DataFrame, grouping_columns: List[str]) -> pd.DataF
     for col in required_columns:
         if col not in df.columns:
             raise ValueError(f"Column '{col}' not found in DataFrame.")
+    period_keys = (block_columns or []) + grouping_columns + ["year", "quarter"]
 
-    # Sum 'net_revenue' per product per period
-    product_revenue = df.groupby(grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
-    product_revenue.rename(columns={"net_revenue": "current_revenue"}, inplace=True)
-    df = df.merge(product_revenue, on=grouping_columns + ["year", "quarter"], how="left")
-
-    # Get previous quarter's revenue
-    product_revenue = df.groupby(grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
-    product_revenue.rename(columns={"net_revenue": "prev_quarter_revenue"}, inplace=True)
+    # Revenue of the period and of the previous quarter, rounded to the nearest whole number
+    current_revenue = group_transform(df, period_keys, "net_revenue", "sum").round(0)
+    previous_revenue = shifted_group_sum(df, period_keys, "net_revenue", shift_column="quarter").round(0)
 
-    # Shift total revenue by 1 year to get last year's same quarter total revenue
-    product_revenue["quarter"] = product_revenue["quarter"] + 1
-    df = df.merge(product_revenue, on=grouping_columns + ["year", "quarter"], how="left")
     # Get the grouping columns as a string to use in the new column name
     grouping_str = '_'.join(grouping_columns)
     grouping_str = grouping_str.replace('client_number', 'client').replace('product_line_nm', 'product')
 
-    # Round revenues to nearest whole number
-    df["prev_quarter_revenue"] = df["prev_quarter_revenue"].round(0)
-    df["current_revenue"] = df["current_revenue"].round(0)
-
-    # Calculate the percentage growth by comparing current revenue to the previous quarter's revenue
-    df[f"qq_growth_rate_{grouping_str}"] = (
-        (df["current_revenue"].round(0) - df["prev_quarter_revenue"].round(0))
-        / (abs(df["prev_quarter_revenue"].round(0)))
-        * 100
-    ).round(2)
-    
-    # Handle division by zero or missing values
-    df[f"qq_growth_rate_{grouping_str}"].replace([np.inf, -np.inf], np.nan, inplace=True)
-    df[f"qq_growth_rate_{grouping_str}"].fillna(0, inplace=True)
+    # Calculate the percentage growth, division by zero or missing values give 0
+    growth = ((current_revenue - previous_revenue) / abs(previous_revenue) * 100).round(2)
+    growth = growth.replace([np.inf, -np.inf], np.nan).fillna(0)
 
     # Apply threshold
-    df[f"qq_growth_rate_{grouping_str}"] = np.where(
-    df[f"qq_growth_rate_{grouping_str}"] > 200,
-    200,  # Set to 200 if above 200
-    np.where(
-        df[f"qq_growth_rate_{grouping_str}"] < -200,
-        -200,  # Set to -200 if below -200
-        df[f"qq_growth_rate_{grouping_str}"]  # Keep original value if within thresholds
-    )
-    )
+    df[f"qq_growth_rate_{grouping_str}"] = np.where(growth > 200, 200, np.where(growth < -200, -200, growth))
     return df
 
 
-def compute_yy_growth(df: pd.DataFrame, grouping_columns: List[str]) -> pd.DataFrame:
+def compute_yy_growth(df: pd.DataFrame, grouping_columns: List[str], block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the YoY growth in 'net_revenue' within the data processing step.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
         grouping_columns (List[str]): Columns to group by.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
+            Periods are only compared within a block.
 
     Returns:
         pd.DataFrame: DataFrame with 'yy_growth_rate' column added.
@@ -920,49 +864,22 @@ def compute_yy_growth(df: pd.DataFrame, grouping_columns: List[str]) -> pd.DataF
     for col in required_columns:
         if col not in df.columns:
             raise ValueError(f"Column '{col}' not found in DataFrame.")
+    period_keys = (block_columns or []) + grouping_columns + ["year", "quarter"]
 
-    # Sum 'net_revenue' per product per period
-    curr_rev = df.groupby(grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
-    curr_rev.rename(columns={"net_revenue": "curr_rev"}, inplace=True)
-    df = df.merge(curr_rev, on=grouping_columns + ["year", "quarter"], how="left")
-
-    # Get previous quarter's revenue
-    prev_rev = df.groupby(grouping_columns + ["year", "quarter"])["net_revenue"].sum().reset_index()
-    prev_rev.rename(columns={"net_revenue": "prev_revenue"}, inplace=True)
+    # Revenue of the period and of the same quarter last year, rounded to the nearest whole number
+    current_revenue = group_transform(df, period_keys, "net_revenue", "sum").round(0)
+    previous_revenue = shifted_group_sum(df, period_keys, "net_revenue", shift_column="year").round(0)
 
-    # Shift total revenue by 1 year to get last year's same quarter total revenue
-    prev_rev["year"] = prev_rev["year"] + 1
-    df = df.merge(prev_rev, on=grouping_columns + ["year", "quarter"], how="left")
-    
     # Get the grouping columns as a string to use in the new column name
     grouping_str = '_'.join(grouping_columns)
     grouping_str = grouping_str.replace('client_number', 'client').replace('product_line_nm', 'product')
 
-    # Round revenues to nearest whole number
-    df["prev_revenue"] = df["prev_revenue"].round(0)
-    df["curr_rev"] = df["curr_rev"].round(0)
-
-    # Calculate the percentage growth by comparing current revenue to the previous quarter's revenue
-    df[f"yy_growth_rate_{grouping_str}"] = (
-        (df["curr_rev"].round(0) - df["prev_revenue"].round(0))
-        / (abs(df["prev_revenue"].round(0)))
-        * 100
-    ).round(2)
-
-    # Handle division by zero or missing values
-    df[f"yy_growth_rate_{grouping_str}"].replace([np.inf, -np.inf], np.nan, inplace=True)
-    df[f"yy_growth_rate_{grouping_str}"].fillna(0, inplace=True)
+    # Calculate the percentage growth, division by zero or missing values give 0
+    growth = ((current_revenue - previous_revenue) / abs(previous_revenue) * 100).round(2)
+    growth = growth.replace([np.inf, -np.inf], np.nan).fillna(0)
 
     # Apply threshold
-    df[f"yy_growth_rate_{grouping_str}"] = np.where(
-    df[f"yy_growth_rate_{grouping_str}"] > 200,
-    200,  # Set to 200 if above 200
-    np.where(
-        df[f"yy_growth_rate_{grouping_str}"] < -200,
-        -200,  # Set to -200 if below -200
-        df[f"yy_growth_rate_{grouping_str}"]  # Keep original value if within thresholds
-    )
-    )
+    df[f"yy_growth_rate_{grouping_str}"] = np.where(growth > 200, 200, np.where(growth < -200, -200, growth))
     return df
 
 
@@ -1074,18 +991,18 @@ def compute_yy_growth(df: pd.DataFrame, grouping_columns: List[str]) -> pd.DataF
 
 #     return df
 
-def compute_num_subproducts(df: pd.DataFrame) -> pd.DataFrame:
+def compute_num_subproducts(df: pd.DataFrame, block_columns: List[str] = None) -> pd.DataFrame:
     """
     Computes the number of subproducts within a client.
 
     Parameters:
         df (pd.DataFrame): Input DataFrame.
+        block_columns (List[str], optional): Columns of independently computed blocks, prepended to the group keys.
 
     Returns:
         pd.DataFrame: DataFrame with 'num_client_subproducts' column added.
     """
 
-    num_client_subproducts = df.groupby(['client_number', 'quarter'])["product_subgroup_nm"].nunique().reset_index()
-    num_client_subproducts.rename(columns={"product_subgroup_nm": "num_client_subproducts"}, inplace=True)
-    df = df.merge(num_client_subproducts, on=['client_number', 'quarter'], how='left')
+    block_columns = block_columns or []
+    df["num_client_subproducts"] = group_transform(df, block_columns + ['client_number', 'quarter'], "product_subgroup_nm", "nunique")
     return df
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 def create_mapping(data_frame, key_column, value_column):
@@ -93,3 +94,42 @@ def keep_rows_based_on_list_values(df: pd.DataFrame, column: str, value_list: li
         pd.DataFrame: The filtered DataFrame.
     """
     return df.loc[df[column].isin(value_list)]  # Keep rows where the column value IS in the list
+
+
+def parse_dates_factorized(series: pd.Series) -> pd.Series:
+    """
+    Parses a column of date strings to datetime64, parsing every distinct value only once.
+
+    The column is factorized, only its unique values go through pd.to_datetime and the parsed
+    values are broadcast back through the codes. Missing and unparseable values (such as the
+    'Missing' placeholder) become NaT.
+
+    Args:
+        series (pd.Series): Date strings.
+
+    Returns:
+        pd.Series: datetime64[ns] values with the index and name of series.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    codes, uniques = pd.factorize(series)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format="mixed", errors="coerce")
+    # missing values have code -1, which picks the NaT appended at the end
+    values = np.append(parsed.to_numpy(dtype="datetime64[ns]"), np.datetime64("NaT", "ns"))[codes]
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def quarter_start_dates(years: pd.Series, quarters: pd.Series) -> pd.Series:
+    """
+    First day of the given quarters of the given years as datetime64, computed from month numbers
+    instead of formatting and parsing date strings.
+
+    Args:
+        years (pd.Series): Calendar years.
+        quarters (pd.Series): Quarters 1 to 4, aligned to years.
+
+    Returns:
+        pd.Series: datetime64[ns] quarter start dates with the index of years.
+    """
+    months_since_epoch = (years.astype("int64") - 1970) * 12 + (quarters.astype("int64") - 1) * 3
+    return pd.Series(months_since_epoch.to_numpy().astype("datetime64[M]").astype("datetime64[ns]"), index=years.index)
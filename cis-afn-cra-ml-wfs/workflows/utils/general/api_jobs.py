@@ -0,0 +1,93 @@
+import io
+import os
+import json
+import requests
+import pandas as pd
+
+# api service running the Celery cohort jobs
+API_URL = os.environ.get('API_URL', 'http://api-dev-svc:8000')
+# connect/read timeouts of the job requests; the stream read timeout bounds the wait for the next cohort
+API_TIMEOUT = (5, int(os.environ.get('API_TIMEOUT', 300)))
+API_STREAM_TIMEOUT = (5, int(os.environ.get('API_STREAM_TIMEOUT', 3600)))
+# times a dropped job stream is reopened from the last cohort received
+API_STREAM_RETRIES = int(os.environ.get('API_STREAM_RETRIES', 3))
+
+
+def submit_job(action: str, df: pd.DataFrame, cohorts: list):
+    """
+    Submits a modeling frame and cohort specs to the api service as an asynchronous job.
+
+    Args:
+        action (str): 'train' or 'score'.
+        df (pd.DataFrame): Modeling frame.
+        cohorts (list): Cohort specs, e.g. {'kind': 'regression', 'zone': 'None', 'product': 'None', 'quarter': 0}.
+
+    Returns:
+        str: Job id.
+    """
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    response = requests.post(f'{API_URL}/jobs/{action}', files={'file': ('modeling_df.parquet', buffer.getvalue())},
+                             data={'cohorts': json.dumps(cohorts)}, timeout=API_TIMEOUT)
+    response.raise_for_status()
+    job = response.json()
+    print(f"Submitted {action} job {job['job_id']} with {job['total']} cohorts")
+    return job['job_id']
+
+
+def get_result(job_id: str, cohort: str, frame: str):
+    response = requests.get(f'{API_URL}/jobs/{job_id}/results', params={'cohort': cohort, 'frame': frame}, timeout=API_TIMEOUT)
+    response.raise_for_status()
+    return pd.read_parquet(io.BytesIO(response.content))
+
+
+def stream_job(job_id: str, start: int = 0):
+    """
+    Yields the results of a job's cohorts as they finish.
+
+    A stream that drops before its final status line is reopened from the last cohort received, up to
+    API_STREAM_RETRIES times. A stream that ends before every cohort of the job was received raises,
+    so callers never mistake a partial set of cohorts for the whole job.
+
+    Args:
+        job_id (str): Job id from submit_job.
+        start (int): Number of finished cohorts already consumed, to resume a stream.
+
+    Yields:
+        tuple: (cohort key, {result name: DataFrame}); raises on the first failed cohort.
+    """
+    offset = start
+    retries = 0
+    while True:
+        status = None
+        try:
+            with requests.get(f'{API_URL}/jobs/{job_id}/stream', params={'start': offset}, stream=True, timeout=API_STREAM_TIMEOUT) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if 'status' in event:
+                        status = event
+                        continue
+                    if event['error'] is not None:
+                        raise RuntimeError(f"Cohort {event['cohort']} of job {job_id} failed: {event['error']}")
+                    frames = {frame: get_result(job_id, event['cohort'], frame) for frame in event['frames']}
+                    offset += 1
+                    yield event['cohort'], frames
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            if retries >= API_STREAM_RETRIES:
+                raise
+            print(f'Stream of job {job_id} dropped after {offset} cohorts ({e!r}), reopening')
+            retries += 1
+            continue
+
+        if status is None:
+            if retries >= API_STREAM_RETRIES:
+                raise RuntimeError(f'Stream of job {job_id} ended without a status after {offset} cohorts')
+            print(f'Stream of job {job_id} ended without a status after {offset} cohorts, reopening')
+            retries += 1
+            continue
+        if status['status'] != 'finished' or offset < status['total']:
+            raise RuntimeError(f"Stream of job {job_id} ended {status['status']} after {offset} of {status['total']} cohorts")
+        return
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import multiprocessing
+import concurrent.futures
+import pyarrow as pa
+from api.utils.util_functions.utils import get_cpu_limit
+
+# cohorts trained concurrently, and the CPU budget (BLAS/XGBoost/tuning threads) of each
+COHORT_WORKERS = os.environ.get('COHORT_WORKERS')
+COHORT_THREADS_PER_WORKER = os.environ.get('COHORT_THREADS_PER_WORKER')
+
+# thread and process pools that read their size from the environment; LOKY_MAX_CPU_COUNT caps
+# joblib's n_jobs=-1, so a sklearn search in a worker cannot start a process per machine CPU
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_MAX_THREADS', 'XGB_N_JOBS', 'CPU_LIMIT',
+                   'LOKY_MAX_CPU_COUNT']
+
+# memory-mapped modeling frame of the current worker process, keyed by file path
+_worker_tables = {}
+
+
+def _init_worker(threads, env):
+    # runs before the worker imports the training code, so module-level thread settings see the cap
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    os.environ.update(env)
+
+
+def _run_cohort(path, fn, rows, kwargs):
+    if path not in _worker_tables:
+        _worker_tables.clear()
+        _worker_tables[path] = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    # only this cohort's rows are materialized, the rest of the frame stays in the shared page cache
+    cohort_df = _worker_tables[path].take(pa.array(rows)).to_pandas()
+    return fn(cohort_df=cohort_df, **kwargs)
+
+
+def _shared_dir():
+    # /dev/shm keeps the frame in memory; fall back to the regular temp dir elsewhere
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def run_cohorts(fn, df, cohorts, n_workers=None, threads_per_worker=None, env=None):
+    """
+    Trains cohorts of one modeling frame on a process pool.
+
+    The frame is written once as an Arrow file in shared memory and every worker memory-maps it,
+    so a cohort ships only its row positions instead of a pickled copy of its rows. Cohorts are
+    submitted largest first to keep the pool busy at the end of the run, and results are yielded
+    as they finish.
+    Args:
+        fn (callable): Module-level function called as fn(cohort_df=..., **kwargs) in a worker.
+        df (DataFrame): Modeling frame.
+        cohorts (list): (key, rows, kwargs) tuples, rows being positions into df.
+        n_workers (int): Concurrent cohorts. Defaults to COHORT_WORKERS, else CPUs // threads_per_worker.
+        threads_per_worker (int): Thread cap per worker. Defaults to COHORT_THREADS_PER_WORKER, else 1.
+        env (dict): Extra environment variables set in each worker.
+
+    Yields:
+        tuple: (key, result) in completion order.
+    """
+    threads_per_worker = int(threads_per_worker or COHORT_THREADS_PER_WORKER or 1)
+    n_workers = int(n_workers or COHORT_WORKERS or max(1, get_cpu_limit() // threads_per_worker))
+    cohorts = sorted(cohorts, key=lambda cohort: len(cohort[1]), reverse=True)
+    print(f'Running {len(cohorts)} cohorts on {n_workers} workers with {threads_per_worker} threads each')
+
+    tmp_dir = tempfile.mkdtemp(dir=_shared_dir())
+    try:
+        path = os.path.join(tmp_dir, 'modeling_df.arrow')
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        del table
+
+        # spawn so the thread caps are set before the training modules are imported
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=_init_worker, initargs=(threads_per_worker, env or {})) as executor:
+            futures = {executor.submit(_run_cohort, path, fn, rows, kwargs): key for key, rows, kwargs in cohorts}
+            for future in concurrent.futures.as_completed(futures):
+                yield futures[future], future.result()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
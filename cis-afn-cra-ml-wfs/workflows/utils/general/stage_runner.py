@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import resource
+import threading
+import weakref
+from datetime import date
+import pandas as pd
+import pyarrow as pa
+
+# root of the stage checkpoints, one directory per job and run id
+STAGE_DIR = os.environ.get('STAGE_DIR', '/tmp/cra_stages')
+# run id shared by retries of the same run, a new id starts from the raw data pull again
+STAGE_RUN_ID = os.environ.get('STAGE_RUN_ID')
+# set to 0 to run every stage without reading or writing checkpoints
+STAGE_CHECKPOINTS = bool(int(os.environ.get('STAGE_CHECKPOINTS', 1)))
+# seconds between RSS samples while a stage runs
+MEMORY_SAMPLE_SECONDS = 0.2
+
+
+def _rss_mb():
+    # current resident set size; falls back to the process peak where /proc is not available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _MemorySampler:
+    """
+    Samples the process RSS on a background thread to find the peak while a stage runs.
+    """
+
+    def __init__(self):
+        self.start_mb = self.peak_mb = _rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(MEMORY_SAMPLE_SECONDS):
+            self.peak_mb = max(self.peak_mb, _rss_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, _rss_mb())
+
+
+def frame_fingerprint(df, index=True):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=index).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+class StageRunner:
+    """
+    Runs the steps of a job as named stages with Parquet checkpoints.
+
+    Each stage is keyed by its name and the fingerprints of its inputs. Its output is written
+    under the run directory (frames as Parquet, everything else pickled) and a later run with
+    the same run id skips every stage whose key is unchanged, loading the saved output instead.
+    A job that failed therefore resumes from the first failed stage. Duration and peak RSS of
+    every stage are collected in report().
+
+    Stages must not mutate their inputs: frames are passed through without copying, and a stage
+    loaded from its checkpoint does not run, so a change it made to an input frame would only exist
+    on fresh runs (and would leave the cached fingerprint of that frame stale).
+
+    Args:
+        job_name (str): Name of the job, e.g. 'regression_training'.
+        run_id (str): Defaults to STAGE_RUN_ID, else today's date.
+        root (str): Defaults to STAGE_DIR.
+        enabled (bool): Read and write checkpoints. Defaults to STAGE_CHECKPOINTS.
+    """
+
+    def __init__(self, job_name, run_id=None, root=None, enabled=None):
+        self.job_name = job_name
+        self.run_id = run_id or STAGE_RUN_ID or date.today().isoformat()
+        self.run_dir = os.path.join(root or STAGE_DIR, job_name, self.run_id)
+        self.enabled = STAGE_CHECKPOINTS if enabled is None else enabled
+        self.stages = []
+        # fingerprints of output frames by object id, so frames passed on are not hashed again;
+        # weak references tell a live frame from a new object that reused the id
+        self._fingerprints = {}
+        if self.enabled:
+            os.makedirs(self.run_dir, exist_ok=True)
+
+    def _remember(self, value, fingerprint):
+        if isinstance(value, pd.DataFrame):
+            self._fingerprints[id(value)] = (weakref.ref(value), fingerprint)
+
+    def fingerprint(self, value):
+        if isinstance(value, pd.DataFrame):
+            ref, fingerprint = self._fingerprints.get(id(value), (None, None))
+            if ref is not None and ref() is value:
+                return fingerprint
+            return frame_fingerprint(value)
+        if isinstance(value, (list, tuple)):
+            return [self.fingerprint(v) for v in value]
+        if isinstance(value, dict):
+            return {str(k): self.fingerprint(v) for k, v in value.items()}
+        return repr(value)
+
+    def _key(self, name, args, kwargs):
+        inputs = json.dumps([name, self.fingerprint(list(args)), self.fingerprint(kwargs)], sort_keys=True)
+        return hashlib.sha256(inputs.encode()).hexdigest()[:16]
+
+    def _stage_dir(self, name):
+        return os.path.join(self.run_dir, name)
+
+    def _save(self, name, key, output):
+        stage_dir = self._stage_dir(name)
+        os.makedirs(stage_dir, exist_ok=True)
+        outputs = output if isinstance(output, tuple) else (output,)
+        parts = []
+        for i, value in enumerate(outputs):
+            if isinstance(value, pd.DataFrame):
+                try:
+                    value.to_parquet(os.path.join(stage_dir, f'{i}.parquet'))
+                    parts.append('parquet')
+                    continue
+                except (pa.ArrowException, ValueError, TypeError):
+                    # columns Arrow cannot type, e.g. mixed objects, fall back to pickle
+                    pass
+            with open(os.path.join(stage_dir, f'{i}.pkl'), 'wb') as f:
+                pickle.dump(value, f)
+            parts.append('pickle')
+
+        fingerprints = [self.fingerprint(value) for value in outputs]
+        for value, fingerprint in zip(outputs, fingerprints):
+            self._remember(value, fingerprint)
+        manifest = {'key': key, 'tuple': isinstance(output, tuple), 'parts': parts, 'fingerprints': fingerprints}
+        # the manifest is written last, a stage interrupted while saving is simply run again
+        with open(os.path.join(stage_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+    def _load(self, name, key):
+        path = os.path.join(self._stage_dir(name), 'manifest.json')
+        if not os.path.exists(path):
+            return False, None
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest['key'] != key:
+            return False, None
+
+        outputs = []
+        for i, (part, fingerprint) in enumerate(zip(manifest['parts'], manifest['fingerprints'])):
+            if part == 'parquet':
+                value = pd.read_parquet(os.path.join(self._stage_dir(name), f'{i}.parquet'))
+            else:
+                with open(os.path.join(self._stage_dir(name), f'{i}.pkl'), 'rb') as f:
+                    value = pickle.load(f)
+            self._remember(value, fingerprint)
+            outputs.append(value)
+        return True, tuple(outputs) if manifest['tuple'] else outputs[0]
+
+    def run(self, name, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) as a stage, or loads its saved output if its inputs are unchanged.
+        fn gets the caller's frames and must not mutate them.
+        Args:
+            name (str): Stage name, unique within the job.
+            fn (callable): Stage function.
+
+        Returns:
+            The output of fn.
+        """
+        start = time.time()
+        key = self._key(name, args, kwargs) if self.enabled else None
+        if self.enabled:
+            found, output = self._load(name, key)
+            if found:
+                self._record(name, 'cached', start, None)
+                print(f'Stage {name}: loaded checkpoint {key}')
+                return output
+
+        print(f'Stage {name}: running')
+        with _MemorySampler() as memory:
+            try:
+                output = fn(*args, **kwargs)
+            except Exception:
+                self._record(name, 'failed', start, memory)
+                print(self.report())
+                raise
+        if self.enabled:
+            self._save(name, key, output)
+        self._record(name, 'ran', start, memory)
+        return output
+
+    def _record(self, name, status, start, memory):
+        self.stages.append({
+            'stage': name,
+            'status': status,
+            'seconds': round(time.time() - start, 2),
+            'start_rss_mb': round(memory.start_mb, 1) if memory else None,
+            'peak_rss_mb': round(memory.peak_mb, 1) if memory else None,
+        })
+
+    def report(self):
+        """
+        Returns:
+            pd.DataFrame: One row per stage run so far with status, duration and memory.
+        """
+        report = pd.DataFrame(self.stages, columns=['stage', 'status', 'seconds', 'start_rss_mb', 'peak_rss_mb'])
+        if self.enabled and len(report):
+            report.to_csv(os.path.join(self.run_dir, 'stage_report.csv'), index=False)
+        return report